@@ -0,0 +1,47 @@
+"""
+Endpoints served through the test client, from routing to the encoded body.
+"""
+import itertools
+
+import pytest
+
+
+@pytest.mark.parametrize("path", ["/customers/", "/products/", "/sales/"])
+@pytest.mark.parametrize("skip", [0, 10_000])
+def test_list_page(benchmark, client, path, skip):
+    response = benchmark(client.get, path, params={"skip": skip, "limit": 100})
+    assert response.status_code == 200
+
+
+def test_sales_of_customer(benchmark, client, customer_ids):
+    response = benchmark(client.get, "/sales/", params={"customer_id": customer_ids[0], "limit": 1000})
+    assert response.status_code == 200 and response.json()
+
+
+@pytest.mark.parametrize("endpoint", ["summary", "prob_alive", "conditional", "cumulative", "avg_value", "clv"])
+def test_prediction(benchmark, client, fitted_models, customer_ids, endpoint):
+    # a different customer each call, as a dashboard user browsing would
+    ids = itertools.cycle(customer_ids)
+    response = benchmark(lambda: client.get(f"/models/pnbd/{endpoint}/{next(ids)}"))
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("max_points", [100, 1000])
+def test_sales_series(benchmark, client, max_points):
+    response = benchmark(client.get, "/analytics/sales/series", params={"max_points": max_points})
+    assert response.status_code == 200 and len(response.json()["bucket"]) <= max_points
+
+
+def test_rfm_segments(benchmark, client):
+    response = benchmark(client.get, "/analytics/rfm/segments")
+    assert response.status_code == 200
+
+
+def test_rfm_thresholds(benchmark, client):
+    response = benchmark(client.get, "/analytics/rfm/thresholds")
+    assert response.status_code == 200 and len(response.json()["monetary"]) == 4
+
+
+def test_customer_search(benchmark, client):
+    response = benchmark(client.get, "/customers/search", params={"q": "gold"})
+    assert response.status_code == 200
@@ -0,0 +1,26 @@
+"""
+Forecasting all series at once, on the database and on a large synthetic matrix.
+"""
+import numpy as np
+import pytest
+
+from src.app.forecasting import fit_ets, sales_matrix, seasonal_mean
+
+# products × days of a large catalogue, Poisson daily quantities
+N_SERIES, N_DAYS = 5000, 365
+
+
+@pytest.fixture(scope="module")
+def matrix():
+    return np.random.default_rng(0).poisson(2.0, (N_SERIES, N_DAYS)).astype(np.float64)
+
+
+def test_sales_matrix(benchmark, db):
+    result = benchmark(sales_matrix, db, "product_id", "qty", 365)
+    assert result.values.shape[1] == 365
+
+
+@pytest.mark.parametrize("model", [fit_ets, seasonal_mean], ids=["ets", "seasonal_mean"])
+def test_forecast_all_series(benchmark, matrix, model):
+    forecast, rmse = benchmark.pedantic(model, args=(matrix, 28), rounds=3, iterations=1, warmup_rounds=1)
+    assert forecast.shape == (N_SERIES, 28) and len(rmse) == N_SERIES
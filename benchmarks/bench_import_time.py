@@ -0,0 +1,42 @@
+"""
+Startup cost of importing the app, from ``python -X importtime`` in a fresh interpreter.
+"""
+import os
+import subprocess
+import sys
+
+# seconds for ``import src.app.main``, fastapi and sqlalchemy alone take about a second
+IMPORT_TIME_BUDGET = float(os.environ.get("IMPORT_TIME_BUDGET", 2.5))
+# loaded by the first model request or the prewarm thread, never at import
+LAZY_MODULES = ("pandas", "lifetimes", "scipy", "autograd", "pyarrow")
+
+
+def import_times(module: str):
+    """
+    Cumulative import time in seconds of every module imported by ``import module``
+    """
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                             capture_output=True, text=True, check=True, env=os.environ)
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def test_app_import_time():
+    times = import_times("src.app.main")
+    # the outermost package includes everything below it
+    total = max(times.values())
+    slowest = ", ".join(f"{name} {seconds:.2f} s" for name, seconds in
+                        sorted(times.items(), key=lambda item: -item[1])[3:13])
+
+    eager = [name for name in times if name.split(".")[0] in LAZY_MODULES]
+    assert not eager, f"imported at startup: {', '.join(sorted(eager)[:10])}"
+    assert total <= IMPORT_TIME_BUDGET, (
+        f"import src.app.main took {total:.2f} s, budget is {IMPORT_TIME_BUDGET} s; "
+        f"slowest: {slowest}"
+    )
@@ -0,0 +1,45 @@
+"""
+Model fitting and per-customer predictions of ``PNBDEngine``, called directly.
+"""
+from datetime import datetime
+
+from lifetimes.utils import summary_data_from_transaction_data
+
+from src.app.loaders import load_transactions
+from src.app.pareto_nbd import PNBDEngine
+from src.app.snapshot import transaction_snapshot
+
+
+def test_fit(benchmark, db):
+    # seconds per fit, a few rounds are enough
+    params = benchmark.pedantic(PNBDEngine().fit, args=(db,), rounds=3, iterations=1, warmup_rounds=1)
+    assert params["pnbd_params"]
+
+
+def test_load_transactions(benchmark, db):
+    # the bulk read behind the snapshot, which serves later loads from memory
+    df = benchmark(load_transactions, db)
+    assert not df.empty
+
+
+def test_summary_table(benchmark, db):
+    df = transaction_snapshot.load(db)
+    summary = benchmark(summary_data_from_transaction_data, df, customer_id_col="customer_id",
+                        datetime_col="date", monetary_value_col="amount",
+                        observation_period_end=datetime.now())
+    assert len(summary)
+
+
+def test_customer_summary(benchmark, db, customer_ids):
+    engine = PNBDEngine()
+    summary = benchmark(engine.customer_summary, db, customer_ids[0])
+    assert summary["frequency"] > 0
+
+
+def test_probability_alive(benchmark, db, fitted_engine, customer_ids):
+    assert 0 <= benchmark(fitted_engine.probability_alive, db, customer_ids[0]) <= 1
+
+
+def test_expected_cumulative_transactions(benchmark, db, fitted_engine, customer_ids):
+    series = benchmark(fitted_engine.expected_cumulative_transactions, db, customer_ids[0], 90)
+    assert len(series) == 90
@@ -0,0 +1,75 @@
+"""
+Fixtures of the pytest-benchmark suite.
+
+The app reads ``DB_URL`` when ``src`` is first imported, so the database is
+chosen here, before any benchmark module is collected: ``BENCH_DB`` if set,
+otherwise a synthetic database of ``BENCH_SALES`` sales generated once per
+scale and seed and reused by later runs.
+"""
+import os
+
+import pytest
+
+from benchmarks.synthetic import cached_database
+
+BENCH_SALES = int(os.environ.get("BENCH_SALES", 20_000))
+BENCH_SEED = int(os.environ.get("BENCH_SEED", 0))
+
+
+os.environ["DB_URL"] = (os.environ.get("BENCH_DB")
+                        or cached_database(BENCH_SALES, BENCH_SEED, os.environ.get("BENCH_DATA_DIR")))
+
+
+def pytest_benchmark_update_machine_info(config, machine_info):
+    # results of different databases are not comparable
+    machine_info["bench_db"] = os.path.basename(os.environ["DB_URL"])
+
+
+@pytest.fixture(scope="session")
+def db():
+    from src.database import SessionLocal
+
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    from src.app.main import app
+
+    # without the lifespan, so nothing is refreshed in the background
+    return TestClient(app)
+
+
+@pytest.fixture(scope="session")
+def fitted_engine(db):
+    from src.app.pareto_nbd import PNBDEngine
+
+    engine = PNBDEngine()
+    engine.fit(db)
+    return engine
+
+
+@pytest.fixture(scope="session")
+def fitted_models(client):
+    # fitted by the app's model workers
+    client.post("/models/pnbd/fit").raise_for_status()
+
+
+@pytest.fixture(scope="session")
+def customer_ids(db):
+    from sqlalchemy import func
+
+    from src.models import Customer, Transaction
+
+    # the customers with the most purchases, the slowest to summarise
+    rows = (db.query(Customer.id)
+            .join(Transaction, Transaction.customer_id == Customer.id)
+            .group_by(Customer.id)
+            .order_by(func.count().desc(), Customer.id)
+            .limit(50)
+            .all())
+    return [customer_id for customer_id, in rows]
@@ -0,0 +1,217 @@
+"""
+Drive the API under uvicorn with a mix of dashboard requests at a target rate and
+report latency percentiles, throughput and error rate per route as JSON.
+
+Requests are sent open-loop: each one is scheduled at a fixed rate whether or
+not earlier ones have completed, and its latency is counted from its scheduled
+time, so a stalled server shows up in the percentiles instead of slowing the
+load down.
+
+    python -m benchmarks.loadtest --sales 200000 --rps 50 --duration 30 --output run.json
+    python -m benchmarks.loadtest --url http://localhost:8000 --db /path/to/db.sqlite --mix pnbd=1
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import httpx
+import numpy as np
+
+from benchmarks.synthetic import cached_database
+
+PNBD_ENDPOINTS = ["summary", "prob_alive", "conditional", "cumulative", "avg_value"]
+DEFAULT_MIX = "customers=40,sales=30,pnbd=29,fit=1"
+
+
+def customer_request(rng: random.Random, customer_ids: List[str]) -> Tuple[str, str, str]:
+    if rng.random() < 0.5:
+        return "GET", "/customers/", f"/customers/?skip={rng.randrange(0, len(customer_ids))}&limit=100"
+    return "GET", "/customers/{customer_id}", f"/customers/{rng.choice(customer_ids)}"
+
+
+def sales_request(rng: random.Random, customer_ids: List[str]) -> Tuple[str, str, str]:
+    return "GET", "/sales/?customer_id", f"/sales/?customer_id={rng.choice(customer_ids)}&limit=100"
+
+
+def pnbd_request(rng: random.Random, customer_ids: List[str]) -> Tuple[str, str, str]:
+    endpoint = rng.choice(PNBD_ENDPOINTS)
+    return "GET", f"/models/pnbd/{endpoint}/{{customer_id}}", f"/models/pnbd/{endpoint}/{rng.choice(customer_ids)}"
+
+
+def fit_request(rng: random.Random, customer_ids: List[str]) -> Tuple[str, str, str]:
+    return "POST", "/models/pnbd/fit", "/models/pnbd/fit"
+
+
+# scenario -> request factory returning method, route label and URL path
+SCENARIOS = {
+    "customers": customer_request,
+    "sales": sales_request,
+    "pnbd": pnbd_request,
+    "fit": fit_request,
+}
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise ValueError(f"unknown scenario {name!r}, choose from {', '.join(SCENARIOS)}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def load_customer_ids(path: str) -> List[str]:
+    con = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return [row[0] for row in con.execute("SELECT CustomerId FROM Customers ORDER BY CustomerId")]
+    finally:
+        con.close()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(db_path: str, port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ, DB_URL=db_path)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+
+
+async def wait_until_up(client: httpx.AsyncClient, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await client.get("/health/check_status")).status_code < 500:
+                return
+        except httpx.TransportError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("server did not start")
+        await asyncio.sleep(0.2)
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {"p50_ms": round(p50, 2), "p95_ms": round(p95, 2), "p99_ms": round(p99, 2),
+            "max_ms": round(max(latencies) * 1000, 2)}
+
+
+def summarize(results: Dict[str, List[Tuple[float, bool]]], duration: float) -> Dict:
+    """
+    Per-route and overall request count, throughput, error rate and latency percentiles
+    """
+    routes = {}
+    everything = []
+    for route, samples in sorted(results.items()):
+        everything.extend(samples)
+        latencies = [latency for latency, _ in samples]
+        errors = sum(1 for _, ok in samples if not ok)
+        routes[route] = {"requests": len(samples), "rps": round(len(samples) / duration, 2),
+                         "error_rate": round(errors / len(samples), 4), **percentiles(latencies)}
+    latencies = [latency for latency, _ in everything]
+    errors = sum(1 for _, ok in everything if not ok)
+    total = {"requests": len(everything), "rps": round(len(everything) / duration, 2),
+             "error_rate": round(errors / len(everything), 4) if everything else 0.0,
+             **(percentiles(latencies) if everything else {})}
+    return {"total": total, "routes": routes}
+
+
+async def run_load(url: str, weights: Dict[str, float], customer_ids: List[str], rps: float, duration: float,
+                   max_in_flight: int, seed: int) -> Tuple[Dict[str, List[Tuple[float, bool]]], float]:
+    rng = random.Random(seed)
+    names, scenario_weights = list(weights), list(weights.values())
+    results: Dict[str, List[Tuple[float, bool]]] = defaultdict(list)
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    in_flight = asyncio.Semaphore(max_in_flight)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120.0) as client:
+        await wait_until_up(client)
+        # predictions need fitted models
+        if "pnbd" in weights:
+            (await client.post("/models/pnbd/fit")).raise_for_status()
+
+        async def send(scheduled: float, method: str, route: str, path: str):
+            async with in_flight:
+                try:
+                    response = await client.request(method, path, headers={"Accept-Encoding": "gzip"})
+                    await response.aread()
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+            results[f"{method} {route}"].append((time.perf_counter() - scheduled, ok))
+
+        tasks = []
+        start = time.perf_counter()
+        for i in range(int(rps * duration)):
+            scheduled = start + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            scenario = rng.choices(names, scenario_weights)[0]
+            tasks.append(asyncio.create_task(send(scheduled, *SCENARIOS[scenario](rng, customer_ids))))
+        await asyncio.gather(*tasks)
+        return results, time.perf_counter() - start
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--url', help='load an already running server instead of starting one')
+    parser.add_argument('--db', help='database to serve, a synthetic one by default')
+    parser.add_argument('--sales', type=int, default=100_000, help='size of the synthetic database')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='scenario weights, e.g. "customers=40,pnbd=60"')
+    parser.add_argument('--rps', type=float, default=20.0)
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds of load')
+    parser.add_argument('--max-in-flight', type=int, default=256)
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn workers')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON report to this file as well')
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix)
+    db_path = args.db or cached_database(args.sales)
+    customer_ids = load_customer_ids(db_path)
+
+    server = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        server = start_server(db_path, port, args.workers)
+        url = f"http://127.0.0.1:{port}"
+    try:
+        results, elapsed = asyncio.run(run_load(url, weights, customer_ids, args.rps, args.duration,
+                                                args.max_in_flight, args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "config": {"url": args.url, "db": os.path.basename(db_path), "mix": weights, "target_rps": args.rps,
+                   "duration_s": args.duration, "workers": args.workers, "seed": args.seed},
+        **summarize(results, elapsed),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
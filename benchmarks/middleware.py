@@ -0,0 +1,120 @@
+"""
+Measure the per-request overhead of the middleware stack on cheap routes, calling
+the ASGI app directly so that only the app and its middlewares are timed.
+
+    DB_URL=/path/to/db.sqlite python -m benchmarks.middleware --requests 5000
+"""
+import asyncio
+import logging
+import statistics
+import time
+from argparse import ArgumentParser
+
+from fastapi import FastAPI, HTTPException
+from starlette.middleware.base import BaseHTTPMiddleware, Request
+from starlette.responses import JSONResponse
+
+from src.app.middlewares import ConditionalGetMiddleware, ExceptionHandlerMiddleware
+from src.app.routers import customers, health
+from src.database import SessionLocal
+from src.models import Customer
+
+logger = logging.getLogger(__name__)
+
+
+class LegacyExceptionHandlerMiddleware(BaseHTTPMiddleware):
+    # previous ExceptionHandlerMiddleware, built on BaseHTTPMiddleware
+    async def dispatch(self, request: Request, call_next):
+        try:
+            return await call_next(request)
+        except HTTPException as http_exception:
+            return JSONResponse(
+                status_code=http_exception.status_code,
+                content={"error": "Client Error", "message": str(http_exception.detail)},
+            )
+        except Exception as e:
+            logger.exception("%s", e.__class__.__name__)
+            return JSONResponse(
+                status_code=500,
+                content={"error": "Internal Server Error", "message": "An unexpected error occurred."},
+            )
+
+
+def build_app(*middlewares) -> FastAPI:
+    app = FastAPI()
+    for middleware, options in middlewares:
+        app.add_middleware(middleware, **options)
+    app.include_router(customers.router)
+    app.include_router(health.router)
+    return app
+
+
+async def call(app, path: str):
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+             "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80)}
+    status, received = None, False
+
+    async def receive():
+        nonlocal received
+        if received:
+            # like a server, block until the client disconnects, which it never does here
+            await asyncio.Event().wait()
+        received = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def measure(app, path: str, requests: int) -> float:
+    """
+    Return the median time per request in microseconds over 5 runs
+    """
+    assert await call(app, path) == 200
+    runs = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(requests):
+            await call(app, path)
+        runs.append((time.perf_counter() - start) / requests * 1e6)
+    return statistics.median(runs)
+
+
+async def run(requests: int):
+    db = SessionLocal()
+    customer_id = db.query(Customer.id).limit(1).scalar()
+    db.close()
+
+    conditional = (ConditionalGetMiddleware, {"paths": ("/customers",)})
+    stacks = {
+        "no middleware": build_app(),
+        "legacy BaseHTTPMiddleware": build_app((LegacyExceptionHandlerMiddleware, {})),
+        "pure ASGI": build_app((ExceptionHandlerMiddleware, {})),
+        "pure ASGI + ETag": build_app(conditional, (ExceptionHandlerMiddleware, {})),
+    }
+    routes = {"/health/check_status": requests, f"/customers/{customer_id}": max(requests // 10, 1)}
+
+    print(f"{'stack':<28}{'route':<24}{'us/request':>12}{'overhead (us)':>16}")
+    for path, n in routes.items():
+        baseline = None
+        for name, app in stacks.items():
+            per_request = await measure(app, path, n)
+            baseline = per_request if baseline is None else baseline
+            print(f"{name:<28}{path[:22]:<24}{per_request:>12.1f}{per_request - baseline:>16.1f}")
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Compare list response serialization: ORM objects through ``response_model`` against
+the orjson fast path, uncompressed and compressed.
+
+    DB_URL=/path/to/db.sqlite python -m benchmarks.serialization --sizes 100 1000 10000
+"""
+import statistics
+import time
+from argparse import ArgumentParser
+from typing import List
+
+from fastapi import Depends
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from src.app import serialization
+from src.app.main import app
+from src.app.rollups import rollup_store
+from src.database import SessionLocal, get_db
+from src.models import Transaction
+from src.schemas.crud import SaleRead
+
+
+@app.get("/benchmarks/legacy_sales", response_model=List[SaleRead], include_in_schema=False)
+def legacy_sales(limit: int = 100, db: Session = Depends(get_db)):
+    # previous /sales/ implementation: ORM objects validated and encoded per row
+    return db.query(Transaction).limit(limit).all()
+
+
+def measure(client: TestClient, path: str, limit: int, repeat: int, encoding: str):
+    """
+    Return the median latency and the response body size of a request
+    """
+    timings, size = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(path, params={"limit": limit}, headers={"Accept-Encoding": encoding})
+        timings.append(time.perf_counter() - start)
+        response.raise_for_status()
+        size = int(response.headers.get("content-length", len(response.content)))
+    return statistics.median(timings), size
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    variants = {"legacy response_model": ("/benchmarks/legacy_sales", "identity"),
+                "fast path": ("/sales/", "identity"),
+                "fast path + gzip": ("/sales/", "gzip")}
+    if serialization.brotli is not None:
+        variants["fast path + br"] = ("/sales/", "br")
+
+    # the startup refresh of stale rollups would hold the write lock while measuring
+    db = SessionLocal()
+    rollup_store.refresh(db)
+    db.close()
+
+    with TestClient(app) as client:
+        print(f"{'variant':<24}{'rows':>8}{'median (ms)':>14}{'rows/s':>12}{'body (KB)':>12}")
+        for limit in args.sizes:
+            for name, (path, encoding) in variants.items():
+                # warm up caches and the connection pool
+                client.get(path, params={"limit": limit})
+                seconds, size = measure(client, path, limit, args.repeat, encoding)
+                print(f"{name:<24}{limit:>8}{seconds * 1000:>14.2f}{limit / seconds:>12.0f}{size / 1024:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""
+Write a synthetic SQLite database with the ``Customers``, ``Products`` and ``Sales`` schema of the app.
+
+Purchases follow Pareto/NBD dynamics: every customer gets a purchase rate
+``λ ~ Gamma(r, α)`` and a dropout rate ``μ ~ Gamma(s, β)``, joins at a
+uniform time of the observation window, buys once, then buys as a Poisson
+process with rate λ until an exponential lifetime with rate μ ends. Spend per
+customer is heterogeneous, as the Gamma-Gamma model assumes. The same
+arguments and seed always produce the same database.
+
+    python -m benchmarks.synthetic /tmp/synthetic.db --sales 1000000
+"""
+import os
+import sqlite3
+import tempfile
+import time
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE BusinessUnits (BusinessUnitId INTEGER PRIMARY KEY, Name TEXT);
+CREATE TABLE Locations (LocationId INTEGER PRIMARY KEY, Name TEXT);
+CREATE TABLE Customers (CustomerId VARCHAR NOT NULL PRIMARY KEY, CompanyName VARCHAR NOT NULL, Street VARCHAR,
+                        Unit VARCHAR, Country VARCHAR, City VARCHAR, IsActive BOOLEAN NOT NULL);
+CREATE INDEX ix_Customers_CustomerId ON Customers (CustomerId);
+CREATE TABLE Products (ProductId INTEGER NOT NULL PRIMARY KEY, Name VARCHAR NOT NULL, Price FLOAT NOT NULL);
+CREATE INDEX ix_Products_ProductId ON Products (ProductId);
+CREATE TABLE Sales (SaleId INTEGER NOT NULL PRIMARY KEY, Date DATETIME NOT NULL,
+                    BusinessUnitId INTEGER REFERENCES BusinessUnits (BusinessUnitId),
+                    CustomerId VARCHAR REFERENCES Customers (CustomerId),
+                    LocationId INTEGER REFERENCES Locations (LocationId), Qty INTEGER,
+                    ProductId INTEGER REFERENCES Products (ProductId));
+CREATE INDEX ix_Sales_SaleId ON Sales (SaleId);
+"""
+
+BUSINESS_UNITS = ["Retail", "Wholesale", "Online"]
+CITIES = [("Yerevan", "Armenia"), ("Gyumri", "Armenia"), ("Vanadzor", "Armenia"), ("Tbilisi", "Georgia"),
+          ("Batumi", "Georgia"), ("Berlin", "Germany"), ("Paris", "France"), ("Dubai", "UAE")]
+NAME_WORDS = ["Ararat", "Blue", "North", "Golden", "Summit", "River", "Prime", "Green", "Silver", "Global",
+              "Alpha", "Sun", "Stone", "Cedar", "Apex", "Harbor", "Metro", "Urban", "Pioneer", "Vertex"]
+NAME_KINDS = ["Trading", "Foods", "Logistics", "Market", "Systems", "Supplies", "Holdings", "Group"]
+NAME_SUFFIXES = ["LLC", "Ltd", "CJSC", "Inc", "GmbH"]
+
+INSERT_CHUNK_SIZE = 100_000
+# customers simulated at a time until the requested number of sales is reached
+CUSTOMER_BATCH_SIZE = 50_000
+
+
+@dataclass
+class PNBDParams:
+    """
+    Population parameters, rates are per day
+    """
+    r: float = 0.9
+    alpha: float = 30.0
+    s: float = 0.6
+    beta: float = 300.0
+
+
+def simulate_sales(n_sales: int, days: int, rng: np.random.Generator, params: PNBDParams):
+    """
+    Simulate customers until ``n_sales`` purchases are drawn
+
+    Returns
+    -------
+    customers : int
+        number of customers
+    customer : np.ndarray
+        customer index of each sale, sales sorted by time
+    offset : np.ndarray
+        seconds from the start of the observation window
+    spend : np.ndarray
+        mean quantity per purchase of each customer
+    """
+    customer_parts, offset_parts = [], []
+    spend_parts = []
+    total, customers = 0, 0
+    window = days * 86400.0
+    while total < n_sales:
+        n = min(CUSTOMER_BATCH_SIZE, max(100, n_sales // 10))
+        purchase_rate = rng.gamma(params.r, 1 / params.alpha, n)
+        dropout_rate = rng.gamma(params.s, 1 / params.beta, n)
+        birth = rng.uniform(0, window, n)
+        lifetime = rng.exponential(1 / dropout_rate) * 86400.0
+        active = np.minimum(lifetime, window - birth)
+        repeats = rng.poisson(purchase_rate * active / 86400.0)
+        counts = repeats + 1
+
+        # given their count, the repeat purchases of a Poisson process are uniform over the active period
+        owner = np.repeat(np.arange(n), counts)
+        first = np.zeros(len(owner), dtype=bool)
+        first[np.concatenate(([0], np.cumsum(counts)[:-1]))] = True
+        offset = birth[owner] + np.where(first, 0.0, rng.uniform(0, 1, len(owner)) * active[owner])
+
+        customer_parts.append((owner + customers).astype(np.int32))
+        offset_parts.append(offset)
+        # Gamma-Gamma: mean spend varies by customer, purchases scatter around it
+        spend_parts.append(rng.gamma(3.0, 1.0, n))
+        total += len(owner)
+        customers += n
+
+    # customers are independent, cutting the last batch short only truncates the history of its last one
+    customer = np.concatenate(customer_parts)[:n_sales]
+    offset = np.concatenate(offset_parts)[:n_sales]
+    order = np.argsort(offset, kind="stable")
+    # every customer up to the last one kept made at least its first purchase
+    customers = int(customer[-1]) + 1
+    return customers, customer[order], offset[order], np.concatenate(spend_parts)[:customers]
+
+
+def company_names(n: int, rng: np.random.Generator):
+    first = rng.integers(0, len(NAME_WORDS), n)
+    second = rng.integers(0, len(NAME_WORDS), n)
+    kind = rng.integers(0, len(NAME_KINDS), n)
+    suffix = rng.integers(0, len(NAME_SUFFIXES), n)
+    return [f"{NAME_WORDS[a]} {NAME_WORDS[b]} {NAME_KINDS[k]} {NAME_SUFFIXES[x]}"
+            for a, b, k, x in zip(first, second, kind, suffix)]
+
+
+def _remove_database(path: str):
+    # with the tables the app derived from it (DERIVED_DB_URL), they would not match the new data
+    for file in (path, os.path.splitext(path)[0] + ".derived.db"):
+        if os.path.exists(file):
+            os.remove(file)
+
+
+def generate(path: str, n_sales: int, n_products: int = 200, days: int = 730, end: str = "2025-06-30",
+             seed: int = 0, params: PNBDParams = None) -> dict:
+    """
+    Write a synthetic database to ``path``, replacing any existing file
+
+    Parameters
+    ----------
+    path : str
+        SQLite file to write
+    n_sales : int
+        number of rows in ``Sales``
+    n_products : int
+        number of rows in ``Products``
+    days : int
+        length of the observation window
+    end : str
+        last day of the observation window, ISO date
+    seed : int
+        random seed
+    params : PNBDParams, optional
+        Pareto/NBD population parameters
+
+    Returns
+    -------
+    stats : dict
+        number of customers, products and sales written
+    """
+    rng = np.random.default_rng(seed)
+    params = params or PNBDParams()
+    n_customers, customer, offset, spend = simulate_sales(n_sales, days, rng, params)
+
+    start = np.datetime64(datetime.fromisoformat(end), "us") - np.timedelta64(days, "D")
+    dates = start + (offset * 1e6).astype("timedelta64[us]")
+    qty = np.minimum(1 + rng.poisson(spend[customer]), 50).astype(np.int32)
+    # a few products sell much more than the rest
+    popularity = 1 / np.arange(1, n_products + 1) ** 1.1
+    product = rng.choice(n_products, len(customer), p=popularity / popularity.sum()).astype(np.int32) + 1
+    business_unit = rng.integers(1, len(BUSINESS_UNITS) + 1, len(customer))
+    location = rng.integers(1, len(CITIES) + 1, len(customer))
+
+    _remove_database(path)
+    con = sqlite3.connect(path)
+    con.execute("PRAGMA journal_mode = OFF")
+    con.execute("PRAGMA synchronous = OFF")
+    con.executescript(SCHEMA)
+    con.executemany("INSERT INTO BusinessUnits VALUES (?, ?)", enumerate(BUSINESS_UNITS, 1))
+    con.executemany("INSERT INTO Locations VALUES (?, ?)", ((i, city) for i, (city, _) in enumerate(CITIES, 1)))
+
+    city = rng.integers(0, len(CITIES), n_customers)
+    active = rng.uniform(0, 1, n_customers) < 0.9
+    names = company_names(n_customers, rng)
+    con.executemany("INSERT INTO Customers VALUES (?, ?, ?, ?, ?, ?, ?)", (
+        (f"C{i:07d}", names[i], f"{(i % 200) + 1} Main St", None, CITIES[city[i]][1], CITIES[city[i]][0],
+         bool(active[i]))
+        for i in range(n_customers)
+    ))
+
+    prices = np.round(rng.lognormal(3.0, 0.8, n_products), 2)
+    con.executemany("INSERT INTO Products VALUES (?, ?, ?)",
+                    ((i + 1, f"Product {i + 1}", float(price)) for i, price in enumerate(prices)))
+
+    for low in range(0, len(customer), INSERT_CHUNK_SIZE):
+        high = low + INSERT_CHUNK_SIZE
+        # the format SQLAlchemy writes DateTime columns in
+        date_strings = np.char.replace(np.datetime_as_string(dates[low:high], unit="us"), "T", " ")
+        con.executemany(
+            "INSERT INTO Sales (SaleId, Date, BusinessUnitId, CustomerId, LocationId, Qty, ProductId) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            zip(range(low + 1, high + 1), date_strings.tolist(), business_unit[low:high].tolist(),
+                (f"C{c:07d}" for c in customer[low:high]), location[low:high].tolist(),
+                qty[low:high].tolist(), product[low:high].tolist()),
+        )
+    con.commit()
+    # row counts in sqlite_stat1, as on a maintained database
+    con.execute("ANALYZE")
+    con.commit()
+    con.close()
+    return {"customers": n_customers, "products": n_products, "sales": len(customer)}
+
+
+def cached_database(n_sales: int, seed: int = 0, directory: str = None) -> str:
+    """
+    Path of the synthetic database of ``n_sales`` sales, generated on first use and reused after
+
+    Parameters
+    ----------
+    n_sales : int
+        number of sales
+    seed : int
+        random seed
+    directory : str, optional
+        where databases are kept, a directory under the system temp directory by default
+
+    Returns
+    -------
+    path : str
+        SQLite file
+    """
+    directory = directory or os.path.join(tempfile.gettempdir(), "davit-capstone-benchmarks")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"synthetic-{n_sales}-{seed}.db")
+    if not os.path.exists(path):
+        generate(path + ".tmp", n_sales, seed=seed)
+        _remove_database(path)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('path')
+    parser.add_argument('--sales', type=int, default=100_000)
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--end', default="2025-06-30", help='last day of the observation window')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = generate(args.path, args.sales, args.products, args.days, args.end, args.seed)
+    print(f"wrote {stats['sales']} sales of {stats['customers']} customers and {stats['products']} products "
+          f"to {args.path} in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
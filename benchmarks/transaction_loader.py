@@ -0,0 +1,87 @@
+"""
+Compare the chunked bulk transaction loader with the previous ORM loaders.
+
+    DB_URL=/path/to/db.sqlite python -m benchmarks.transaction_loader --repeat 3
+"""
+import gc
+import time
+import tracemalloc
+from argparse import ArgumentParser
+
+import pandas as pd
+
+from src.app.loaders import load_transactions
+from src.database import SessionLocal
+from src.models import Product, Transaction
+
+
+def legacy_get_transactions_df(db):
+    # previous src.app.utils.get_transactions_df: one Products query per sale
+    txs = db.query(Transaction).all()
+    return pd.DataFrame([
+        {"customer_id": t.customer_id, "date": pd.to_datetime(t.date).date(), "amount": t.qty * t.product.price}
+        for t in txs
+    ])
+
+
+def legacy_engine_loader(db):
+    # previous PNBDEngine._load_transaction_df: joined rows turned into dicts
+    q = (
+        db.query(
+            Transaction.customer_id,
+            Transaction.date,
+            (Transaction.qty * Product.price).label("amount")
+        )
+        .join(Product, Transaction.product_id == Product.product_id)
+    )
+    df = pd.DataFrame([{"customer_id": r.customer_id,
+                        "date": r.date,
+                        "amount": r.amount}
+                       for r in q])
+    df["date"] = pd.to_datetime(df["date"])
+    return df
+
+
+def measure(loader, repeat: int):
+    """
+    Return the best wall time, peak traced memory and frame size of a loader
+    """
+    timings = []
+    for _ in range(repeat):
+        db = SessionLocal()
+        gc.collect()
+        start = time.perf_counter()
+        df = loader(db)
+        timings.append(time.perf_counter() - start)
+        db.close()
+
+    db = SessionLocal()
+    gc.collect()
+    tracemalloc.start()
+    loader(db)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.close()
+    return min(timings), peak, df.memory_usage(deep=True).sum(), len(df)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip_n_plus_one', action='store_true',
+                        help='skip the legacy get_transactions_df, which is very slow on large tables')
+    args = parser.parse_args()
+
+    loaders = {"bulk load_transactions": load_transactions,
+               "legacy PNBDEngine loader": legacy_engine_loader}
+    if not args.skip_n_plus_one:
+        loaders["legacy get_transactions_df"] = legacy_get_transactions_df
+
+    print(f"{'loader':<30}{'rows':>10}{'best time (s)':>16}{'peak alloc (MB)':>18}{'frame (MB)':>12}")
+    for name, loader in loaders.items():
+        seconds, peak, frame_bytes, rows = measure(loader, args.repeat)
+        print(f"{name:<30}{rows:>10}{seconds:>16.3f}{peak / 2 ** 20:>18.1f}{frame_bytes / 2 ** 20:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
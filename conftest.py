@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+from typing import Optional
+
+import pytest
+
+from src.query_audit import audit_queries
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Assert how many statements a block of code, typically one request through a test client, may run.
+
+    Usage::
+
+        def test_get_customer(client, query_budget):
+            with query_budget(max_statements=2, max_repeats=1):
+                client.get("/customers/C00001")
+    """
+
+    @contextmanager
+    def budget(max_statements: Optional[int] = None, max_repeats: Optional[int] = None,
+               slow_seconds: Optional[float] = None):
+        # the test client serves the app on another thread, so record statements from every thread,
+        # background work started by the app meanwhile counts too
+        with audit_queries(max_repeats, slow_seconds, everywhere=True) as audit:
+            yield audit
+        if max_statements is not None:
+            assert audit.statements <= max_statements, (
+                f"{audit.statements} statements, budget is {max_statements}; most repeated: {audit.most_repeated()}"
+            )
+        assert not audit.violations, "\n".join(audit.violations)
+
+    return budget
@@ -0,0 +1,230 @@
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from src.app.downsample import lttb
+from src.app.filters import SalesFilter
+from src.app.rollups import rollup_store
+from src.models import Product, Transaction
+
+REVENUE = func.sum(Transaction.qty * Product.price)
+
+# time bucket expressions over Sales, used when the rollups cannot answer
+BUCKETS = {
+    "day": lambda column: func.date(column),
+    "week": lambda column: func.date(column, "weekday 0", "-6 days"),
+    "month": lambda column: func.date(column, "start of month"),
+}
+# approximate days per bucket, finest first, to pick the resolution of a date range
+BUCKET_DAYS = {"day": 1, "week": 7, "month": 30.4}
+# buckets aggregated per point returned, LTTB picks the points from this finer series
+SERIES_OVERSAMPLING = 4
+GROUP_COLUMNS = {
+    "product_id": Transaction.product_id,
+    "customer_id": Transaction.customer_id,
+    "location_id": Transaction.location_id,
+    "business_unit": Transaction.business_unit,
+}
+
+
+def _columns(rows, names) -> Dict[str, List]:
+    """
+    Transpose result rows into one list per column
+    """
+    columns = list(zip(*rows)) if rows else [()] * len(names)
+    return {name: list(values) for name, values in zip(names, columns)}
+
+
+def _aggregate(db: Session, filters: SalesFilter, group_by: Sequence[str] = (),
+               granularity: Optional[str] = None, with_range: bool = False, fresh: Optional[bool] = None) -> List:
+    """
+    Transactions, qty and revenue per bucket and groups, from the rollups when they are fresh
+
+    ``fresh`` is the result of ``rollup_store.ensure_fresh`` when the caller already checked, for several aggregates.
+    """
+    if fresh is None:
+        fresh = rollup_store.ensure_fresh(db)
+    if fresh:
+        return rollup_store.query(db, filters, group_by, granularity, with_range)
+
+    keys = [BUCKETS[granularity](Transaction.date)] if granularity else []
+    keys += [GROUP_COLUMNS[g] for g in group_by]
+    aggregates = [func.count(), func.sum(Transaction.qty), REVENUE]
+    if with_range:
+        aggregates += [func.date(func.min(Transaction.date)), func.date(func.max(Transaction.date))]
+    stmt = (
+        select(*keys, *aggregates)
+        .join(Product, Transaction.product_id == Product.product_id)
+        .group_by(*keys)
+        .order_by(*keys)
+    )
+    return db.execute(filters.apply(stmt)).all()
+
+
+def date_range(db: Session, filters: SalesFilter, fresh: Optional[bool] = None) -> Optional[Tuple[date, date]]:
+    """
+    First and last day with sales matching the filters, ``None`` when there are none
+
+    Read from the day rollups when they are fresh, ``Sales.Date`` is not indexed.
+    """
+    *_, first, last = _aggregate(db, filters, with_range=True, fresh=fresh)[0]
+    if first is None:
+        return None
+    return date.fromisoformat(str(first)), date.fromisoformat(str(last))
+
+
+def sales_timeseries(db: Session, filters: SalesFilter, granularity: str = "day",
+                     group_by: Optional[str] = None) -> Dict[str, List]:
+    """
+    Transactions, quantity and revenue per day, week or month, optionally per dimension
+
+    Parameters
+    ----------
+    db : Session
+        database session
+    filters : SalesFilter
+        date and dimension filters
+    granularity : str
+        ``day``, ``week`` (starting Monday) or ``month``
+    group_by : str, optional
+        ``product_id``, ``customer_id``, ``location_id`` or ``business_unit``
+
+    Returns
+    -------
+    series : dict
+        ``bucket``, ``group`` (when grouped), ``transactions``, ``qty`` and ``revenue``
+        ordered by bucket
+    """
+    rows = _aggregate(db, filters, [group_by] if group_by else [], granularity)
+    return _columns(rows, ["bucket", *(["group"] if group_by else []), "transactions", "qty", "revenue"])
+
+
+def series_granularity(start: date, end: date, max_points: int) -> str:
+    """
+    Finest of day, week and month with at most ``SERIES_OVERSAMPLING * max_points`` buckets between two dates
+    """
+    days = (end - start).days + 1
+    for granularity, bucket_days in BUCKET_DAYS.items():
+        if days / bucket_days <= SERIES_OVERSAMPLING * max_points:
+            return granularity
+    return "month"
+
+
+def sales_series(db: Session, filters: SalesFilter, max_points: int = 500,
+                 value: str = "revenue") -> Dict:
+    """
+    Transactions, quantity and revenue over a date range in at most ``max_points`` points
+
+    The resolution adapts to the range: the finest of day, week and month
+    giving a few buckets per point. When that is still more than
+    ``max_points`` buckets, the buckets that best preserve the shape of
+    ``value`` are kept (LTTB), so peaks stay visible at any range.
+
+    Parameters
+    ----------
+    db : Session
+        database session
+    filters : SalesFilter
+        date and dimension filters, the range defaults to the first and last sale
+    max_points : int
+        most points returned, at least 3
+    value : str
+        ``transactions``, ``qty`` or ``revenue``, the series whose shape is preserved
+
+    Returns
+    -------
+    series : dict
+        ``granularity``, ``total_buckets`` and the ``bucket``, ``transactions``, ``qty``
+        and ``revenue`` columns of the kept buckets, ordered by bucket
+    """
+    # checked once, the range and the buckets come from the same source
+    fresh = rollup_store.ensure_fresh(db)
+    if filters.start_date and filters.end_date:
+        start, end = filters.start_date, filters.end_date
+    else:
+        sales_range = date_range(db, filters, fresh)
+        if sales_range is None:
+            return {"granularity": "day", "total_buckets": 0,
+                    **_columns([], ["bucket", "transactions", "qty", "revenue"])}
+        start = max(filters.start_date or date.min, sales_range[0])
+        end = min(filters.end_date or date.max, sales_range[1])
+    granularity = series_granularity(start, end, max_points)
+    rows = _aggregate(db, filters, granularity=granularity, fresh=fresh)
+    columns = _columns(rows, ["bucket", "transactions", "qty", "revenue"])
+
+    if len(rows) > max_points:
+        x = np.array([date.fromisoformat(str(bucket)).toordinal() for bucket in columns["bucket"]])
+        kept = lttb(x, np.array(columns[value], dtype=float), max_points).tolist()
+        columns = {name: [values[i] for i in kept] for name, values in columns.items()}
+    return {"granularity": granularity, "total_buckets": len(rows), **columns}
+
+
+def daily_sales(db: Session, filters: SalesFilter) -> Dict[str, List]:
+    """
+    Transactions, quantity and revenue per day
+
+    Parameters
+    ----------
+    db : Session
+        database session
+    filters : SalesFilter
+        date and dimension filters
+
+    Returns
+    -------
+    series : dict
+        ``date``, ``transactions``, ``qty`` and ``revenue`` columns ordered by date
+    """
+    rows = _aggregate(db, filters, granularity="day")
+    return _columns(rows, ["date", "transactions", "qty", "revenue"])
+
+
+def revenue_by_product(db: Session, filters: SalesFilter, limit: Optional[int] = None) -> Dict[str, List]:
+    """
+    Transactions, quantity and revenue per product, highest revenue first
+
+    Parameters
+    ----------
+    db : Session
+        database session
+    filters : SalesFilter
+        date and dimension filters
+    limit : int, optional
+        only return the top products
+
+    Returns
+    -------
+    series : dict
+        ``product_id``, ``name``, ``transactions``, ``qty`` and ``revenue`` columns
+    """
+    rows = sorted(_aggregate(db, filters, ["product_id"]), key=lambda r: r[3], reverse=True)[:limit]
+    names = dict(db.execute(select(Product.product_id, Product.name)
+                            .where(Product.product_id.in_([r[0] for r in rows]))).all())
+    rows = [(product_id, names[product_id], *totals) for product_id, *totals in rows]
+    return _columns(rows, ["product_id", "name", "transactions", "qty", "revenue"])
+
+
+def revenue_by_customer(db: Session, filters: SalesFilter, limit: Optional[int] = None) -> Dict[str, List]:
+    """
+    Transactions, quantity, revenue and first/last purchase per customer, highest revenue first
+
+    Parameters
+    ----------
+    db : Session
+        database session
+    filters : SalesFilter
+        date and dimension filters
+    limit : int, optional
+        only return the top customers
+
+    Returns
+    -------
+    series : dict
+        ``customer_id``, ``transactions``, ``qty``, ``revenue``, ``first_date`` and ``last_date`` columns
+    """
+    rows = _aggregate(db, filters, ["customer_id"], with_range=True)
+    rows = sorted(rows, key=lambda r: r[3], reverse=True)[:limit]
+    return _columns(rows, ["customer_id", "transactions", "qty", "revenue", "first_date", "last_date"])
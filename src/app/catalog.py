@@ -0,0 +1,259 @@
+import random
+import threading
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.app import rfm_sketches, rollups
+from src.app.data_version import EDITS_TABLE, DataVersionWatcher, data_version_watcher
+from src.app.metrics import CACHE_REQUESTS
+
+# rows sampled for column statistics
+DEFAULT_SAMPLE_SIZE = 1000
+MAX_SAMPLE_SIZE = 10_000
+# derived tables are kept in an attached database, older databases may still have copies of them;
+# the edit counts of the data version watcher are not data either
+INTERNAL_TABLES = frozenset([EDITS_TABLE, *(table.name for metadata in (rollups.metadata, rfm_sketches.metadata)
+                                            for table in metadata.tables.values())])
+
+
+class UnknownTableError(KeyError):
+    """
+    Raised when a table is not in the schema catalog
+    """
+
+
+def quote_identifier(name: str) -> str:
+    """
+    Quote a SQLite identifier, doubling embedded quotes
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _jsonable(value):
+    # BLOB values are returned as hex, JSON has no bytes
+    return value.hex() if isinstance(value, bytes) else value
+
+
+@dataclass(frozen=True)
+class TableSchema:
+    """
+    Columns and indexes of a table, as reported by the table_xinfo and index_list pragmas
+    """
+
+    name: str
+    columns: List[Dict]
+    indexes: List[Dict]
+    has_rowid: bool
+
+    def as_dict(self) -> Dict:
+        return asdict(self)
+
+
+class SchemaCatalog:
+    """
+    Tables, columns and indexes of the database, cached until ``PRAGMA schema_version`` changes.
+
+    Derived tables (rollups, RFM summary and sketches) and edit counts are not listed.
+
+    Table statistics are estimated from ``sqlite_stat1`` (written by ``ANALYZE``)
+    and a random sample of rowids instead of full scans, and cached per data
+    version.
+    """
+
+    def __init__(self, watcher: DataVersionWatcher = data_version_watcher):
+        self.watcher = watcher
+        self._lock = threading.Lock()
+        self._schema_version: Optional[int] = None
+        self._tables: Dict[str, TableSchema] = {}
+        self._first: Optional[str] = None
+        self._stats: Dict[Tuple[str, int], Dict] = {}
+        self._stats_version: Optional[str] = None
+
+    def tables(self, db: Session) -> Dict[str, TableSchema]:
+        """
+        Return the catalog, reloading it if the schema changed
+
+        Parameters
+        ----------
+        db : Session
+            database session
+
+        Returns
+        -------
+        tables : dict
+            table name -> TableSchema, in name order
+        """
+        schema_version = db.execute(text("PRAGMA schema_version")).scalar()
+        with self._lock:
+            if schema_version != self._schema_version:
+                CACHE_REQUESTS.inc("schema_catalog", "miss")
+                self._tables, self._first = self._load(db)
+                self._schema_version = schema_version
+                self._stats = {}
+            else:
+                CACHE_REQUESTS.inc("schema_catalog", "hit")
+            return self._tables
+
+    def table(self, db: Session, name: str) -> TableSchema:
+        """
+        Return one table of the catalog, raising UnknownTableError if it does not exist
+        """
+        try:
+            return self.tables(db)[name]
+        except KeyError:
+            raise UnknownTableError(name)
+
+    def first_table(self, db: Session) -> Optional[str]:
+        """
+        Return the first table created, None if there are no tables
+        """
+        self.tables(db)
+        return self._first
+
+    @staticmethod
+    def _load(db: Session) -> Tuple[Dict[str, TableSchema], Optional[str]]:
+        names = [
+            (name, sql) for name, sql in db.execute(text(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY rowid"
+            ))
+            if name not in INTERNAL_TABLES
+        ]
+        tables = {}
+        for name, sql in sorted(names):
+            quoted = quote_identifier(name)
+            columns = [
+                {"name": c.name, "type": c.type, "not_null": bool(c.notnull),
+                 "default": c.dflt_value, "primary_key": c.pk}
+                for c in db.execute(text(f"PRAGMA table_xinfo({quoted})"))
+                if not c.hidden
+            ]
+            indexes = [
+                {"name": i.name, "unique": bool(i.unique), "origin": i.origin,
+                 "columns": [c.name for c in db.execute(text(f"PRAGMA index_info({quote_identifier(i.name)})"))]}
+                for i in db.execute(text(f"PRAGMA index_list({quoted})")).all()
+            ]
+            has_rowid = "WITHOUT ROWID" not in (sql or "").upper()
+            tables[name] = TableSchema(name, columns, indexes, has_rowid)
+        return tables, names[0][0] if names else None
+
+    def preview(self, db: Session, name: str, limit: int = 10, offset: int = 0) -> Dict:
+        """
+        Return a page of rows of a table
+
+        Parameters
+        ----------
+        db : Session
+            database session
+        name : str
+            table name, must be in the catalog
+        limit : int
+            number of rows
+        offset : int
+            rows to skip, in rowid order for rowid tables
+
+        Returns
+        -------
+        page : dict
+            ``table``, ``columns`` and ``rows``
+        """
+        table = self.table(db, name)
+        order = " ORDER BY rowid" if table.has_rowid else ""
+        result = db.execute(text(f"SELECT * FROM {quote_identifier(table.name)}{order} LIMIT :limit OFFSET :offset"),
+                            {"limit": limit, "offset": offset})
+        return {"table": table.name, "columns": list(result.keys()), "rows": [[_jsonable(value) for value in row] for row in result]}
+
+    def stats(self, db: Session, name: str, sample_size: int = DEFAULT_SAMPLE_SIZE) -> Dict:
+        """
+        Estimate the row count and per-column statistics of a table without scanning it.
+
+        The row count comes from ``sqlite_stat1`` when the database was analyzed,
+        otherwise from the rowid range, which is exact unless rows were deleted.
+        Column statistics are computed over up to ``sample_size`` rows picked by
+        random rowid lookups.
+
+        Parameters
+        ----------
+        db : Session
+            database session
+        name : str
+            table name, must be in the catalog
+        sample_size : int
+            number of rows to sample
+
+        Returns
+        -------
+        stats : dict
+            ``table``, ``row_count``, ``row_count_source``, ``sample_size`` and ``columns``
+        """
+        table = self.table(db, name)
+        token = self.watcher.fingerprint().token
+        key = (table.name, sample_size)
+        with self._lock:
+            if self._stats_version != token:
+                self._stats, self._stats_version = {}, token
+            cached = self._stats.get(key)
+        CACHE_REQUESTS.inc("table_stats", "hit" if cached is not None else "miss")
+        if cached is not None:
+            return cached
+
+        quoted = quote_identifier(table.name)
+        low = high = None
+        if table.has_rowid:
+            low, high = db.execute(text(f"SELECT min(rowid), max(rowid) FROM {quoted}")).one()
+        row_count, source = self._row_count(db, table, low, high)
+        if table.has_rowid:
+            if low is None:
+                rowids = []
+            elif high - low + 1 <= sample_size:
+                rowids = None
+            else:
+                rowids = random.Random(0).sample(range(low, high + 1), sample_size)
+            sample = (f"SELECT * FROM {quoted}" if rowids is None
+                      else f"SELECT * FROM {quoted} WHERE rowid IN ({','.join(map(str, rowids or [0]))})")
+        else:
+            sample = f"SELECT * FROM {quoted} LIMIT {int(sample_size)}"
+
+        aggregates = []
+        for column in table.columns:
+            c = quote_identifier(column["name"])
+            aggregates += [f"count({c})", f"count(DISTINCT {c})", f"min({c})", f"max({c})"]
+        values = db.execute(text(f"SELECT count(*), {', '.join(aggregates)} FROM ({sample})")).one()
+        sampled = values[0]
+        columns = []
+        for i, column in enumerate(table.columns):
+            non_null, distinct, minimum, maximum = values[1 + 4 * i:5 + 4 * i]
+            columns.append({
+                "name": column["name"],
+                "null_fraction": (1 - non_null / sampled) if sampled else None,
+                "distinct_in_sample": distinct,
+                "min": _jsonable(minimum),
+                "max": _jsonable(maximum),
+            })
+
+        stats = {"table": table.name, "row_count": row_count, "row_count_source": source,
+                 "sample_size": sampled, "columns": columns}
+        with self._lock:
+            if self._stats_version == token:
+                self._stats[key] = stats
+        return stats
+
+    @staticmethod
+    def _row_count(db: Session, table: TableSchema, low: Optional[int],
+                   high: Optional[int]) -> Tuple[Optional[int], str]:
+        analyzed = db.execute(text(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+        )).scalar()
+        if analyzed:
+            stat = db.execute(text("SELECT stat FROM sqlite_stat1 WHERE tbl = :name LIMIT 1"),
+                              {"name": table.name}).scalar()
+            if stat:
+                return int(stat.split()[0]), "sqlite_stat1"
+        if table.has_rowid:
+            return (0 if low is None else high - low + 1), "rowid_range"
+        return None, "unknown"
+
+
+schema_catalog = SchemaCatalog()
@@ -0,0 +1,228 @@
+import logging
+import sqlite3
+import threading
+import uuid
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.config.env_vars import ENV_VARS
+
+logger = logging.getLogger(__name__)
+
+# edits per table, counted by triggers so that any process sees them; appending sales is not an edit
+EDITS_TABLE = "DataEdits"
+# tables the sales data (transactions, rollups, RFM summaries) is computed from
+SALES_TABLES = ("Sales", "Products")
+# one statement, so that the values come from the same read transaction
+_FINGERPRINT = (
+    "SELECT (SELECT coalesce(max(SaleId), 0) FROM Sales), (SELECT count(*) FROM Sales), "
+    f"(SELECT coalesce(sum(Edits), 0) FROM {EDITS_TABLE} WHERE TableName IN {SALES_TABLES!r}), "
+    f"(SELECT coalesce(sum(Edits), 0) FROM {EDITS_TABLE}), (SELECT schema_version FROM pragma_schema_version)"
+)
+_UNTRACKED_FINGERPRINT = (
+    "SELECT coalesce(max(SaleId), 0), count(*), NULL, NULL, (SELECT schema_version FROM pragma_schema_version) "
+    "FROM Sales"
+)
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+class DataFingerprint(NamedTuple):
+    """
+    Identify the state of the ``Sales`` table, and of the database for the token
+    """
+
+    epoch: str
+    data_version: int
+    max_sale_id: int
+    row_count: int
+    # edits of SALES_TABLES and of every table, None when the database could not be set up to count them
+    sales_edits: Optional[int] = None
+    edits: Optional[int] = None
+    schema_version: int = 0
+
+    @property
+    def token(self) -> str:
+        """
+        Version of the data, the same in every process for the same database contents
+        """
+        if self.edits is None:
+            # only PRAGMA data_version tells about in-place changes, and it is local to the watcher
+            return f"{self.epoch}-{self.data_version}-{self.max_sale_id}-{self.row_count}"
+        return f"{self.schema_version}-{self.edits}-{self.max_sale_id}-{self.row_count}"
+
+    def matches(self, other: "DataFingerprint") -> bool:
+        """
+        Whether two fingerprints describe the same sales data.
+
+        Appended and deleted sales move the max SaleId or the row count,
+        in-place changes of ``Sales`` and ``Products`` the edit count, which
+        persists in the database and so compares between processes (e.g. a
+        snapshot written before a restart or by a model worker). Without edit
+        counts, ``PRAGMA data_version`` is only comparable between reads made on
+        the same connection, and fingerprints of different epochs never match.
+        """
+        if ((self.max_sale_id, self.row_count, self.sales_edits)
+                != (other.max_sale_id, other.row_count, other.sales_edits)):
+            return False
+        if self.sales_edits is not None:
+            return True
+        return self.epoch == other.epoch and self.data_version == other.data_version
+
+
+class DataVersionWatcher:
+    """
+    Track changes of the SQLite database through a dedicated connection.
+
+    ``PRAGMA data_version`` changes whenever another connection commits, so
+    polling it costs a few microseconds. The more expensive ``max(SaleId)``
+    and ``count(*)`` are only recomputed when it moves.
+
+    In-place changes do not move ``max(SaleId)`` or ``count(*)``. On first use,
+    and when the schema changed, the watcher adds triggers counting the updates
+    and deletes of every table, and the inserts of every table but ``Sales``,
+    into ``DataEdits``. The counts are part of the fingerprint. If the database
+    cannot be written, edits are not counted and only the watcher's own
+    process notices them.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.epoch = uuid.uuid4().hex[:8]
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._fingerprint: Optional[DataFingerprint] = None
+        self._tracked_schema: Optional[int] = None
+        self._tracking = False
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        return self._conn
+
+    def fingerprint(self) -> DataFingerprint:
+        """
+        Return the current fingerprint of the ``Sales`` table
+
+        Returns
+        -------
+        fingerprint : DataFingerprint
+            data version, max SaleId, row count, edit counts and schema version
+        """
+        with self._lock:
+            conn = self._connection()
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if self._fingerprint is None or self._fingerprint.data_version != data_version:
+                if conn.execute("PRAGMA schema_version").fetchone()[0] != self._tracked_schema:
+                    self._track_edits(conn)
+                row = conn.execute(_FINGERPRINT if self._tracking else _UNTRACKED_FINGERPRINT).fetchone()
+                self._fingerprint = DataFingerprint(self.epoch, data_version, *row)
+            return self._fingerprint
+
+    def _track_edits(self, conn: sqlite3.Connection):
+        tables = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+            "AND sql NOT LIKE 'CREATE VIRTUAL%'"
+        ).fetchall()
+        triggers = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+        script = []
+        for (table,) in tables:
+            if table == EDITS_TABLE:
+                continue
+            # new sales are told apart by SaleId and row count, so appends stay incremental
+            for event in ("UPDATE", "DELETE") if table == "Sales" else ("INSERT", "UPDATE", "DELETE"):
+                trigger = f"{EDITS_TABLE}_{table}_{event.lower()}"
+                if trigger not in triggers:
+                    script += [
+                        f"INSERT OR IGNORE INTO {EDITS_TABLE} VALUES ({_literal(table)}, 0)",
+                        f"CREATE TRIGGER IF NOT EXISTS {_quote(trigger)} AFTER {event} ON {_quote(table)} "
+                        f"BEGIN UPDATE {EDITS_TABLE} SET Edits = Edits + 1 WHERE TableName = {_literal(table)}; END",
+                    ]
+        try:
+            if script:
+                conn.executescript(";\n".join([
+                    "BEGIN IMMEDIATE",
+                    f"CREATE TABLE IF NOT EXISTS {EDITS_TABLE} (TableName TEXT PRIMARY KEY, Edits INTEGER NOT NULL)",
+                    *script,
+                    "COMMIT",
+                ]))
+            self._tracking = True
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.rollback()
+            logger.warning("Edits of the database are not counted, only appended sales are noticed: %s", e)
+            self._tracking = False
+        self._tracked_schema = conn.execute("PRAGMA schema_version").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+data_version_watcher = DataVersionWatcher(ENV_VARS.DB_URL)
+
+
+def sales_state(db: Session) -> Tuple[int, int, Optional[int]]:
+    """
+    Read the max SaleId, the row count and the edits of the sales tables in one statement
+
+    Parameters
+    ----------
+    db : Session
+        database session
+
+    Returns
+    -------
+    state : tuple
+        max SaleId, number of sales and edits of ``SALES_TABLES``, None when edits are not counted
+    """
+    tracked = data_version_watcher.fingerprint().sales_edits is not None
+    edits = (f"(SELECT coalesce(sum(Edits), 0) FROM {EDITS_TABLE} WHERE TableName IN {SALES_TABLES!r})"
+             if tracked else "NULL")
+    return tuple(db.execute(text(f"SELECT coalesce(max(SaleId), 0), count(*), {edits} FROM Sales")).one())
+
+
+IngestHook = Callable[[Session, DataFingerprint, int], None]
+_ingest_hooks: List[IngestHook] = []
+
+
+def on_sales_ingested(hook: IngestHook) -> IngestHook:
+    """
+    Register a hook called after sales were inserted through the API.
+
+    Hooks receive the session, the fingerprint taken before the insert and
+    the first inserted SaleId, so that derived state can be updated from the
+    new rows only.
+    """
+    _ingest_hooks.append(hook)
+    return hook
+
+
+def notify_sales_ingested(db: Session, previous: DataFingerprint, first_sale_id: int):
+    """
+    Run the registered ingest hooks, logging instead of raising on failure
+
+    Parameters
+    ----------
+    db : Session
+        database session
+    previous : DataFingerprint
+        fingerprint of the ``Sales`` table before the insert
+    first_sale_id : int
+        smallest inserted SaleId
+    """
+    for hook in _ingest_hooks:
+        try:
+            hook(db, previous, first_sale_id)
+        except Exception as e:
+            logger.exception("Ingest hook %s failed: %s", hook.__name__, e)
@@ -0,0 +1,49 @@
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Pick the points of a series that best preserve its shape, Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept. The points in between are split into
+    ``n_out - 2`` buckets of equal size, and from each bucket the point
+    forming the largest triangle with the point kept in the previous bucket
+    and the mean of the next bucket is kept. Peaks and troughs survive, unlike
+    with averaging or taking every k-th point.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        increasing x coordinates
+    y : np.ndarray
+        values
+    n_out : int
+        number of points to keep, at least 3
+
+    Returns
+    -------
+    indices : np.ndarray
+        increasing indices of the kept points, all of them when there are at most ``n_out``
+    """
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # bucket i spans [edges[i], edges[i + 1]), the first and last points are buckets of their own
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    kept = np.empty(n_out, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[end:edges[i + 2]].mean(), y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        # twice the triangle areas, the constant factor does not change the argmax
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = kept[i + 1] = start + int(areas.argmax())
+    return kept
@@ -0,0 +1,35 @@
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from src.models import Transaction
+
+
+@dataclass
+class SalesFilter:
+    """
+    Date and dimension filters shared by the analytics queries
+    """
+
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    customer_id: Optional[str] = None
+    product_id: Optional[int] = None
+    location_id: Optional[int] = None
+    business_unit: Optional[int] = None
+
+    def apply(self, stmt):
+        if self.start_date:
+            stmt = stmt.where(Transaction.date >= datetime.combine(self.start_date, time.min))
+        if self.end_date:
+            # end_date is inclusive
+            stmt = stmt.where(Transaction.date < datetime.combine(self.end_date + timedelta(days=1), time.min))
+        if self.customer_id:
+            stmt = stmt.where(Transaction.customer_id == self.customer_id)
+        if self.product_id is not None:
+            stmt = stmt.where(Transaction.product_id == self.product_id)
+        if self.location_id is not None:
+            stmt = stmt.where(Transaction.location_id == self.location_id)
+        if self.business_unit is not None:
+            stmt = stmt.where(Transaction.business_unit == self.business_unit)
+        return stmt
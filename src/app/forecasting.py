@@ -0,0 +1,318 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from src.app.analytics import _aggregate, date_range
+from src.app.data_version import DataVersionWatcher, data_version_watcher
+from src.app.filters import SalesFilter
+from src.app.metrics import CACHE_REQUESTS
+from src.app.model_pool import ModelExecutor
+from src.app.rollups import rollup_store
+from src.app.singleflight import SingleFlight
+from src.database import SessionLocal
+
+# weekly seasonality of daily sales
+SEASON = 7
+# smoothing parameters tried for every series, the best in-sample fit is kept
+LEVEL_GRID = (0.02, 0.05, 0.1, 0.2, 0.4, 0.7)
+SEASON_GRID = (0.0, 0.05, 0.1, 0.2)
+# series per worker task, smaller matrices are fitted in a single task
+SERIES_PER_TASK = 500
+# forecasts kept per data version
+CACHED_FORECASTS = 32
+METRICS = ("transactions", "qty", "revenue")
+
+
+@dataclass
+class SalesMatrix:
+    """
+    Daily totals of many series over the same days, zero on days without sales
+    """
+
+    series_id: np.ndarray
+    start: date
+    values: np.ndarray
+
+    @property
+    def end(self) -> date:
+        return self.start + timedelta(days=self.values.shape[1] - 1)
+
+
+def sales_matrix(db: Session, group_by: str, metric: str, history_days: int) -> SalesMatrix:
+    """
+    Build the dense (series × day) matrix of a metric over the last days of sales
+
+    Parameters
+    ----------
+    db : Session
+        database session
+    group_by : str
+        ``product_id`` or ``location_id``, one series per value
+    metric : str
+        ``transactions``, ``qty`` or ``revenue``
+    history_days : int
+        days up to the last sale
+
+    Returns
+    -------
+    matrix : SalesMatrix
+        one row per series seen in the window, ordered by id
+    """
+    fresh = rollup_store.ensure_fresh(db)
+    sales_range = date_range(db, SalesFilter(), fresh)
+    if sales_range is None:
+        return SalesMatrix(np.empty(0, dtype=np.int64), date.today(), np.zeros((0, history_days)))
+    end = sales_range[1]
+    start = end - timedelta(days=history_days - 1)
+
+    rows = _aggregate(db, SalesFilter(start_date=start, end_date=end), [group_by], "day", fresh=fresh)
+    rows = [row for row in rows if row[1] is not None]
+    days = np.array([date.fromisoformat(str(row[0])).toordinal() for row in rows], dtype=np.int64)
+    groups = np.array([row[1] for row in rows], dtype=np.int64)
+    values = np.array([row[2 + METRICS.index(metric)] for row in rows], dtype=np.float64)
+
+    series_id, rows_of = np.unique(groups, return_inverse=True)
+    matrix = np.zeros((len(series_id), history_days))
+    matrix[rows_of, days - start.toordinal()] = values
+    return SalesMatrix(series_id, start, matrix)
+
+
+def seasonal_mean(values: np.ndarray, horizon: int, weeks: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Forecast every series with the mean of the same weekday over the last weeks
+
+    Parameters
+    ----------
+    values : np.ndarray
+        (series × day) matrix, at least ``SEASON`` days
+    horizon : int
+        days to forecast
+    weeks : int
+        weeks averaged
+
+    Returns
+    -------
+    forecast : np.ndarray
+        (series × horizon) matrix
+    rmse : np.ndarray
+        root mean squared error of the same forecast one week earlier, per series
+    """
+    n_days = values.shape[1]
+    weeks = max(1, min(weeks, n_days // SEASON))
+    recent = values[:, n_days - weeks * SEASON:].reshape(len(values), weeks, SEASON)
+    profile = recent.mean(axis=1)
+    # the profile starts a whole number of weeks before the first forecast day
+    forecast = profile[:, np.arange(horizon) % SEASON]
+
+    if weeks > 1:
+        previous = recent[:, :-1].mean(axis=1)
+        rmse = np.sqrt(((recent[:, -1] - previous) ** 2).mean(axis=1))
+    else:
+        rmse = np.full(len(values), np.nan)
+    return forecast, rmse
+
+
+def fit_ets(values: np.ndarray, horizon: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fit exponential smoothing with additive weekly seasonality to every series at once
+
+    ETS(A,N,A): ``y[t] = level + season[t % 7] + e[t]``, with
+    ``level += alpha * e[t]`` and ``season[t % 7] += gamma * e[t]``. Every
+    (alpha, gamma) of ``LEVEL_GRID × SEASON_GRID`` is run on every series in
+    the same pass, the arrays being (grid × series); each series keeps the
+    parameters with the lowest one-step-ahead squared error after the first
+    two weeks, which initialise the level and seasonal profile. The loop is
+    over days only.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        (series × day) matrix, at least ``2 * SEASON`` days
+    horizon : int
+        days to forecast
+
+    Returns
+    -------
+    forecast : np.ndarray
+        (series × horizon) matrix, clipped at zero
+    rmse : np.ndarray
+        one-step-ahead root mean squared error of the kept parameters, per series
+    """
+    n_series, n_days = values.shape
+    # one row per (alpha, gamma), broadcast against the series
+    alpha, gamma = (grid.reshape(-1, 1) for grid in np.meshgrid(LEVEL_GRID, SEASON_GRID, indexing="ij"))
+    warmup = 2 * SEASON
+
+    initial = values[:, :warmup].reshape(n_series, 2, SEASON).mean(axis=1)
+    level = np.broadcast_to(initial.mean(axis=1), (len(alpha), n_series)).copy()
+    season = np.broadcast_to(initial - initial.mean(axis=1, keepdims=True),
+                             (len(alpha), n_series, SEASON)).copy()
+    sse = np.zeros((len(alpha), n_series))
+    for t in range(warmup, n_days):
+        slot = t % SEASON
+        error = values[:, t] - (level + season[:, :, slot])
+        sse += error * error
+        level += alpha * error
+        season[:, :, slot] += gamma * error
+
+    best = sse.argmin(axis=0)
+    columns = np.arange(n_series)
+    slots = (n_days + np.arange(horizon)) % SEASON
+    forecast = level[best, columns][:, None] + season[best, columns][:, slots]
+    rmse = np.sqrt(sse[best, columns] / max(n_days - warmup, 1))
+    return np.clip(forecast, 0, None), rmse
+
+
+@dataclass
+class SalesForecast:
+    """
+    Forecasts of every series of a dimension
+    """
+
+    data_version: str
+    group_by: str
+    metric: str
+    method: str
+    history_start: date
+    as_of: date
+    series_id: np.ndarray
+    total: np.ndarray
+    forecast: np.ndarray
+    rmse: np.ndarray
+
+    def to_dict(self, series_id: Optional[Sequence[int]] = None, limit: Optional[int] = None) -> Dict:
+        """
+        Response content, for the given series or the ``limit`` series with the largest history totals
+        """
+        rows = np.argsort(-self.total, kind="stable")
+        if series_id is not None:
+            rows = rows[np.isin(self.series_id[rows], list(series_id))]
+        rows = rows[:limit]
+        horizon = self.forecast.shape[1]
+        return {
+            "data_version": self.data_version,
+            "group_by": self.group_by,
+            "metric": self.metric,
+            "method": self.method,
+            "history_start": self.history_start,
+            "as_of": self.as_of,
+            "total_series": len(self.series_id),
+            "dates": [self.as_of + timedelta(days=h + 1) for h in range(horizon)],
+            "series_id": self.series_id[rows].tolist(),
+            "history_total": self.total[rows].tolist(),
+            "rmse": [None if np.isnan(v) else v for v in self.rmse[rows].tolist()],
+            "forecast": self.forecast[rows].round(4).tolist(),
+        }
+
+
+class SalesForecaster:
+    """
+    Forecast daily sales of every product or location, cached per data version.
+
+    All series of a dimension are fitted together on a dense (series × day)
+    matrix. ``ets`` fits are split across the model worker pool, in tasks of at
+    least ``SERIES_PER_TASK`` series; ``seasonal_mean`` is cheap enough to run in the
+    threadpool. Identical concurrent requests share one computation.
+
+    Parameters
+    ----------
+    executor : ModelExecutor
+        worker pool of the ``ets`` fits
+    watcher : DataVersionWatcher
+        data fingerprint the cache is keyed on
+    """
+
+    def __init__(self, executor: ModelExecutor, watcher: DataVersionWatcher = data_version_watcher):
+        self.executor = executor
+        self.watcher = watcher
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple, SalesForecast]" = OrderedDict()
+        self._single_flight = SingleFlight()
+
+    async def forecast(self, group_by: str, metric: str, method: str, horizon: int,
+                       history_days: int) -> SalesForecast:
+        """
+        Return the forecast of every series for the current data, computing it if the data changed
+
+        Parameters
+        ----------
+        group_by : str
+            ``product_id`` or ``location_id``
+        metric : str
+            ``transactions``, ``qty`` or ``revenue``
+        method : str
+            ``ets`` or ``seasonal_mean``
+        horizon : int
+            days to forecast after the last sale
+        history_days : int
+            days of history the models are fitted on
+
+        Returns
+        -------
+        forecast : SalesForecast
+            forecasts and in-sample errors per series
+        """
+        token = (await run_in_threadpool(self.watcher.fingerprint)).token
+        key = (token, group_by, metric, method, horizon, history_days)
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+        if result is not None:
+            CACHE_REQUESTS.inc("forecast", "hit")
+            return result
+
+        CACHE_REQUESTS.inc("forecast", "miss")
+        result = await self._single_flight.do("forecast", key, lambda: self._compute(*key))
+        with self._lock:
+            # forecasts of older data versions are never served again
+            for stale in [k for k in self._cache if k[0] != token]:
+                del self._cache[stale]
+            self._cache[key] = result
+            while len(self._cache) > CACHED_FORECASTS:
+                self._cache.popitem(last=False)
+        return result
+
+    async def _compute(self, token: str, group_by: str, metric: str, method: str, horizon: int,
+                       history_days: int) -> SalesForecast:
+        matrix = await run_in_threadpool(self._load, group_by, metric, history_days)
+        values = matrix.values
+        if not len(values):
+            forecast, rmse = np.zeros((0, horizon)), np.zeros(0)
+        elif method == "seasonal_mean":
+            forecast, rmse = await run_in_threadpool(seasonal_mean, values, horizon)
+        else:
+            # at most one task per worker, so a forecast does not crowd out predictions
+            tasks = min(-(-len(values) // SERIES_PER_TASK), max(self.executor.workers, 1))
+            results = await asyncio.gather(*(self.executor.run("forecast", fit_ets, chunk, horizon)
+                                             for chunk in np.array_split(values, tasks)))
+            forecast = np.concatenate([r[0] for r in results])
+            rmse = np.concatenate([r[1] for r in results])
+
+        return SalesForecast(
+            data_version=token,
+            group_by=group_by,
+            metric=metric,
+            method=method,
+            history_start=matrix.start,
+            as_of=matrix.end,
+            series_id=matrix.series_id,
+            total=values.sum(axis=1),
+            forecast=forecast,
+            rmse=rmse,
+        )
+
+    @staticmethod
+    def _load(group_by: str, metric: str, history_days: int) -> SalesMatrix:
+        db = SessionLocal()
+        try:
+            return sales_matrix(db, group_by, metric, history_days)
+        finally:
+            db.close()
@@ -0,0 +1,215 @@
+import io
+import json
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.app.data_version import data_version_watcher, notify_sales_ingested
+from src.app.utils import LOOKUP_CHUNK_SIZE
+from src.models import Customer, Product
+
+# rows inserted per transaction
+INGEST_COMMIT_SIZE = 10_000
+MAX_REPORTED_ERRORS = 20
+
+REQUIRED_COLUMNS = ("date", "customer_id", "product_id", "qty")
+OPTIONAL_COLUMNS = ("id", "business_unit", "location_id")
+INTEGER_COLUMNS = ("id", "product_id", "qty", "business_unit", "location_id")
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/jsonl", "application/ndjson")
+ARROW_MEDIA_TYPES = ("application/vnd.apache.arrow.stream",)
+
+INSERT_SALES = ("INSERT INTO Sales (SaleId, Date, BusinessUnitId, CustomerId, LocationId, Qty, ProductId) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)")
+
+
+class SalesBatchError(ValueError):
+    """
+    Raised when a sales batch cannot be ingested
+    """
+
+    def __init__(self, message: str, errors: List[Dict] = None, error_count: int = 0, status_code: int = 422):
+        super().__init__(message)
+        self.status_code = status_code
+        self.errors = errors or []
+        self.error_count = error_count or len(self.errors)
+
+
+def parse_sales_payload(body: bytes, content_type: str) -> pd.DataFrame:
+    """
+    Parse an NDJSON, columnar JSON or Arrow stream payload into a frame
+
+    Parameters
+    ----------
+    body : bytes
+        request body
+    content_type : str
+        request content type
+
+    Returns
+    -------
+    df : pd.DataFrame
+        one row per sale, columns named like ``SaleRead`` fields
+    """
+    media_type = content_type.split(";")[0].strip().lower()
+    try:
+        if media_type in NDJSON_MEDIA_TYPES:
+            # dtype=False keeps ids such as "00123" as strings
+            return pd.read_json(io.BytesIO(body), lines=True, dtype=False, convert_dates=False)
+        if media_type in ARROW_MEDIA_TYPES:
+            return pa.ipc.open_stream(body).read_all().to_pandas()
+        columns = json.loads(body)
+    except (ValueError, pa.ArrowInvalid) as e:
+        raise SalesBatchError(f"Malformed payload: {e}")
+    if not isinstance(columns, dict) or not all(isinstance(v, list) for v in columns.values()):
+        raise SalesBatchError("JSON payloads must map column names to arrays of equal length")
+    if len({len(v) for v in columns.values()}) > 1:
+        raise SalesBatchError("Columns have different lengths")
+    return pd.DataFrame(columns)
+
+
+def _missing_ids(db: Session, column, values: List) -> set:
+    found = set()
+    for i in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        chunk = values[i:i + LOOKUP_CHUNK_SIZE]
+        found.update(db.execute(select(column).where(column.in_(chunk))).scalars())
+    return set(values) - found
+
+
+def validate_sales(db: Session, df: pd.DataFrame) -> List[Tuple]:
+    """
+    Validate and normalize a sales batch column by column
+
+    Parameters
+    ----------
+    db : Session
+        database session, used to check customer and product ids in bulk
+    df : pd.DataFrame
+        parsed payload
+
+    Returns
+    -------
+    rows : list of tuple
+        rows ready to insert, in ``INSERT_SALES`` parameter order
+    """
+    if df.empty:
+        raise SalesBatchError("Empty batch")
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise SalesBatchError(f"Missing columns: {', '.join(missing)}")
+    unknown = set(df.columns) - set(REQUIRED_COLUMNS) - set(OPTIONAL_COLUMNS)
+    if unknown:
+        raise SalesBatchError(f"Unknown columns: {', '.join(sorted(unknown))}")
+
+    df = df.reset_index(drop=True)
+    invalid: Dict[str, np.ndarray] = {}
+
+    for column in REQUIRED_COLUMNS:
+        invalid[f"{column} is required"] = df[column].isna().to_numpy()
+
+    dates = pd.to_datetime(df["date"], errors="coerce", format="ISO8601")
+    invalid["date is not an ISO 8601 datetime"] = (dates.isna() & df["date"].notna()).to_numpy()
+
+    integers = {}
+    for column in INTEGER_COLUMNS:
+        if column not in df.columns:
+            continue
+        integers[column] = values = pd.to_numeric(df[column], errors="coerce")
+        invalid[f"{column} is not an integer"] = (
+            (values.isna() & df[column].notna()) | (values % 1 > 0)
+        ).to_numpy()
+    invalid["qty must be positive"] = (integers["qty"] <= 0).to_numpy()
+    if "id" in df.columns:
+        invalid["id is required in every row when given"] = df["id"].isna().to_numpy()
+        invalid["duplicate id in batch"] = (integers["id"].duplicated(keep=False) & df["id"].notna()).to_numpy()
+
+    customer_ids = df["customer_id"].where(df["customer_id"].isna(), df["customer_id"].astype(str))
+    unknown_customers = _missing_ids(db, Customer.id, customer_ids.dropna().unique().tolist())
+    invalid["unknown customer_id"] = customer_ids.isin(unknown_customers).to_numpy()
+    product_ids = integers["product_id"].dropna().unique().astype(np.int64).tolist()
+    unknown_products = _missing_ids(db, Product.product_id, product_ids)
+    invalid["unknown product_id"] = integers["product_id"].isin(unknown_products).to_numpy()
+
+    errors, error_count = [], 0
+    for message, mask in invalid.items():
+        rows = np.flatnonzero(mask)
+        error_count += len(rows)
+        errors.extend({"row": int(row), "error": message} for row in rows[:MAX_REPORTED_ERRORS - len(errors)])
+    if error_count:
+        raise SalesBatchError(f"{error_count} invalid values in batch", errors, error_count)
+
+    def as_list(column):
+        # python ints and None, the only values sqlite3 binds
+        if column not in integers:
+            return [None] * len(df)
+        return [None if pd.isna(v) else int(v) for v in integers[column].tolist()]
+
+    return list(zip(
+        as_list("id"),
+        dates.dt.strftime("%Y-%m-%d %H:%M:%S.%f").tolist(),
+        as_list("business_unit"),
+        customer_ids.tolist(),
+        as_list("location_id"),
+        as_list("qty"),
+        as_list("product_id"),
+    ))
+
+
+def insert_sales(db: Session, rows: List[Tuple], commit_size: int = INGEST_COMMIT_SIZE) -> Dict:
+    """
+    Insert validated sales with ``executemany``, committing every ``commit_size`` rows,
+    then run the ingest hooks on the new rows
+
+    Parameters
+    ----------
+    db : Session
+        database session
+    rows : list of tuple
+        output of ``validate_sales``
+    commit_size : int
+        rows per transaction
+
+    Returns
+    -------
+    result : dict
+        inserted count, SaleId range and the new data version
+    """
+    previous = data_version_watcher.fingerprint()
+    explicit_ids = rows[0][0] is not None
+
+    first_sale_id = last_sale_id = None
+    inserted = 0
+    for i in range(0, len(rows), commit_size):
+        chunk = rows[i:i + commit_size]
+        conn = db.connection()
+        try:
+            conn.exec_driver_sql(INSERT_SALES, chunk)
+            if explicit_ids:
+                chunk_first, chunk_last = min(r[0] for r in chunk), max(r[0] for r in chunk)
+            else:
+                # still inside the write transaction, so the generated ids are consecutive
+                chunk_last = conn.exec_driver_sql("SELECT max(SaleId) FROM Sales").scalar()
+                chunk_first = chunk_last - len(chunk) + 1
+            db.commit()
+        except IntegrityError as e:
+            db.rollback()
+            if inserted:
+                notify_sales_ingested(db, previous, first_sale_id)
+            raise SalesBatchError(f"Rows {i}-{i + len(chunk) - 1} were rejected by the database after "
+                                  f"{inserted} rows were committed: {e.orig}", status_code=409)
+        inserted += len(chunk)
+        first_sale_id = chunk_first if first_sale_id is None else min(first_sale_id, chunk_first)
+        last_sale_id = chunk_last if last_sale_id is None else max(last_sale_id, chunk_last)
+
+    notify_sales_ingested(db, previous, first_sale_id)
+    return {
+        "inserted": inserted,
+        "first_sale_id": first_sale_id,
+        "last_sale_id": last_sale_id,
+        "data_version": data_version_watcher.fingerprint().token,
+    }
@@ -0,0 +1,82 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import String, func, select, type_coerce
+from sqlalchemy.orm import Session
+
+from src.models import Product, Transaction
+
+TRANSACTION_CHUNK_SIZE = 50_000
+
+
+def _transactions_statement(min_sale_id: Optional[int] = None):
+    stmt = (
+        select(
+            Transaction.customer_id,
+            # raw ISO strings, parsed per chunk by pandas instead of per row by SQLAlchemy
+            type_coerce(Transaction.date, String),
+            func.coalesce(Transaction.qty, 0),
+            func.coalesce(Transaction.qty, 0) * Product.price,
+        )
+        .join(Product, Transaction.product_id == Product.product_id)
+    )
+    if min_sale_id is not None:
+        stmt = stmt.where(Transaction.id > min_sale_id)
+    return stmt
+
+
+def load_transactions(db: Session,
+                      chunk_size: int = TRANSACTION_CHUNK_SIZE,
+                      min_sale_id: Optional[int] = None) -> pd.DataFrame:
+    """
+    Bulk load sales joined to product prices into a compact frame.
+
+    Only the needed columns are selected through a single join and read in
+    fixed-size chunks, each turned into NumPy columns right away, so no ORM
+    objects or per-row dicts are created.
+
+    Parameters
+    ----------
+    db : Session
+        database session
+    chunk_size : int
+        number of rows fetched and converted at a time
+    min_sale_id : int, optional
+        only load sales with a greater SaleId
+
+    Returns
+    -------
+    df : pd.DataFrame
+        frame with categorical ``customer_id``, ``date``, int32 ``qty`` and float32 ``amount``
+    """
+    categories: Dict[str, int] = {}
+    codes: List[np.ndarray] = []
+    dates: List[np.ndarray] = []
+    qtys: List[np.ndarray] = []
+    amounts: List[np.ndarray] = []
+
+    # Core execution, so rows skip the ORM loading layer
+    result = db.connection().execute(_transactions_statement(min_sale_id))
+    for rows in result.partitions(chunk_size):
+        customer_ids, raw_dates, qty, amount = zip(*rows)
+
+        # factorize the chunk, then translate its local codes to the global categories
+        local_codes, uniques = pd.factorize(np.asarray(customer_ids, dtype=object))
+        lookup = np.fromiter((categories.setdefault(u, len(categories)) for u in uniques),
+                             dtype=np.int32, count=len(uniques))
+        codes.append(np.append(lookup, -1)[local_codes])
+
+        dates.append(pd.to_datetime(np.asarray(raw_dates, dtype=object), format="ISO8601").to_numpy())
+        qtys.append(np.asarray(qty, dtype=np.int32))
+        amounts.append(np.asarray(amount, dtype=np.float32))
+
+    return pd.DataFrame({
+        "customer_id": pd.Categorical.from_codes(
+            np.concatenate(codes) if codes else np.empty(0, dtype=np.int32),
+            categories=list(categories)
+        ),
+        "date": np.concatenate(dates) if dates else np.empty(0, dtype="datetime64[us]"),
+        "qty": np.concatenate(qtys) if qtys else np.empty(0, dtype=np.int32),
+        "amount": np.concatenate(amounts) if amounts else np.empty(0, dtype=np.float32),
+    })
@@ -1,13 +1,54 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
-from src.app.middlewares import ExceptionHandlerMiddleware
-from src.app.routers import pareto, health, customers, products, sales, preview
+from src.app.metrics import instrument_engine, instrument_routes
+from src.app.middlewares import ConditionalGetMiddleware, ExceptionHandlerMiddleware
+from src.app.profiling import ProfilingMiddleware, instrument_profiling
+from src.app.rollups import rollup_store
+from src.app.routers import (pareto, health, customers, products, sales, preview, analytics, metrics, profiles,
+                             scheduler, forecast)
+from src.app.search import customer_search_index
 from src.config import APP_SETTINGS
+from src.config.env_vars import ENV_VARS
+from src.database import engine
+from src.query_audit import QueryAuditMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # bring the rollups up to date without delaying startup
+    if rollup_store.enabled:
+        rollup_store.refresh_in_background()
+    # customer autocomplete falls back to a synchronous build until this finishes
+    customer_search_index.build_in_background()
+    # otherwise the modeling stack is imported by the first /models/pnbd request
+    if ENV_VARS.PNBD_PREWARM:
+        pareto.model_executor.prewarm_in_background()
+    # refreshes summaries and refits the models as the data changes
+    if ENV_VARS.REFIT_SCHEDULER:
+        scheduler.refit_scheduler.start()
+    yield
+    await scheduler.refit_scheduler.stop()
+    pareto.model_executor.shutdown()
+
 
 # Instantiate the actions with documentation settings
-app = FastAPI(**APP_SETTINGS.model_dump(by_alias=True))
+app = FastAPI(lifespan=lifespan, **APP_SETTINGS.model_dump(by_alias=True))
 
 # add middlewares. ORDER IS IMPORTANT!!!
+# the last one added is the outermost, so that errors and timings cover the whole stack
+app.add_middleware(
+    ConditionalGetMiddleware,
+    paths=("/customers", "/products", "/sales", "/models/pnbd", "/analytics", "/preview", "/forecast"),
+    versions={"/models/pnbd": pareto.model_version},
+)
+if ENV_VARS.QUERY_AUDIT != "off":
+    app.add_middleware(QueryAuditMiddleware, max_repeats=ENV_VARS.QUERY_AUDIT_MAX_REPEATS,
+                       slow_ms=ENV_VARS.QUERY_AUDIT_SLOW_MS, raise_on_violation=ENV_VARS.QUERY_AUDIT == "raise")
+if ENV_VARS.PROFILE_DIR is not None:
+    app.add_middleware(ProfilingMiddleware, directory=ENV_VARS.PROFILE_DIR,
+                       paths=ENV_VARS.PROFILE_PATHS, clients=ENV_VARS.PROFILE_CLIENTS)
 app.add_middleware(ExceptionHandlerMiddleware)
 
 # add routers
@@ -17,3 +58,14 @@ app.include_router(products.router)
 app.include_router(sales.router)
 app.include_router(health.router)
 app.include_router(preview.router)
+app.include_router(analytics.router)
+app.include_router(metrics.router)
+app.include_router(profiles.router)
+app.include_router(scheduler.router)
+app.include_router(forecast.router)
+
+# latency and in-flight requests per route, SQL durations attributed to the route running them
+instrument_routes(app.routes)
+instrument_engine(engine)
+if ENV_VARS.PROFILE_DIR is not None:
+    instrument_profiling(app.routes, ENV_VARS.PROFILE_PATHS)
@@ -0,0 +1,330 @@
+import math
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from starlette.exceptions import HTTPException
+from starlette.routing import Route
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Prometheus client default buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# starlette appends the charset
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# route template of the request being served, for attributing queries
+current_route: ContextVar[str] = ContextVar("current_route", default="background")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _ShardOwner:
+    """
+    Held only by a thread's locals, so that it is collected when the thread exits
+    """
+
+
+class _Sharded(ABC):
+    """
+    Per-thread shards of a metric.
+
+    Each thread only ever writes its own shard, so updates need no lock and
+    only touch a thread-local dict. A scrape copies and sums every shard.
+    When a thread exits its shard is folded into a shard of retired totals,
+    so threads that come and go do not grow the list.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[Dict] = []
+        self._retired: Dict = {}
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> Dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            owner = self._local.owner = _ShardOwner()
+            weakref.finalize(owner, self._retire, shard)
+            with self._shards_lock:
+                self._shards.append(shard)
+            return shard
+
+    def _retire(self, shard: Dict):
+        # the thread is gone, nothing writes the shard any more
+        with self._shards_lock:
+            self._shards = [s for s in self._shards if s is not shard]
+            for labels, value in shard.items():
+                self._retired[labels] = self._add(self._retired.get(labels), value)
+
+    @staticmethod
+    @abstractmethod
+    def _add(total, value):
+        """
+        Sum of two values of the same labels, a new object so that copies of the retired totals stay unchanged
+        """
+
+    def _snapshots(self) -> List[Dict]:
+        with self._shards_lock:
+            shards = list(self._shards)
+            retired = self._retired.copy()
+        # dict.copy does not release the GIL, so it never sees a half-applied update
+        return [retired] + [shard.copy() for shard in shards]
+
+
+class Counter(_Sharded):
+    """
+    Monotonic counter, ``inc`` is lock-free
+    """
+
+    kind = "counter"
+
+    def inc(self, *labels, value: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + value
+
+    @staticmethod
+    def _add(total, value):
+        return (total or 0) + value
+
+    def values(self) -> Dict[Tuple, float]:
+        totals = {}
+        for shard in self._snapshots():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in sorted(self.values().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """
+    Value that goes up and down, such as requests in flight, summed over threads
+    """
+
+    kind = "gauge"
+
+    def dec(self, *labels, value: float = 1):
+        self.inc(*labels, value=-value)
+
+
+class CallbackGauge:
+    """
+    Gauge computed at scrape time, ``callback`` returns label values -> value
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 callback: Callable[[], Dict[Tuple, Optional[float]]]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in sorted(self.callback().items()):
+            if value is not None:
+                yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram(_Sharded):
+    """
+    Cumulative histogram with fixed buckets, ``observe`` is lock-free
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # one count per bucket plus +Inf, then the sum
+            state = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    @staticmethod
+    def _add(total, value):
+        return [a + b for a, b in zip(total, value)] if total else list(value)
+
+    @contextmanager
+    def time(self, *labels):
+        """
+        Observe the duration of the ``with`` block
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self) -> Iterable[str]:
+        totals: Dict[Tuple, List] = {}
+        for shard in self._snapshots():
+            for labels, state in shard.items():
+                state = list(state)
+                total = totals.setdefault(labels, [0] * len(state))
+                for i, value in enumerate(state):
+                    total[i] += value
+        for labels, state in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), state[:-1]):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(state[-1])}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    """
+    Metrics exposed on ``/metrics``
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def exposition(self) -> str:
+        """
+        Render every metric in the Prometheus text format
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "Time to serve a request, per route", ("method", "route", "status")))
+REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "Requests being served, per route", ("method", "route")))
+DB_QUERY_LATENCY = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL statement execution time, per route", ("route",), DB_BUCKETS))
+FIT_STAGE_LATENCY = registry.register(Histogram(
+    "pnbd_fit_stage_duration_seconds", "Time spent in each stage of a model fit", ("stage",),
+    (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)))
+MODEL_CALLS_REJECTED = registry.register(Counter(
+    "pnbd_executor_rejected_total", "Model calls turned away by admission control, by reason", ("reason",)))
+COALESCED_CALLS = registry.register(Counter(
+    "singleflight_calls_total", "Expensive calls by whether they ran or joined an identical running call",
+    ("operation", "result")))
+CACHE_REQUESTS = registry.register(Counter(
+    "cache_requests_total", "Cache lookups by result (hit, miss, or how a miss was served)", ("cache", "result")))
+
+
+def _hit_ratios() -> Dict[Tuple, Optional[float]]:
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), count in CACHE_REQUESTS.values().items():
+        hits_and_total = totals.setdefault(cache, [0, 0])
+        hits_and_total[0] += count if result == "hit" else 0
+        hits_and_total[1] += count
+    return {(cache,): hits / total for cache, (hits, total) in totals.items() if total}
+
+
+registry.register(CallbackGauge("cache_hit_ratio", "Share of cache lookups that were hits", ("cache",), _hit_ratios))
+
+
+class RouteMetrics:
+    """
+    ASGI wrapper around one route, recording its latency and in-flight requests
+    and labelling the SQL it runs with its path template
+    """
+
+    def __init__(self, app: ASGIApp, path: str):
+        self.app = app
+        self.path = path
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        method = scope.get("method", "")
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = current_route.set(self.path)
+        REQUESTS_IN_FLIGHT.inc(method, self.path)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except HTTPException as e:
+            # rendered by the exception middleware around the router
+            status = e.status_code
+            raise
+        finally:
+            REQUEST_LATENCY.observe(time.perf_counter() - start, method, self.path, str(status))
+            REQUESTS_IN_FLIGHT.dec(method, self.path)
+            current_route.reset(token)
+
+
+def instrument_routes(routes: Iterable) -> None:
+    """
+    Wrap every HTTP route so that its requests are measured under its path template
+    """
+    for route in routes:
+        if isinstance(route, Route) and not isinstance(route.app, RouteMetrics):
+            route.app = RouteMetrics(route.app, route.path)
+
+
+def instrument_engine(engine) -> None:
+    """
+    Time every statement executed through ``engine`` and attribute it to the current route
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end_query(conn, cursor, statement, parameters, context, executemany):
+        DB_QUERY_LATENCY.observe(time.perf_counter() - conn.info["query_start"].pop(), current_route.get())
+
+    @event.listens_for(engine, "handle_error")
+    def _failed_query(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
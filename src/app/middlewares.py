@@ -1,50 +1,130 @@
+import hashlib
 import logging
+import time
+from datetime import date
+from typing import Callable, Dict, Sequence
 
 from fastapi import HTTPException
-from starlette.concurrency import iterate_in_threadpool
-from starlette.middleware.base import (BaseHTTPMiddleware,
-                                       StreamingResponse,
-                                       Request)
-from starlette.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders, QueryParams
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.app.data_version import data_version_watcher
+from src.app.metrics import CACHE_REQUESTS
 
 logger = logging.getLogger(__name__)
 
 
-async def resolve_response(
-        streaming_response: StreamingResponse
-) -> StreamingResponse:
+class ExceptionHandlerMiddleware:
     """
-    Resole response
-
-    Parameters
-    ----------
-    streaming_response : StreamingResponse
-        response
+    Turn exceptions escaping the app into JSON error responses.
 
-    Returns
-    -------
-    streaming_response : StreamingResponse
-        response
+    Pure ASGI, so responses, streaming ones included, pass through without
+    being buffered or copied between tasks. Each response carries a
+    ``Server-Timing`` header with the time the route took to start it.
     """
-    response_body = [section async for section in
-                     streaming_response.body_iterator]
-    streaming_response.body_iterator = iterate_in_threadpool(
-        iter(response_body))
-    return streaming_response
 
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        response_started = False
+
+        async def send_with_timing(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+                # the router stores the matched endpoint in the scope, there is none for 304s and 404s
+                endpoint = scope.get("endpoint")
+                desc = f';desc="{endpoint.__name__}"' if endpoint is not None else ""
+                MutableHeaders(scope=message).append(
+                    "Server-Timing", f"app{desc};dur={(time.perf_counter() - start) * 1000:.2f}"
+                )
+            await send(message)
 
-class ExceptionHandlerMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
         try:
-            return await call_next(request)
+            await self.app(scope, receive, send_with_timing)
         except HTTPException as http_exception:
-            return JSONResponse(
+            if response_started:
+                raise
+            response = JSONResponse(
                 status_code=http_exception.status_code,
                 content={"error": "Client Error", "message": str(http_exception.detail)},
             )
+            await response(scope, receive, send_with_timing)
         except Exception as e:
-            logger.exception(msg=e.__class__.__name__, args=e.args)
-            return JSONResponse(
+            logger.exception("%s on %s %s", e.__class__.__name__, scope["method"], scope["path"])
+            if response_started:
+                raise
+            response = JSONResponse(
                 status_code=500,
                 content={"error": "Internal Server Error", "message": "An unexpected error occurred."},
             )
+            await response(scope, receive, send_with_timing)
+
+
+class ConditionalGetMiddleware:
+    """
+    Tag GET responses with an ETag and answer matching ``If-None-Match`` with 304.
+
+    The ETag is computed before the endpoint runs from the data token (max
+    SaleId, row count, edit counts and schema version, which are the same in
+    every worker process and across restarts), the current day, the version of
+    any model serving the path, and the path and query parameters. A matching
+    request is therefore answered without running the query or the model, by
+    whichever worker receives it.
+
+    Parameters
+    ----------
+    paths : sequence of str
+        path prefixes whose GET responses are tagged
+    versions : dict
+        path prefix -> callable returning the version of the model serving it
+    """
+
+    def __init__(self, app: ASGIApp, paths: Sequence[str] = (), versions: Dict[str, Callable[[], object]] = None):
+        self.app = app
+        self.paths = tuple(paths)
+        self.versions = versions or {}
+
+    def etag(self, scope: Scope, data_token: str) -> str:
+        # "/customers" redirects to "/customers/", both name the same resource
+        path = scope["path"].rstrip("/")
+        query = QueryParams(scope["query_string"])
+        parts = [data_token, date.today().isoformat(), path,
+                 "&".join(sorted(f"{k}={v}" for k, v in query.multi_items()))]
+        parts += [f"{prefix}={version()}" for prefix, version in self.versions.items() if path.startswith(prefix)]
+        return 'W/"' + hashlib.blake2b("|".join(parts).encode(), digest_size=16).hexdigest() + '"'
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (scope["type"] != "http" or scope["method"] not in ("GET", "HEAD")
+                or not scope["path"].startswith(self.paths)):
+            await self.app(scope, receive, send)
+            return
+
+        # the fingerprint may query Sales after a change, and waits on other requests reading it
+        fingerprint = await run_in_threadpool(data_version_watcher.fingerprint)
+        etag = self.etag(scope, fingerprint.token)
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or
+                              etag in (tag.strip() for tag in if_none_match.split(","))):
+            CACHE_REQUESTS.inc("etag", "hit")
+            response = Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+            await response(scope, receive, send)
+            return
+        CACHE_REQUESTS.inc("etag", "miss")
+
+        async def send_with_etag(message: Message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                headers = MutableHeaders(scope=message)
+                headers.setdefault("ETag", etag)
+                headers.setdefault("Cache-Control", "no-cache")
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import math
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from src.app.data_version import DataFingerprint, data_version_watcher
+from src.app.metrics import FIT_STAGE_LATENCY, MODEL_CALLS_REJECTED
+from src.app.profiling import profile_thread
+from src.app.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# weight of the latest call in the running mean duration used for Retry-After
+DURATION_SMOOTHING = 0.2
+
+# engine of the process running the work, a worker process or the app itself without workers
+_local_engine = None
+
+
+def _engine(model_version: int, params: Optional[Dict]):
+    global _local_engine
+    # the modeling stack is only imported where the work runs
+    from src.app.pareto_nbd import PNBDEngine
+
+    if _local_engine is None:
+        _local_engine = PNBDEngine()
+    if params is not None and _local_engine.model_version != model_version:
+        _local_engine.load_params(params, model_version)
+    return _local_engine
+
+
+def _fit(penalizer_coef: float) -> Tuple[Dict, Dict[str, float]]:
+    from src.app.pareto_nbd import PNBDEngine
+    from src.database import SessionLocal
+
+    # fitted on the side, every process then loads the parameters under the new version
+    engine = PNBDEngine(penalizer_coef=penalizer_coef)
+    db = SessionLocal()
+    try:
+        return engine.fit(db), engine.fit_durations
+    finally:
+        db.close()
+
+
+def _call(method: str, model_version: int, params: Optional[Dict], *args):
+    from src.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return getattr(_engine(model_version, params), method)(db, *args)
+    finally:
+        db.close()
+
+
+def _warm():
+    from src.app import pareto_nbd  # noqa: F401
+
+
+class ModelExecutorBusy(RuntimeError):
+    """
+    Raised when a model call is turned away, to be answered with ``status_code`` and ``Retry-After``
+    """
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class ModelExecutor:
+    """
+    Run ``PNBDEngine`` work in a bounded pool of worker processes.
+
+    Fits and predictions are CPU bound and hold the GIL, so in the threadpool
+    of the app they slow down every other request. Here they run in separate
+    processes, and the app only awaits the result. Each worker loads the
+    modeling stack once, reads transactions from the shared on-disk snapshot,
+    and picks up the parameters of the latest fit, which travel with every
+    call.
+
+    Identical concurrent calls, same method, arguments and model version,
+    share one computation, and a fit requested while one runs waits for that
+    fit. Admission control keeps the queue short: beyond ``max_pending``
+    distinct calls queued or running, calls fail with 503 and a
+    ``Retry-After`` estimated from recent call durations.
+
+    Parameters
+    ----------
+    workers : int
+        worker processes, 0 runs the work in the threadpool of the app
+    max_pending : int
+        calls queued or running at once
+    penalizer_coef : float
+        penalizer of the Pareto/NBD and Gamma–Gamma fitters
+    """
+
+    def __init__(self, workers: int, max_pending: int, penalizer_coef: float = 0.5):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.penalizer_coef = penalizer_coef
+        self.params: Optional[Dict] = None
+        # bumped on every fit, part of the ETag of model responses
+        self.model_version = 0
+        self.fitted_at: Optional[float] = None
+        # state of the Sales table when the last fit started
+        self.fitted_fingerprint: Optional[DataFingerprint] = None
+        self.pending = 0
+        self._single_flight = SingleFlight()
+        self._durations: Dict[str, float] = {}
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn, forking a process with running threads can deadlock the child
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _retry_after(self, kind: str) -> int:
+        duration = self._durations.get(kind, 1.0)
+        # calls ahead of a retry are spread over the workers
+        waves = max(1.0, self.pending / max(self.workers, 1))
+        return max(1, math.ceil(duration * waves))
+
+    async def _run(self, kind: str, func: Callable, *args):
+        if self.pending >= self.max_pending:
+            MODEL_CALLS_REJECTED.inc("queue_full")
+            raise ModelExecutorBusy("Model workers are saturated", 503, self._retry_after(kind))
+
+        # only touched from the event loop, so counting needs no lock
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            if not self.workers:
+                return await run_in_threadpool(profile_thread(func), *args)
+            pool = self._executor()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+            except BrokenProcessPool:
+                # a worker died, e.g. killed for memory, the next call starts a new pool
+                logger.error("Model worker pool broken, restarting it")
+                self._discard_pool(pool)
+                MODEL_CALLS_REJECTED.inc("worker_died")
+                raise ModelExecutorBusy("Model worker died", 503, 1)
+        finally:
+            self.pending -= 1
+            previous = self._durations.get(kind)
+            duration = time.perf_counter() - start
+            self._durations[kind] = duration if previous is None else (
+                DURATION_SMOOTHING * duration + (1 - DURATION_SMOOTHING) * previous)
+
+    async def fit(self) -> Dict:
+        """
+        Fit the models on all transactions and make every later call use them, or wait for the running fit
+
+        Returns
+        -------
+        params : dict
+            ``pnbd_params`` and ``gg_params``
+        """
+        return await self._single_flight.do("fit", (), self._fit)
+
+    async def _fit(self) -> Dict:
+        fingerprint = await run_in_threadpool(data_version_watcher.fingerprint)
+        params, durations = await self._run("fit", _fit, self.penalizer_coef)
+        for stage, seconds in durations.items():
+            FIT_STAGE_LATENCY.observe(seconds, stage)
+        self.params = params
+        self.model_version += 1
+        self.fitted_at = time.time()
+        self.fitted_fingerprint = fingerprint
+        return params
+
+    async def call(self, method: str, *args):
+        """
+        Call ``PNBDEngine.<method>(db, *args)`` with the parameters of the latest fit
+
+        Raises ``RuntimeError`` like the engine when the models were never fitted.
+        """
+        version, params = self.model_version, self.params
+        return await self._single_flight.do(method, (version, *args),
+                                            lambda: self._run(method, _call, method, version, params, *args))
+
+    async def run(self, kind: str, func: Callable, *args):
+        """
+        Run another CPU-bound ``func(*args)`` in the pool, under the same admission control
+
+        ``func`` must be a module-level function, and its arguments and result picklable.
+        """
+        return await self._run(kind, func, *args)
+
+    def model_age(self) -> Optional[float]:
+        """Seconds since the last fit, None if the models were never fitted."""
+        return time.time() - self.fitted_at if self.fitted_at is not None else None
+
+    def prewarm_in_background(self):
+        """
+        Import the modeling stack ahead of the first model request, in every worker or in a daemon thread
+        """
+        if not self.workers:
+            threading.Thread(target=_warm, name="pnbd-prewarm", daemon=True).start()
+            return
+        pool = self._executor()
+        for _ in range(self.workers):
+            pool.submit(_warm)
+
+    def shutdown(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
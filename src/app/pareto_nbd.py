@@ -1,11 +1,23 @@
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from typing import Dict, Optional
 
 import pandas as pd
 from lifetimes import BetaGeoFitter, GammaGammaFitter, ParetoNBDFitter
 from lifetimes.utils import summary_data_from_transaction_data
 from sqlalchemy.orm import Session
 
-from src.models import Transaction, Product
+from src.app.snapshot import transaction_snapshot
+
+
+@contextmanager
+def _timed(durations: Dict[str, float], stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        durations[stage] = time.perf_counter() - start
 
 
 class PNBDEngine:
@@ -13,61 +25,92 @@ class PNBDEngine:
         self.pnbd = ParetoNBDFitter(penalizer_coef=penalizer_coef)
         self.gg = GammaGammaFitter(penalizer_coef=penalizer_coef)
         self.fitted = False
+        # bumped on every fit, part of the ETag of model responses
+        self.model_version = 0
+        self.fitted_at: Optional[float] = None
+        # seconds spent in each stage of the last fit
+        self.fit_durations: Dict[str, float] = {}
 
     def _load_transaction_df(self, db: Session) -> pd.DataFrame:
-        # join quantity × product price into a single amount column
-        q = (
-            db.query(
-                Transaction.customer_id,
-                Transaction.date,
-                (Transaction.qty * Product.price).label("amount")
-            )
-            .join(Product, Transaction.product_id == Product.product_id)
-        )
-        df = pd.DataFrame([{"customer_id": r.customer_id,
-                            "date": r.date,
-                            "amount": r.amount}
-                           for r in q])
+        # customer, date and qty × price amount, served from the columnar snapshot
+        df = transaction_snapshot.load(db)
         if df.empty:
             raise ValueError("No transactions in database")
-        df["date"] = pd.to_datetime(df["date"])
         return df
 
     def fit(self, db: Session):
-        df = self._load_transaction_df(db)
+        """
+        Fit Pareto/NBD on every customer and Gamma-Gamma on returning customers only.
+
+        One-time buyers have no repeat spend, their monetary value is zero,
+        which the Gamma-Gamma model rejects; their expected average value and
+        CLV use the mean spend of the fitted population.
+        """
+        durations = self.fit_durations = {}
+        with _timed(durations, "load"):
+            df = self._load_transaction_df(db)
 
         # produce the RFM summary table
-        summary = summary_data_from_transaction_data(
-            df,
-            customer_id_col="customer_id",
-            datetime_col="date",
-            monetary_value_col="amount",
-            observation_period_end=datetime.now()
-        )
+        with _timed(durations, "summary"):
+            summary = summary_data_from_transaction_data(
+                df,
+                customer_id_col="customer_id",
+                datetime_col="date",
+                monetary_value_col="amount",
+                observation_period_end=datetime.now()
+            )
 
         # fit Pareto/NBD
-        self.pnbd.fit(
-            frequency=summary["frequency"],
-            recency=summary["recency"],
-            T=summary["T"]
-        )
+        with _timed(durations, "pnbd"):
+            self.pnbd.fit(
+                frequency=summary["frequency"],
+                recency=summary["recency"],
+                T=summary["T"]
+            )
 
-        # fit Gamma–Gamma
-        self.gg.fit(
-            frequency=summary["frequency"],
-            monetary_value=summary["monetary_value"]
-        )
+        # fit Gamma–Gamma on returning customers, one-time buyers have no repeat spend
+        returning = summary[summary["frequency"] > 0]
+        with _timed(durations, "gamma_gamma"):
+            self.gg.fit(
+                frequency=returning["frequency"],
+                monetary_value=returning["monetary_value"]
+            )
 
         self.fitted = True
+        self.model_version += 1
+        self.fitted_at = time.time()
         return {
             "pnbd_params": self.pnbd.params_.to_dict(),
             "gg_params": self.gg.params_.to_dict()
         }
 
+    def load_params(self, params: Dict[str, Dict[str, float]], model_version: int):
+        """
+        Use parameters fitted elsewhere, e.g. by another process, as returned by ``fit``
+
+        Parameters
+        ----------
+        params : dict
+            ``pnbd_params`` and ``gg_params``
+        model_version : int
+            version of the fit that produced them
+        """
+        self.pnbd.params_ = pd.Series(params["pnbd_params"])[["r", "alpha", "s", "beta"]]
+        # set by ParetoNBDFitter.fit, used by the Gamma–Gamma CLV
+        self.pnbd.predict = self.pnbd.conditional_expected_number_of_purchases_up_to_time
+        self.gg.params_ = pd.Series(params["gg_params"])[["p", "q", "v"]]
+        self.fitted = True
+        self.model_version = model_version
+
+    def model_age(self) -> Optional[float]:
+        """Seconds since the last fit, None if the models were never fitted."""
+        return time.time() - self.fitted_at if self.fitted_at is not None else None
+
     def customer_summary(self, db: Session, customer_id: str):
         """Return the R, F, T, M summary for a single customer."""
         df = self._load_transaction_df(db)
-        cust = df[df["customer_id"] == customer_id]
+        # plain strings, so that grouping does not expand to every customer category
+        cust = df[df["customer_id"] == customer_id].astype({"customer_id": str})
         if cust.empty:
             return {"frequency": 0, "recency": 0, "T": 0, "monetary_value": 0.0}
 
@@ -132,7 +175,7 @@ class PNBDEngine:
         if not self.fitted:
             raise RuntimeError("Model not fitted yet")
         s = self.customer_summary(db, customer_id)
-        return self.gg.customer_lifetime_value(
+        clv = self.gg.customer_lifetime_value(
             self.pnbd,
             frequency=pd.Series([s["frequency"]]),
             recency=pd.Series([s["recency"]]),
@@ -141,3 +184,5 @@ class PNBDEngine:
             time=time,
             freq=freq
         )
+        # one customer in, one value out
+        return float(clv.iloc[0])
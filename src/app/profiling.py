@@ -0,0 +1,185 @@
+import functools
+import inspect
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional, Sequence
+
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers, MutableHeaders, QueryParams
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+PROFILE_QUERY_FLAG = "profile"
+# seconds between two stack samples
+SAMPLE_INTERVAL = 0.002
+
+
+class SamplingProfiler:
+    """
+    Sample the stacks of registered threads from a daemon thread.
+
+    Stacks are aggregated in the folded format (``root;...;leaf count`` per
+    line) read by flamegraph.pl, speedscope and most flame graph viewers.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.threads = set()
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in list(self.threads):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# profiler of the request being served, None for almost every request
+_active_profiler: ContextVar[Optional[SamplingProfiler]] = ContextVar("active_profiler", default=None)
+
+
+def profile_thread(func):
+    """
+    Let the request profiler sample the thread running ``func``, if the request is profiled.
+
+    Endpoints are wrapped by ``instrument_profiling``, use this for work an
+    endpoint hands to a thread pool itself.
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            profiler = _active_profiler.get()
+            if profiler is None:
+                return await func(*args, **kwargs)
+            ident = threading.get_ident()
+            profiler.threads.add(ident)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                profiler.threads.discard(ident)
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = _active_profiler.get()
+            if profiler is None:
+                return func(*args, **kwargs)
+            ident = threading.get_ident()
+            profiler.threads.add(ident)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.threads.discard(ident)
+    return wrapper
+
+
+def instrument_profiling(routes: Sequence, paths: Sequence[str]):
+    """
+    Wrap the endpoints under ``paths`` with ``profile_thread``
+
+    FastAPI decides whether to await an endpoint when the route is created,
+    and the wrapper keeps the endpoint sync or async, so that stays valid.
+    """
+    for route in routes:
+        if isinstance(route, APIRoute) and route.path.startswith(tuple(paths)):
+            route.dependant.call = profile_thread(route.dependant.call)
+
+
+def profile_path(directory: str, profile_id: str) -> str:
+    return os.path.join(directory, f"{profile_id}.folded")
+
+
+class ProfilingMiddleware:
+    """
+    Profile single requests flagged with an ``X-Profile`` header or ``profile`` query parameter.
+
+    Only requests to allowed path prefixes from allowed client addresses are
+    profiled, one at a time. The response carries an ``X-Profile-Id`` header,
+    and the folded stacks are written to ``directory`` once the response is
+    sent. Unflagged requests only pay for the flag lookup.
+
+    Only threads of this process are sampled. Model calls sent to the worker
+    processes of ``ModelExecutor`` show up as the request awaiting them;
+    with ``MODEL_WORKERS=0`` they run in the threadpool and are sampled.
+
+    Parameters
+    ----------
+    directory : str
+        where profiles are written
+    paths : sequence of str
+        path prefixes that may be profiled
+    clients : sequence of str
+        client addresses allowed to request a profile
+    """
+
+    def __init__(self, app: ASGIApp, directory: str, paths: Sequence[str], clients: Sequence[str]):
+        self.app = app
+        self.directory = directory
+        self.paths = tuple(paths)
+        self.clients = set(clients)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _requested(self, scope: Scope) -> bool:
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            return False
+        flagged = (PROFILE_HEADER in Headers(scope=scope)
+                   or PROFILE_QUERY_FLAG.encode() in scope["query_string"]
+                   and PROFILE_QUERY_FLAG in QueryParams(scope["query_string"]))
+        return flagged and (scope.get("client") or ("",))[0] in self.clients
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if not self._requested(scope) or not self._lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+        profiler = SamplingProfiler()
+
+        async def send_with_id(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Profile-Id"] = profile_id
+            await send(message)
+
+        token = _active_profiler.set(profiler)
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiler.stop()
+            _active_profiler.reset(token)
+            self._lock.release()
+            with open(profile_path(self.directory, profile_id), "w") as f:
+                f.write(profiler.folded())
+            logger.info("Profiled %s %s in %.1f ms, %d samples written to %s", scope["method"], scope["path"],
+                        (time.perf_counter() - start) * 1000, profiler.samples, profile_id)
@@ -0,0 +1,180 @@
+import threading
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from src.app.analytics import revenue_by_customer
+from src.app.filters import SalesFilter
+from src.app.data_version import DataVersionWatcher, data_version_watcher
+from src.app.metrics import CACHE_REQUESTS
+from src.app.rfm_sketches import QUINTILES, RFMSketchStore, rfm_sketch_store
+
+# segment per (recency score, frequency score): row r - 1, column f - 1
+SEGMENT_TABLE = [
+    ["HIBERNATING", "HIBERNATING", "AT RISK", "AT RISK", "CANT LOSE"],  # r=1
+    ["HIBERNATING", "HIBERNATING", "AT RISK", "AT RISK", "CANT LOSE"],  # r=2
+    ["ABOUT TO SLEEP", "ABOUT TO SLEEP", "NEED ATTENTION", "LOYAL CUSTOMER", "LOYAL CUSTOMER"],  # r=3
+    ["PROMISING", "POTENTIAL LOYALIST", "POTENTIAL LOYALIST", "LOYAL CUSTOMER", "LOYAL CUSTOMER"],  # r=4
+    ["NEW CUSTOMERS", "POTENTIAL LOYALIST", "POTENTIAL LOYALIST", "CHAMPIONS", "CHAMPIONS"],  # r=5
+]
+SEGMENTS = sorted({segment for row in SEGMENT_TABLE for segment in row})
+_SEGMENT_CODES = np.array([[SEGMENTS.index(segment) for segment in row] for row in SEGMENT_TABLE])
+
+
+def quintile_scores(values: np.ndarray, inner_edges: Optional[Sequence[float]] = None) -> np.ndarray:
+    """
+    Score values 1-5 by quintile, like ``pd.qcut(values, 5, labels=[1, 2, 3, 4, 5])``.
+
+    Bins are right-closed, and repeated edges collapse instead of raising.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        values to score
+    inner_edges : sequence of float, optional
+        the 20%, 40%, 60% and 80% quantiles, e.g. from a sketch, computed exactly when omitted
+
+    Returns
+    -------
+    scores : np.ndarray
+        int8 scores between 1 and 5
+    """
+    if inner_edges is None:
+        inner_edges = np.quantile(values, QUINTILES)
+    return (np.searchsorted(inner_edges, values, side="left") + 1).astype(np.int8)
+
+
+@dataclass
+class RFMResult:
+    """
+    RFM scores and segments of every customer
+    """
+
+    data_version: str
+    as_of: Optional[date]
+    thresholds: Dict
+    customer_id: np.ndarray
+    recency: np.ndarray
+    frequency: np.ndarray
+    monetary: np.ndarray
+    recency_score: np.ndarray
+    frequency_score: np.ndarray
+    monetary_score: np.ndarray
+    segment_code: np.ndarray
+
+    def segment_summary(self) -> List[Dict]:
+        """
+        Customer count and average recency, frequency and monetary value per segment
+        """
+        counts = np.bincount(self.segment_code, minlength=len(SEGMENTS))
+        summary = []
+        for code in np.flatnonzero(counts):
+            mask = self.segment_code == code
+            summary.append({
+                "segment": SEGMENTS[code],
+                "count": int(counts[code]),
+                "avg_recency": float(self.recency[mask].mean()),
+                "avg_frequency": float(self.frequency[mask].mean()),
+                "avg_monetary": float(self.monetary[mask].mean()),
+            })
+        return sorted(summary, key=lambda s: s["count"], reverse=True)
+
+    def customers(self, segment: Optional[str] = None) -> Dict[str, List]:
+        """
+        Per-customer metrics, scores and segment, optionally for a single segment
+        """
+        mask = slice(None) if segment is None else self.segment_code == SEGMENTS.index(segment)
+        return {
+            "customer_id": self.customer_id[mask].tolist(),
+            "recency": self.recency[mask].tolist(),
+            "frequency": self.frequency[mask].tolist(),
+            "monetary": self.monetary[mask].tolist(),
+            "recency_score": self.recency_score[mask].tolist(),
+            "frequency_score": self.frequency_score[mask].tolist(),
+            "monetary_score": self.monetary_score[mask].tolist(),
+            "segment": np.asarray(SEGMENTS, dtype=object)[self.segment_code[mask]].tolist(),
+        }
+
+
+class RFMEngine:
+    """
+    Vectorized RFM scoring and segmentation over all customers, cached per data version.
+
+    Recency and monetary quintile edges come from the sketch store when it is
+    enabled, within its rank error of the exact edges, and are computed
+    exactly otherwise. Frequency is scored on ranks, whose quintiles are exact.
+    """
+
+    def __init__(self, watcher: DataVersionWatcher = data_version_watcher,
+                 sketches: RFMSketchStore = rfm_sketch_store):
+        self.watcher = watcher
+        self.sketches = sketches
+        self._lock = threading.Lock()
+        self._result: Optional[RFMResult] = None
+
+    def segments(self, db: Session) -> RFMResult:
+        """
+        Return the RFM result for the current data, computing it if the data changed
+
+        Parameters
+        ----------
+        db : Session
+            database session
+
+        Returns
+        -------
+        result : RFMResult
+            scores and segments
+        """
+        token = self.watcher.fingerprint().token
+        with self._lock:
+            if self._result is None or self._result.data_version != token:
+                CACHE_REQUESTS.inc("rfm", "miss")
+                self._result = self._compute(db, token)
+            else:
+                CACHE_REQUESTS.inc("rfm", "hit")
+            return self._result
+
+    def _compute(self, db: Session, token: str) -> RFMResult:
+        sketched = self.sketches.thresholds(db) if self.sketches.enabled else None
+        customers = revenue_by_customer(db, SalesFilter())
+        last_dates = np.asarray(customers["last_date"], dtype="datetime64[D]")
+        as_of = last_dates.max() if len(last_dates) else None
+        recency = (as_of - last_dates).astype(np.int64) if as_of is not None else np.empty(0, dtype=np.int64)
+        frequency = np.asarray(customers["transactions"], dtype=np.int64)
+        monetary = np.asarray(customers["revenue"], dtype=np.float64)
+
+        if len(frequency):
+            if sketched is not None and sketched.customers:
+                recency_edges, monetary_edges = sketched.recency, sketched.monetary
+            else:
+                recency_edges, monetary_edges = np.quantile(recency, QUINTILES), np.quantile(monetary, QUINTILES)
+            # recent customers get the high scores
+            recency_score = (6 - quintile_scores(recency, recency_edges)).astype(np.int8)
+            # rank first so that ties in frequency are split across quintiles
+            frequency_score = quintile_scores(np.argsort(np.argsort(frequency, kind="stable")) + 1)
+            monetary_score = quintile_scores(monetary, monetary_edges)
+            thresholds = {"recency": np.asarray(recency_edges, dtype=np.float64).tolist(),
+                          "monetary": np.asarray(monetary_edges, dtype=np.float64).tolist(),
+                          "approximate": sketched is not None and bool(sketched.customers),
+                          "rank_error": sketched.rank_error if sketched is not None else 0.0}
+        else:
+            recency_score = frequency_score = monetary_score = np.empty(0, dtype=np.int8)
+            thresholds = {"recency": [], "monetary": [], "approximate": False, "rank_error": 0.0}
+
+        return RFMResult(
+            data_version=token,
+            as_of=as_of.item() if as_of is not None else None,
+            thresholds=thresholds,
+            customer_id=np.asarray(customers["customer_id"], dtype=object),
+            recency=recency,
+            frequency=frequency,
+            monetary=monetary,
+            recency_score=recency_score,
+            frequency_score=frequency_score,
+            monetary_score=monetary_score,
+            segment_code=_SEGMENT_CODES[recency_score - 1, frequency_score - 1],
+        )
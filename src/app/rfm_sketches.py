@@ -0,0 +1,270 @@
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import Column, Float, Integer, LargeBinary, MetaData, String, Table, text
+from sqlalchemy.orm import Session
+
+from src.app.data_version import DataFingerprint, on_sales_ingested, sales_state
+from src.app.metrics import CACHE_REQUESTS
+from src.app.sketches import TurnstileQuantiles
+from src.config.env_vars import ENV_VARS
+from src.database import DERIVED_SCHEMA
+
+logger = logging.getLogger(__name__)
+
+QUINTILES = (0.2, 0.4, 0.6, 0.8)
+# last purchase day as days since 1970-01-01, recency is derived from it, and total revenue
+METRICS = ("last_day", "monetary")
+
+# in the attached database of derived tables, like the rollups
+metadata = MetaData(schema=DERIVED_SCHEMA)
+
+CUSTOMER_SUMMARY = Table(
+    "RFMCustomerSummary", metadata,
+    Column("CustomerId", String, primary_key=True),
+    Column("LastDay", String(10), nullable=False),
+    Column("TransactionCount", Integer, nullable=False),
+    Column("Revenue", Float, nullable=False),
+)
+SKETCHES = Table(
+    "RFMSketches", metadata,
+    Column("Metric", String, primary_key=True),
+    Column("LastSaleId", Integer, nullable=False),
+    Column("RowCount", Integer, nullable=False),
+    # edits of Sales and Products, NULL when the database does not count them
+    Column("Edits", Integer),
+    Column("Sketch", LargeBinary, nullable=False),
+)
+# last SaleId included, number of sales and edits of Sales and Products
+Watermark = Tuple[int, int, Optional[int]]
+
+# per-customer totals of the sales in (:last, :current], sales without a qty count as zero
+_DELTA = (
+    "SELECT s.CustomerId, max(date(s.Date)) AS LastDay, count(*) AS TransactionCount, "
+    "coalesce(sum(s.Qty * p.Price), 0) AS Revenue "
+    "FROM Sales s JOIN Products p ON s.ProductId = p.ProductId "
+    "WHERE s.SaleId > :last AND s.SaleId <= :current AND s.CustomerId IS NOT NULL "
+    "GROUP BY s.CustomerId"
+)
+
+
+def _days(days: List[str]) -> np.ndarray:
+    return np.array(days, dtype="datetime64[D]").astype(np.float64)
+
+
+@dataclass
+class RFMThresholds:
+    """
+    Approximate quintile edges of recency and monetary value over all customers
+    """
+
+    last_sale_id: int
+    as_of: Optional[date]
+    customers: int
+    recency: List[float]
+    monetary: List[float]
+    rank_error: float
+
+
+class RFMSketchStore:
+    """
+    Quantile sketches of per-customer recency and monetary value, maintained from new SaleIds.
+
+    Like the rollups, the store keeps a watermark, the last SaleId it
+    includes, the number of sales and the edits of ``Sales`` and ``Products``
+    then, and folds newer sales in on refresh; rows inserted below the
+    watermark or removed, and edits, e.g. of a price the stored revenue was
+    computed with, make it rebuild.
+    Per-customer last purchase day and revenue are kept in
+    ``RFMCustomerSummary``; a customer with new sales has its old values
+    removed from and its new values added to a ``TurnstileQuantiles`` per
+    metric, so a refresh costs the customers who bought, not all of them.
+    The sketches are persisted next to the summary and rebuilt from it when
+    removals outgrow their error bound. Quintile edges are computed once per
+    watermark.
+
+    Parameters
+    ----------
+    k : int
+        KLL sketch size, the rank error of the edges is about ``1.65% * 200 / k``
+    enabled : bool
+        when False, RFM scores use exact quantiles
+    """
+
+    def __init__(self, k: int = 200, enabled: bool = True):
+        self.k = k
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._created = False
+        self._sketches: Optional[Dict[str, TurnstileQuantiles]] = None
+        self._watermark: Optional[Watermark] = None
+        self._thresholds: Optional[RFMThresholds] = None
+        self._thresholds_watermark: Optional[Watermark] = None
+
+    def _create_tables(self, db: Session):
+        if not self._created:
+            columns = db.execute(text(f"PRAGMA {DERIVED_SCHEMA}.table_info({SKETCHES.name})")).all()
+            if columns and "Edits" not in {column.name for column in columns}:
+                # written before edits were counted, without sketches the next refresh is a rebuild
+                SKETCHES.drop(db.connection())
+            metadata.create_all(db.connection())
+            db.commit()
+            self._created = True
+
+    def _load(self, db: Session) -> Tuple[Optional[Watermark], Optional[Dict[str, TurnstileQuantiles]]]:
+        # the persisted watermark decides, another process may have folded sales in meanwhile
+        rows = db.execute(text(f"SELECT DISTINCT LastSaleId, RowCount, Edits FROM {SKETCHES}")).all()
+        if self._sketches is not None and len(rows) == 1 and tuple(rows[0]) == self._watermark:
+            return self._watermark, self._sketches
+        rows = db.execute(text(f"SELECT Metric, LastSaleId, RowCount, Edits, Sketch FROM {SKETCHES}")).all()
+        if {row[0] for row in rows} != set(METRICS) or len({tuple(row[1:4]) for row in rows}) != 1:
+            return None, None
+        return tuple(rows[0][1:4]), {metric: TurnstileQuantiles.from_bytes(sketch)
+                                     for metric, _, _, _, sketch in rows}
+
+    def refresh(self, db: Session) -> Watermark:
+        """
+        Fold sales newer than the watermark into the summary and sketches,
+        rebuilding them if sales below the watermark were added or removed,
+        or sales or products edited
+
+        Parameters
+        ----------
+        db : Session
+            database session
+
+        Returns
+        -------
+        watermark : tuple
+            last SaleId included in the sketches, the number of sales and the edits
+        """
+        with self._lock:
+            return self._refresh(db)
+
+    def _refresh(self, db: Session) -> Watermark:
+        self._create_tables(db)
+        last, sketches = self._load(db)
+        current, count, edits = sales_state(db)
+        if sketches is not None and last == (current, count, edits):
+            # nothing changed, nothing is written
+            self._sketches, self._watermark = sketches, last
+            return last
+
+        stale = sketches is None or current < last[0] or edits != last[2]
+        if not stale:
+            new = db.execute(text("SELECT count(*) FROM Sales WHERE SaleId > :last"), {"last": last[0]}).scalar()
+            stale = last[1] + new != count
+        if stale:
+            logger.info("Rebuilding RFM sketches")
+            db.execute(text(f"DELETE FROM {CUSTOMER_SUMMARY}"))
+            db.execute(text(f"INSERT INTO {CUSTOMER_SUMMARY} {_DELTA}"), {"last": 0, "current": current})
+            sketches = self._build(db)
+        else:
+            self._fold(db, sketches, last[0], current)
+            if any(sketch.needs_rebuild for sketch in sketches.values()):
+                sketches = self._build(db)
+
+        for metric, sketch in sketches.items():
+            db.execute(text(
+                f"INSERT INTO {SKETCHES} (Metric, LastSaleId, RowCount, Edits, Sketch) "
+                "VALUES (:metric, :current, :count, :edits, :sketch) "
+                "ON CONFLICT (Metric) DO UPDATE SET LastSaleId = excluded.LastSaleId, "
+                "RowCount = excluded.RowCount, Edits = excluded.Edits, Sketch = excluded.Sketch"
+            ), {"metric": metric, "current": current, "count": count, "edits": edits, "sketch": sketch.to_bytes()})
+        db.commit()
+        self._sketches, self._watermark = sketches, (current, count, edits)
+        return self._watermark
+
+    def _build(self, db: Session) -> Dict[str, TurnstileQuantiles]:
+        rows = db.execute(text(f"SELECT LastDay, Revenue FROM {CUSTOMER_SUMMARY}")).all()
+        sketches = {metric: TurnstileQuantiles(self.k) for metric in METRICS}
+        if rows:
+            days, revenue = zip(*rows)
+            sketches["last_day"].add(_days(list(days)))
+            sketches["monetary"].add(np.asarray(revenue, dtype=np.float64))
+        return sketches
+
+    def _fold(self, db: Session, sketches: Dict[str, TurnstileQuantiles], last: int, current: int):
+        db.execute(text("DROP TABLE IF EXISTS temp.RFMDelta"))
+        db.execute(text(f"CREATE TEMP TABLE RFMDelta AS {_DELTA}"), {"last": last, "current": current})
+        rows = db.execute(text(
+            "SELECT o.LastDay, o.Revenue, d.LastDay, d.Revenue FROM RFMDelta d "
+            f"LEFT JOIN {CUSTOMER_SUMMARY} o ON o.CustomerId = d.CustomerId"
+        )).all()
+        db.execute(text(
+            f"INSERT INTO {CUSTOMER_SUMMARY} SELECT * FROM RFMDelta WHERE true "
+            "ON CONFLICT (CustomerId) DO UPDATE SET LastDay = max(LastDay, excluded.LastDay), "
+            "TransactionCount = TransactionCount + excluded.TransactionCount, "
+            "Revenue = Revenue + excluded.Revenue"
+        ))
+        db.execute(text("DROP TABLE temp.RFMDelta"))
+        if not rows:
+            return
+
+        old_days, old_revenue, new_days, new_revenue = zip(*rows)
+        known = np.array([day is not None for day in old_days])
+        old_days = _days([day for day in old_days if day is not None])
+        old_revenue = np.array([r for r, seen in zip(old_revenue, known) if seen], dtype=np.float64)
+        new_days, new_revenue = _days(list(new_days)), np.asarray(new_revenue, dtype=np.float64)
+        # returning customers: their values are replaced by the updated totals
+        new_days[known] = np.maximum(new_days[known], old_days)
+        new_revenue[known] += old_revenue
+
+        sketches["last_day"].remove(old_days)
+        sketches["monetary"].remove(old_revenue)
+        sketches["last_day"].add(new_days)
+        sketches["monetary"].add(new_revenue)
+
+    def thresholds(self, db: Session) -> RFMThresholds:
+        """
+        Quintile edges of recency and monetary value for the current data
+
+        Parameters
+        ----------
+        db : Session
+            database session
+
+        Returns
+        -------
+        thresholds : RFMThresholds
+            inner quintile edges, recency in days before the latest purchase
+        """
+        with self._lock:
+            watermark = self._refresh(db)
+            if self._thresholds is not None and self._thresholds_watermark == watermark:
+                CACHE_REQUESTS.inc("rfm_thresholds", "hit")
+                return self._thresholds
+            CACHE_REQUESTS.inc("rfm_thresholds", "miss")
+
+            last_day, monetary = self._sketches["last_day"], self._sketches["monetary"]
+            if last_day.n:
+                # values only grow, so the largest ever added is still the latest purchase
+                as_of = last_day.added.max
+                # recent customers have the late last days, the recency quintiles mirror them
+                recency = (as_of - last_day.quantiles(QUINTILES[::-1])).tolist()
+                as_of = date.fromordinal(date(1970, 1, 1).toordinal() + int(as_of))
+            else:
+                as_of, recency = None, []
+            self._thresholds = RFMThresholds(
+                last_sale_id=watermark[0],
+                as_of=as_of,
+                customers=last_day.n,
+                recency=recency,
+                monetary=monetary.quantiles(QUINTILES).tolist() if monetary.n else [],
+                rank_error=max(last_day.rank_error, monetary.rank_error),
+            )
+            self._thresholds_watermark = watermark
+            return self._thresholds
+
+
+rfm_sketch_store = RFMSketchStore(k=ENV_VARS.RFM_SKETCH_K, enabled=ENV_VARS.RFM_SKETCHES)
+
+
+@on_sales_ingested
+def _refresh_sketches(db: Session, previous: DataFingerprint, first_sale_id: int):
+    if rfm_sketch_store.enabled:
+        rfm_sketch_store.refresh(db)
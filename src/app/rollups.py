@@ -0,0 +1,377 @@
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, text
+from sqlalchemy.orm import Session
+
+from src.app.data_version import DataFingerprint, data_version_watcher, on_sales_ingested, sales_state
+from src.app.filters import SalesFilter
+from src.app.metrics import CACHE_REQUESTS
+from src.config.env_vars import ENV_VARS
+from src.database import DERIVED_SCHEMA, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# rollups are refreshed in the request when at most this many sales are missing,
+# larger gaps are left to a background refresh and answered from Sales meanwhile
+SYNC_REFRESH_MAX_ROWS = 100_000
+
+# SQLite expression giving the start of the bucket containing a 'YYYY-MM-DD' day
+GRANULARITIES = {
+    "day": "{day}",
+    "week": "date({day}, 'weekday 0', '-6 days')",
+    "month": "date({day}, 'start of month')",
+}
+# filter / group name -> (Sales column, sentinel stored for NULL so that it can be part of the key)
+DIMENSIONS = {
+    "product_id": ("ProductId", -1),
+    "customer_id": ("CustomerId", ""),
+    "location_id": ("LocationId", -1),
+    "business_unit": ("BusinessUnitId", -1),
+}
+DIMENSION_SETS = [(), ("product_id",), ("customer_id",), ("location_id",), ("business_unit",), tuple(DIMENSIONS)]
+
+# rollup tables live in their own metadata, they are maintained here and not through the ORM,
+# and in the attached database of derived tables
+metadata = MetaData(schema=DERIVED_SCHEMA)
+
+STATE = Table(
+    "SalesRollupState", metadata,
+    Column("Name", String, primary_key=True),
+    Column("LastSaleId", Integer, nullable=False),
+    Column("RowCount", Integer, nullable=False),
+    # edits of Sales and Products, NULL when the database does not count them
+    Column("Edits", Integer),
+)
+# last SaleId included, number of sales and edits of Sales and Products
+Watermark = Tuple[int, int, Optional[int]]
+
+
+@dataclass(frozen=True)
+class Rollup:
+    """
+    Pre-aggregated qty, revenue and transaction count per time bucket and dimensions
+    """
+
+    granularity: str
+    dimensions: Tuple[str, ...]
+
+    @property
+    def name(self) -> str:
+        columns = "".join(DIMENSIONS[d][0].replace("Id", "") for d in self.dimensions)
+        return f"SalesRollup{self.granularity.capitalize()}{columns}"
+
+    @property
+    def table(self) -> str:
+        return f"{DERIVED_SCHEMA}.{self.name}"
+
+    @property
+    def columns(self) -> List[str]:
+        return [DIMENSIONS[d][0] for d in self.dimensions]
+
+
+ROLLUPS = [Rollup(granularity, dimensions)
+           for granularity in GRANULARITIES for dimensions in DIMENSION_SETS]
+# finer buckets first, so that coarser rollups are preferred when scanning it reversed
+_GRANULARITY_ORDER = list(GRANULARITIES)
+
+for _rollup in ROLLUPS:
+    Table(
+        _rollup.name, metadata,
+        Column("Bucket", String(10), primary_key=True),
+        *[Column(column, String if column == "CustomerId" else Integer, primary_key=True)
+          for column in _rollup.columns],
+        Column("Qty", Integer, nullable=False),
+        Column("Revenue", Float, nullable=False),
+        Column("TransactionCount", Integer, nullable=False),
+    )
+
+
+def _bucket_start(day: date, granularity: str) -> date:
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _nests(finer: str, coarser: str) -> bool:
+    """
+    Whether every ``coarser`` bucket is a union of ``finer`` buckets
+    """
+    return finer == "day" or finer == coarser
+
+
+def _aligned(filters: SalesFilter, granularity: str) -> bool:
+    if filters.start_date and _bucket_start(filters.start_date, granularity) != filters.start_date:
+        return False
+    if filters.end_date:
+        next_day = filters.end_date + timedelta(days=1)
+        if _bucket_start(next_day, granularity) != next_day:
+            return False
+    return True
+
+
+def plan(filters: SalesFilter, group_by: Sequence[str] = (), granularity: Optional[str] = None) -> Rollup:
+    """
+    Pick the coarsest, narrowest rollup that can answer a query.
+
+    A rollup qualifies if it has every filtered and grouped dimension, its
+    buckets nest into the requested granularity and the date filters fall on
+    its bucket boundaries.
+
+    Parameters
+    ----------
+    filters : SalesFilter
+        date and dimension filters
+    group_by : sequence of str
+        dimensions to group by
+    granularity : str, optional
+        time bucket of the result, ``None`` to aggregate over the whole range
+
+    Returns
+    -------
+    rollup : Rollup
+        rollup to query
+    """
+    needed = set(group_by) | {d for d in DIMENSIONS if getattr(filters, d) is not None}
+    candidates = [
+        r for r in ROLLUPS
+        if needed <= set(r.dimensions)
+        and (granularity is None or _nests(r.granularity, granularity))
+        and _aligned(filters, r.granularity)
+    ]
+    # day rollups nest into every granularity and align with every date, so there is always a candidate
+    return min(candidates, key=lambda r: (-_GRANULARITY_ORDER.index(r.granularity), len(r.dimensions)))
+
+
+class RollupStore:
+    """
+    Maintain the rollup tables incrementally from new SaleIds.
+
+    All rollups share one watermark, the last SaleId they include and the
+    number of sales and edits of ``Sales`` and ``Products`` at that point. New
+    sales are aggregated once per day and dimensions into a temporary delta
+    table, which is then upserted into every rollup. Sales only count as new
+    if the row count grew by exactly the number of SaleIds above the
+    watermark; rows inserted below it (e.g. with an explicit id) or removed,
+    and edits of existing sales or products, make the next refresh a rebuild.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._created = False
+
+    def _create_tables(self, db: Session):
+        if not self._created:
+            columns = db.execute(text(f"PRAGMA {DERIVED_SCHEMA}.table_info({STATE.name})")).all()
+            if columns and "Edits" not in {column.name for column in columns}:
+                # written before edits were counted, dropping the watermark makes the next refresh a rebuild
+                STATE.drop(db.connection())
+            metadata.create_all(db.connection())
+            db.commit()
+            self._created = True
+
+    def watermark(self, db: Session) -> Optional[Watermark]:
+        """
+        Last SaleId included in the rollups, the number of sales and the edits then, ``None`` before the first refresh
+        """
+        self._create_tables(db)
+        row = db.execute(text(f"SELECT LastSaleId, RowCount, Edits FROM {STATE} WHERE Name = 'sales'")).first()
+        return tuple(row) if row is not None else None
+
+    def _pending(self, db: Session) -> Tuple[Optional[Watermark], Watermark, bool]:
+        """
+        Watermark, current max SaleId, row count and edits, and whether the
+        sales above the watermark are not all that changed
+        """
+        last = self.watermark(db)
+        current = sales_state(db)
+        if last is None or current[0] < last[0] or current[2] != last[2]:
+            return last, current, True
+        if current == last:
+            return last, current, False
+        new = db.execute(text("SELECT count(*) FROM Sales WHERE SaleId > :last"), {"last": last[0]}).scalar()
+        return last, current, last[1] + new != current[1]
+
+    def refresh(self, db: Session) -> Watermark:
+        """
+        Fold sales newer than the watermark into the rollups, rebuilding them
+        if sales below the watermark were added or removed, or sales or products edited
+
+        Parameters
+        ----------
+        db : Session
+            database session
+
+        Returns
+        -------
+        watermark : tuple
+            last SaleId included in the rollups, the number of sales and the edits
+        """
+        with self._lock:
+            return self._refresh(db)
+
+    def _refresh(self, db: Session) -> Watermark:
+        last, (current, count, edits), stale = self._pending(db)
+        if not stale and (current, count, edits) == last:
+            return last
+        if stale:
+            logger.info("Rebuilding rollups")
+            for rollup in ROLLUPS:
+                db.execute(text(f"DELETE FROM {rollup.table}"))
+            last_sale_id = 0
+        else:
+            last_sale_id = last[0]
+
+        dimension_columns = ", ".join(f"coalesce(s.{column}, {sentinel!r}) AS {column}"
+                                      for column, sentinel in DIMENSIONS.values())
+        db.execute(text("DROP TABLE IF EXISTS temp.SalesRollupDelta"))
+        db.execute(text(
+            f"CREATE TEMP TABLE SalesRollupDelta AS "
+            f"SELECT date(s.Date) AS Day, {dimension_columns}, "
+            # the rollup columns are NOT NULL, sales without a qty count as zero
+            f"coalesce(sum(s.Qty), 0) AS Qty, coalesce(sum(s.Qty * p.Price), 0) AS Revenue, "
+            f"count(*) AS TransactionCount "
+            f"FROM Sales s JOIN Products p ON s.ProductId = p.ProductId "
+            f"WHERE s.SaleId > :last AND s.SaleId <= :current "
+            f"GROUP BY 1, 2, 3, 4, 5"
+        ), {"last": last_sale_id, "current": current})
+
+        for rollup in ROLLUPS:
+            bucket = GRANULARITIES[rollup.granularity].format(day="Day")
+            key = ", ".join(["Bucket", *rollup.columns])
+            select_key = ", ".join([bucket, *rollup.columns])
+            db.execute(text(
+                f"INSERT INTO {rollup.table} ({key}, Qty, Revenue, TransactionCount) "
+                f"SELECT {select_key}, sum(Qty), sum(Revenue), sum(TransactionCount) "
+                f"FROM SalesRollupDelta WHERE true GROUP BY {select_key} "
+                f"ON CONFLICT ({key}) DO UPDATE SET Qty = Qty + excluded.Qty, "
+                f"Revenue = Revenue + excluded.Revenue, "
+                f"TransactionCount = TransactionCount + excluded.TransactionCount"
+            ))
+        db.execute(text("DROP TABLE temp.SalesRollupDelta"))
+        db.execute(text(
+            f"INSERT INTO {STATE} (Name, LastSaleId, RowCount, Edits) VALUES ('sales', :current, :count, :edits) "
+            "ON CONFLICT (Name) DO UPDATE SET LastSaleId = excluded.LastSaleId, RowCount = excluded.RowCount, "
+            "Edits = excluded.Edits"
+        ), {"current": current, "count": count, "edits": edits})
+        db.commit()
+        return current, count, edits
+
+    def ensure_fresh(self, db: Session) -> bool:
+        """
+        Bring the rollups up to date if that is cheap, without waiting on a running refresh
+
+        Parameters
+        ----------
+        db : Session
+            database session
+
+        Returns
+        -------
+        fresh : bool
+            whether the rollups include every sale and can be queried
+        """
+        if not self.enabled:
+            return False
+        fingerprint = data_version_watcher.fingerprint()
+        expected = (fingerprint.max_sale_id, fingerprint.row_count, fingerprint.sales_edits)
+        if not self._lock.acquire(blocking=False):
+            CACHE_REQUESTS.inc("rollups", "busy")
+            return False
+        try:
+            if self.watermark(db) == expected:
+                CACHE_REQUESTS.inc("rollups", "hit")
+                return True
+            last, (_, count, _), stale = self._pending(db)
+            # a rebuild aggregates every sale
+            if (count if stale else count - last[1]) > SYNC_REFRESH_MAX_ROWS:
+                CACHE_REQUESTS.inc("rollups", "stale")
+                self.refresh_in_background()
+                return False
+            CACHE_REQUESTS.inc("rollups", "refreshed")
+            return self._refresh(db) == expected
+        finally:
+            self._lock.release()
+
+    def refresh_in_background(self):
+        """
+        Start a refresh in a daemon thread with its own session
+        """
+        def run():
+            db = SessionLocal()
+            try:
+                self.refresh(db)
+            except Exception as e:
+                logger.exception("Rollup refresh failed: %s", e)
+            finally:
+                db.close()
+
+        threading.Thread(target=run, name="rollup-refresh", daemon=True).start()
+
+    def query(self, db: Session, filters: SalesFilter, group_by: Sequence[str] = (),
+              granularity: Optional[str] = None, with_range: bool = False) -> List[Tuple]:
+        """
+        Aggregate qty, revenue and transactions from the best rollup
+
+        Parameters
+        ----------
+        db : Session
+            database session
+        filters : SalesFilter
+            date and dimension filters
+        group_by : sequence of str
+            dimensions to group by
+        granularity : str, optional
+            time bucket of the result, ``None`` to aggregate over the whole range
+        with_range : bool
+            also return the first and last day with sales, needs day rollups
+
+        Returns
+        -------
+        rows : list of tuple
+            ``[bucket,] *group_by, transactions, qty, revenue[, first_day, last_day]``
+            ordered by bucket and groups
+        """
+        rollup = plan(filters, group_by, "day" if with_range else granularity)
+        selected, where, params = [], ["true"], {}
+        if granularity is not None:
+            selected.append(GRANULARITIES[granularity].format(day="Bucket"))
+        for dimension in group_by:
+            column, sentinel = DIMENSIONS[dimension]
+            selected.append(f"nullif({column}, {sentinel!r})")
+        group_columns = ", ".join(str(i + 1) for i in range(len(selected)))
+        selected += ["sum(TransactionCount)", "sum(Qty)", "sum(Revenue)"]
+        if with_range:
+            selected += ["min(Bucket)", "max(Bucket)"]
+
+        if filters.start_date:
+            where.append("Bucket >= :start")
+            params["start"] = _bucket_start(filters.start_date, rollup.granularity).isoformat()
+        if filters.end_date:
+            where.append("Bucket <= :end")
+            params["end"] = _bucket_start(filters.end_date, rollup.granularity).isoformat()
+        for dimension in DIMENSIONS:
+            value = getattr(filters, dimension)
+            if value is not None:
+                where.append(f"{DIMENSIONS[dimension][0]} = :{dimension}")
+                params[dimension] = value
+
+        sql = f"SELECT {', '.join(selected)} FROM {rollup.table} WHERE {' AND '.join(where)}"
+        if group_columns:
+            sql += f" GROUP BY {group_columns} ORDER BY {group_columns}"
+        return [tuple(row) for row in db.execute(text(sql), params)]
+
+
+rollup_store = RollupStore(enabled=ENV_VARS.ROLLUPS_ENABLED)
+
+
+@on_sales_ingested
+def _refresh_rollups(db: Session, previous: DataFingerprint, first_sale_id: int):
+    if rollup_store.enabled:
+        rollup_store.refresh(db)
@@ -0,0 +1,140 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.orm import Session
+
+from src.app.analytics import daily_sales, revenue_by_customer, revenue_by_product, sales_series, sales_timeseries
+from src.app.filters import SalesFilter
+from src.app.rfm import SEGMENTS, RFMEngine
+from src.app.rfm_sketches import rfm_sketch_store
+from src.app.serialization import fast_json_response
+from src.config.env_vars import ENV_VARS
+from src.database import get_db
+from src.schemas.analytics import (CustomerRevenue, DailySales, ProductRevenue, RFMSegments, RFMThresholds,
+                                   SalesSeries, SalesTimeseries)
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+rfm_engine = RFMEngine()
+
+
+@router.get("/sales/daily",
+            response_model=DailySales,
+            summary="Daily sales time series",
+            description=(
+                    "Number of transactions, quantity and revenue (qty × price) per day over the full Sales table, "
+                    "grouped in SQL. Optional date (inclusive) and dimension filters. "
+                    "Returned column-wise: one array per field, ordered by date."
+            ))
+def sales_daily(filters: SalesFilter = Depends(), db: Session = Depends(get_db)):
+    return daily_sales(db, filters)
+
+
+@router.get("/sales/timeseries",
+            response_model=SalesTimeseries,
+            summary="Sales per day, week or month",
+            description=(
+                    "Transactions, quantity and revenue per day, week (starting Monday) or month, optionally "
+                    "split by product, customer, location or business unit. Answered from the coarsest "
+                    "pre-aggregated rollup that fits the filters. `bucket` is the first day of each period. "
+                    "Returned column-wise, ordered by bucket."
+            ))
+def sales_per_period(filters: SalesFilter = Depends(),
+                     granularity: Literal["day", "week", "month"] = "day",
+                     group_by: Optional[Literal["product_id", "customer_id", "location_id", "business_unit"]] = None,
+                     db: Session = Depends(get_db)):
+    return {"granularity": granularity, "group_by": group_by,
+            **sales_timeseries(db, filters, granularity, group_by)}
+
+
+@router.get("/sales/series",
+            response_model=SalesSeries,
+            summary="Sales over a date range for charting",
+            description=(
+                    "Transactions, quantity and revenue over the filtered date range, by default from the first "
+                    "to the last sale, in at most `max_points` points. Buckets are days, weeks or months, the "
+                    "finest giving a few buckets per point. When there are more buckets than `max_points`, the "
+                    "ones that best preserve the shape of `value` are kept (Largest-Triangle-Three-Buckets), "
+                    "so peaks stay visible. `total_buckets` counts the buckets before downsampling. "
+                    "Returned column-wise, ordered by bucket."
+            ))
+def sales_for_chart(filters: SalesFilter = Depends(),
+                    max_points: int = Query(500, ge=3, le=10_000),
+                    value: Literal["transactions", "qty", "revenue"] = "revenue",
+                    db: Session = Depends(get_db)):
+    return sales_series(db, filters, max_points, value)
+
+
+@router.get("/revenue/by_product",
+            response_model=ProductRevenue,
+            summary="Revenue per product",
+            description=(
+                    "Transactions, quantity and revenue per product, highest revenue first. "
+                    "`limit` keeps only the top products. Returned column-wise."
+            ))
+def revenue_per_product(filters: SalesFilter = Depends(),
+                        limit: Optional[int] = Query(None, ge=1),
+                        db: Session = Depends(get_db)):
+    return revenue_by_product(db, filters, limit)
+
+
+@router.get("/revenue/by_customer",
+            response_model=CustomerRevenue,
+            summary="Revenue per customer",
+            description=(
+                    "Transactions, quantity, revenue and first/last purchase date per customer, "
+                    "highest revenue first. `limit` keeps only the top customers. Returned column-wise."
+            ))
+def revenue_per_customer(filters: SalesFilter = Depends(),
+                         limit: Optional[int] = Query(None, ge=1),
+                         db: Session = Depends(get_db)):
+    return revenue_by_customer(db, filters, limit)
+
+
+@router.get("/rfm/segments",
+            response_model=RFMSegments,
+            summary="RFM scores and customer segments",
+            description=(
+                    "Score every customer 1–5 on recency, frequency and monetary value by quintile and map "
+                    "(recency, frequency) scores to segments such as CHAMPIONS, AT RISK or HIBERNATING. "
+                    "Recency is counted in days before the latest purchase in the data. Recency and monetary "
+                    "quintile edges come from quantile sketches, within `thresholds.rank_error` of the exact "
+                    "ones, unless RFM_SKETCHES is off. Results are cached "
+                    "until the sales data changes. Returns segment counts and metrics, plus per-customer "
+                    "labels unless `include_customers=false`; `segment` restricts the customer list."
+            ))
+def rfm_segments(request: Request,
+                 include_customers: bool = True,
+                 segment: Optional[str] = Query(None, description=f"One of {', '.join(SEGMENTS)}"),
+                 db: Session = Depends(get_db)):
+    if segment is not None and segment not in SEGMENTS:
+        raise HTTPException(400, detail=f"Unknown segment {segment!r}")
+    result = rfm_engine.segments(db)
+    content = {
+        "data_version": result.data_version,
+        "as_of": result.as_of,
+        "total_customers": len(result.customer_id),
+        "thresholds": result.thresholds,
+        "segments": result.segment_summary(),
+        "customers": result.customers(segment) if include_customers else None,
+    }
+    # one entry per customer in every column, too large to validate element by element
+    return fast_json_response(request, content) if ENV_VARS.FAST_JSON else content
+
+
+@router.get("/rfm/thresholds",
+            response_model=RFMThresholds,
+            summary="RFM quintile edges of recency and monetary value",
+            description=(
+                    "The 20%, 40%, 60% and 80% quantiles of recency (days before the latest purchase) and "
+                    "monetary value over all customers, the edges of the 1–5 scores. Served from KLL sketches "
+                    "kept up to date with new sales, without reading per-customer data; each edge is within "
+                    "`rank_error` (as a fraction of customers, 99% confidence) of the exact quantile. Exact, "
+                    "from the full RFM computation, when RFM_SKETCHES is off."
+            ))
+def rfm_thresholds(db: Session = Depends(get_db)):
+    if rfm_sketch_store.enabled:
+        thresholds = rfm_sketch_store.thresholds(db)
+        return {"as_of": thresholds.as_of, "customers": thresholds.customers, "recency": thresholds.recency,
+                "monetary": thresholds.monetary, "approximate": True, "rank_error": thresholds.rank_error}
+    result = rfm_engine.segments(db)
+    return {"as_of": result.as_of, "customers": len(result.customer_id), **result.thresholds}
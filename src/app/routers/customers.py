@@ -1,18 +1,35 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from src.app.search import customer_search_index
+from src.app.serialization import rows_response, schema_columns
+from src.app.utils import resolve_ids
 from src.database import get_db
 from src.models import Customer
-from src.schemas.crud import CustomerRead
+from src.schemas.crud import CustomerBatch, CustomerIds, CustomerMatch, CustomerRead
 
 router = APIRouter(prefix="/customers", tags=["customers"])
 
 
 @router.get("/", response_model=List[CustomerRead])
-def list_customers(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(Customer).offset(skip).limit(limit).all()
+def list_customers(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    stmt = select(*schema_columns(Customer, CustomerRead)).offset(skip).limit(limit)
+    return rows_response(request, db.execute(stmt))
+
+
+@router.get("/search",
+            response_model=List[CustomerMatch],
+            summary="Autocomplete customers by id or company name",
+            description=(
+                    "Case-insensitive prefix search served from an in-memory index. Matches on the "
+                    "customer id come first, then on the start of the company name, then on any later word of it."
+            ))
+def search_customers(q: str = Query(..., min_length=1, max_length=100), limit: int = Query(10, ge=1, le=100),
+                     db: Session = Depends(get_db)):
+    return customer_search_index.search(db, q, limit)
 
 
 @router.get("/{customer_id}", response_model=CustomerRead)
@@ -21,3 +38,14 @@ def get_customer(customer_id: str, db: Session = Depends(get_db)):
     if not cust:
         raise HTTPException(status_code=404, detail="Customer not found")
     return cust
+
+
+@router.post("/batch",
+             response_model=CustomerBatch,
+             summary="Look up customers by id list",
+             description=(
+                     "Resolve up to 5000 ids in one request with chunked `IN (...)` queries. "
+                     "`items` follow the request order; ids that do not exist are listed in `missing`."
+             ))
+def get_customers_batch(body: CustomerIds, db: Session = Depends(get_db)):
+    return resolve_ids(db, Customer, Customer.id, body.ids)
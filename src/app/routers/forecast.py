@@ -0,0 +1,42 @@
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Query, Request
+
+from src.app.forecasting import SalesForecaster
+from src.app.model_pool import ModelExecutorBusy
+from src.app.routers.pareto import _busy, model_executor
+from src.app.serialization import fast_json_response
+from src.config.env_vars import ENV_VARS
+from src.schemas.forecast import SalesForecast
+
+router = APIRouter(prefix="/forecast", tags=["forecast"])
+# ets fits share the worker processes of the Pareto/NBD models
+sales_forecaster = SalesForecaster(model_executor)
+
+
+@router.get("/sales",
+            response_model=SalesForecast,
+            summary="Daily sales forecast per product or location",
+            description=(
+                    "Forecast `metric` for the `horizon` days after the last sale, for every product or "
+                    "location at once, from the last `history_days` days. `ets` is exponential smoothing with "
+                    "weekly seasonality, its parameters chosen per series; `seasonal_mean` averages the same "
+                    "weekday over the last four weeks. Forecasts are cached until the sales data changes. "
+                    "Series are ordered by history total, `limit` keeps the largest and `series_id` selects "
+                    "some. `rmse` is the in-sample one-step-ahead error."
+            ))
+async def forecast_sales(request: Request,
+                         group_by: Literal["product_id", "location_id"] = "product_id",
+                         metric: Literal["transactions", "qty", "revenue"] = "qty",
+                         method: Literal["ets", "seasonal_mean"] = "ets",
+                         horizon: int = Query(28, ge=1, le=365),
+                         history_days: int = Query(365, ge=28, le=3650),
+                         series_id: Optional[List[int]] = Query(None),
+                         limit: Optional[int] = Query(None, ge=1)):
+    try:
+        result = await sales_forecaster.forecast(group_by, metric, method, horizon, history_days)
+    except ModelExecutorBusy as e:
+        raise _busy(e)
+    content = result.to_dict(series_id, limit)
+    # series × horizon values, too many to validate element by element
+    return fast_json_response(request, content) if ENV_VARS.FAST_JSON else content
@@ -1,5 +1,11 @@
+from datetime import date
+
 from fastapi import APIRouter, Response, status
 
+from src.app.data_version import data_version_watcher
+from src.app.routers.pareto import model_version
+from src.schemas.health import DataVersion
+
 # Instantiate router object
 router = APIRouter(prefix='/health', tags=['Health Check'])
 
@@ -14,3 +20,16 @@ async def check_status() -> Response:
             response model
     """
     return Response(status_code=status.HTTP_200_OK)
+
+
+@router.get('/version',
+            response_model=DataVersion,
+            summary="Version of the data and models",
+            description=(
+                    "Fingerprint of the Sales table, version of the fitted models and the server date: the inputs "
+                    "of the ETags. Any response may change when one of them does, so clients can key their caches "
+                    "on them. Costs a PRAGMA read while the data is unchanged."
+            ))
+def version():
+    return {"data_version": data_version_watcher.fingerprint().token, "model_version": model_version(),
+            "date": date.today()}
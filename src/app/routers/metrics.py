@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Response
+
+from src.app.metrics import CONTENT_TYPE, registry
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics",
+            summary="Prometheus metrics",
+            description=(
+                    "Request latency histograms and in-flight gauges per route, SQL statement durations per route, "
+                    "model fit stage durations and age, and cache hit ratios, in the Prometheus text format."
+            ))
+async def metrics() -> Response:
+    return Response(registry.exposition(), media_type=CONTENT_TYPE)
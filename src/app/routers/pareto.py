@@ -1,7 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from src.app.pareto_nbd import PNBDEngine
+from src.app.metrics import CallbackGauge, registry
+from src.app.model_pool import ModelExecutor, ModelExecutorBusy
+from src.config.env_vars import ENV_VARS
 from src.database import get_db
 from src.models import Customer
 from src.schemas.pareto import (
@@ -10,7 +13,32 @@ from src.schemas.pareto import (
 )
 
 router = APIRouter(prefix="/models/pnbd", tags=["pareto-nbd"])
-engine = PNBDEngine()
+# fits and predictions run in worker processes, the modeling stack is never imported by the app itself
+model_executor = ModelExecutor(ENV_VARS.MODEL_WORKERS, ENV_VARS.MODEL_MAX_PENDING)
+registry.register(CallbackGauge("pnbd_model_age_seconds", "Seconds since the models were last fitted", (),
+                                lambda: {(): model_executor.model_age()}))
+registry.register(CallbackGauge("pnbd_executor_pending", "Model calls queued or running", (),
+                                lambda: {(): model_executor.pending}))
+
+
+def model_version() -> int:
+    """
+    Version of the fitted models, part of the ETag of model responses
+    """
+    return model_executor.model_version
+
+
+def _busy(e: ModelExecutorBusy) -> HTTPException:
+    return HTTPException(e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+async def _predict(method: str, *args):
+    try:
+        return await model_executor.call(method, *args)
+    except ModelExecutorBusy as e:
+        raise _busy(e)
+    except RuntimeError as e:
+        raise HTTPException(400, detail=str(e))
 
 
 @router.post("/fit",
@@ -21,9 +49,11 @@ engine = PNBDEngine()
                      "Gamma–Gamma monetary-value model using *all* historical transactions. "
                      "Returns the updated model parameters (r, α, s, β for Pareto/NBD; p, q, v for Gamma–Gamma)."
              ))
-def fit_models(db: Session = Depends(get_db)):
+async def fit_models():
     try:
-        return engine.fit(db)
+        return await model_executor.fit()
+    except ModelExecutorBusy as e:
+        raise _busy(e)
     except ValueError as e:
         raise HTTPException(400, detail=str(e))
 
@@ -38,10 +68,10 @@ def fit_models(db: Session = Depends(get_db)):
                     "and MonetaryValue (average spend) for the given customer_id. "
                     "404 if the customer does not exist."
             ))
-def get_summary(customer_id: str, db: Session = Depends(get_db)):
-    if not db.query(Customer).filter(Customer.id == customer_id).first():
+async def get_summary(customer_id: str, db: Session = Depends(get_db)):
+    if not await run_in_threadpool(lambda: db.query(Customer).filter(Customer.id == customer_id).first()):
         raise HTTPException(404, detail="Customer not found")
-    return engine.customer_summary(db, customer_id)
+    return await _predict("customer_summary", customer_id)
 
 
 @router.get("/prob_alive/{customer_id}",
@@ -52,11 +82,8 @@ def get_summary(customer_id: str, db: Session = Depends(get_db)):
                     "(i.e., will make another purchase), based on the fitted Pareto/NBD model. "
                     "Raises 400 if the model hasn’t been fit yet."
             ))
-def prob_alive(customer_id: str, db: Session = Depends(get_db)):
-    try:
-        p = engine.probability_alive(db, customer_id)
-    except RuntimeError as e:
-        raise HTTPException(400, detail=str(e))
+async def prob_alive(customer_id: str):
+    p = await _predict("probability_alive", customer_id)
     return {"customer_id": customer_id, "prob_alive": p}
 
 
@@ -68,13 +95,10 @@ def prob_alive(customer_id: str, db: Session = Depends(get_db)):
                     "in the next `periods` days *conditional* on the customer still being active. "
                     "Errors if `periods < 1` or the model is uninitialized."
             ), )
-def conditional_expected(customer_id: str, periods: int = 30, db: Session = Depends(get_db)):
+async def conditional_expected(customer_id: str, periods: int = 30):
     if periods < 1:
         raise HTTPException(400, detail="‘periods’ must be a positive integer")
-    try:
-        exp = engine.conditional_expected_transactions(db, customer_id, periods)
-    except RuntimeError as e:
-        raise HTTPException(400, detail=str(e))
+    exp = await _predict("conditional_expected_transactions", customer_id, periods)
     return {"customer_id": customer_id, "periods": periods, "expected": exp}
 
 
@@ -85,11 +109,8 @@ def conditional_expected(customer_id: str, periods: int = 30, db: Session = Depe
                     "Return a list of length `periods` giving the *cumulative* expected counts of future transactions "
                     "from period 1 up to period N for the given customer. Useful for plotting forecast curves."
             ))
-def cumulative_expected(customer_id: str, periods: int = 30, db: Session = Depends(get_db)):
-    try:
-        series = engine.expected_cumulative_transactions(db, customer_id, periods)
-    except RuntimeError as e:
-        raise HTTPException(400, detail=str(e))
+async def cumulative_expected(customer_id: str, periods: int = 30):
+    series = await _predict("expected_cumulative_transactions", customer_id, periods)
     return {
         "customer_id": customer_id,
         "periods": periods,
@@ -104,11 +125,8 @@ def cumulative_expected(customer_id: str, periods: int = 30, db: Session = Depen
                     "Using the Gamma–Gamma model, estimate the customer’s expected spend per transaction "
                     "(i.e., the average monetary value), given their historical purchase amounts."
             ))
-def avg_value(customer_id: str, db: Session = Depends(get_db)):
-    try:
-        v = engine.expected_average_value(db, customer_id)
-    except RuntimeError as e:
-        raise HTTPException(400, detail=str(e))
+async def avg_value(customer_id: str):
+    v = await _predict("expected_average_value", customer_id)
     return {"customer_id": customer_id, "expected_avg_value": v}
 
 
@@ -120,9 +138,6 @@ def avg_value(customer_id: str, db: Session = Depends(get_db)):
                     "combining the Pareto/NBD expected transaction counts with the Gamma–Gamma average spend. "
                     "Returns the present‐value CLV assuming no discounting."
             ))
-def clv(customer_id: str, time: int = 30, db: Session = Depends(get_db)):
-    try:
-        val = engine.customer_lifetime_value(db, customer_id, time)
-    except RuntimeError as e:
-        raise HTTPException(400, detail=str(e))
+async def clv(customer_id: str, time: int = 30):
+    val = await _predict("customer_lifetime_value", customer_id, time)
     return {"customer_id": customer_id, "time": time, "clv": val}
@@ -1,33 +1,59 @@
 # src/app/routers/preview.py
 
-import os
-import sqlite3
-from fastapi import APIRouter, HTTPException
+from typing import List
 
-router = APIRouter()
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
 
-@router.get("/preview")
-def preview():
-    db_url = os.getenv("DB_URL")
-    if not db_url:
-        raise HTTPException(status_code=500, detail="DB_URL environment variable not set")
+from src.app.catalog import DEFAULT_SAMPLE_SIZE, MAX_SAMPLE_SIZE, UnknownTableError, schema_catalog
+from src.database import get_db
+from src.schemas.preview import TablePreview, TableSchema, TableStats
+
+router = APIRouter(tags=["preview"])
+
+
+def _table_or_404(db: Session, table: str):
     try:
-        conn = sqlite3.connect(db_url)
-        cursor = conn.cursor()
-        # Get first user table
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")
-        tables = cursor.fetchall()
-        if not tables:
-            return {"error": "No tables found in database"}
-        table_name = tables[0][0]
-        cursor.execute(f"SELECT * FROM {table_name} LIMIT 10")
-        rows = cursor.fetchall()
-        col_names = [desc[0] for desc in cursor.description]
-        conn.close()
-        return {
-            "columns": col_names,
-            "rows": rows,
-            "table": table_name
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return schema_catalog.table(db, table)
+    except UnknownTableError:
+        raise HTTPException(status_code=404, detail=f"Table {table!r} not found")
+
+
+@router.get("/preview", response_model=TablePreview)
+def preview(db: Session = Depends(get_db)):
+    first = schema_catalog.first_table(db)
+    if first is None:
+        raise HTTPException(status_code=404, detail="No tables found in database")
+    return schema_catalog.preview(db, first)
+
+
+@router.get("/preview/tables",
+            response_model=List[TableSchema],
+            summary="Schema catalog",
+            description="Tables with their columns, types and indexes, cached until the schema changes.")
+def list_tables(db: Session = Depends(get_db)):
+    return [table.as_dict() for table in schema_catalog.tables(db).values()]
+
+
+@router.get("/preview/tables/{table}",
+            response_model=TablePreview,
+            summary="Preview rows of a table",
+            description="A page of rows in rowid order. `table` must be one of `/preview/tables`.")
+def preview_table(table: str, limit: int = Query(10, ge=1, le=1000), offset: int = Query(0, ge=0),
+                  db: Session = Depends(get_db)):
+    _table_or_404(db, table)
+    return schema_catalog.preview(db, table, limit, offset)
+
+
+@router.get("/preview/tables/{table}/stats",
+            response_model=TableStats,
+            summary="Estimated row count and column statistics",
+            description=(
+                    "Row count from `sqlite_stat1` when the database was analyzed, otherwise from the rowid range. "
+                    "Null fraction, distinct count, min and max per column over a random sample of rows. "
+                    "Nothing is scanned in full, and results are cached until the data changes."
+            ))
+def table_stats(table: str, sample_size: int = Query(DEFAULT_SAMPLE_SIZE, ge=1, le=MAX_SAMPLE_SIZE),
+                db: Session = Depends(get_db)):
+    _table_or_404(db, table)
+    return schema_catalog.stats(db, table, sample_size)
@@ -1,18 +1,22 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from src.app.serialization import rows_response, schema_columns
+from src.app.utils import resolve_ids
 from src.database import get_db
 from src.models import Product
-from src.schemas.crud import ProductRead
+from src.schemas.crud import ProductBatch, ProductIds, ProductRead
 
 router = APIRouter(prefix="/products", tags=["products"])
 
 
 @router.get("/", response_model=List[ProductRead])
-def list_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(Product).offset(skip).limit(limit).all()
+def list_products(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    stmt = select(*schema_columns(Product, ProductRead)).offset(skip).limit(limit)
+    return rows_response(request, db.execute(stmt))
 
 
 @router.get("/{product_id}", response_model=ProductRead)
@@ -21,3 +25,14 @@ def get_product(product_id: int, db: Session = Depends(get_db)):
     if not prod:
         raise HTTPException(status_code=404, detail="Product not found")
     return prod
+
+
+@router.post("/batch",
+             response_model=ProductBatch,
+             summary="Look up products by id list",
+             description=(
+                     "Resolve up to 5000 ids in one request with chunked `IN (...)` queries. "
+                     "`items` follow the request order; ids that do not exist are listed in `missing`."
+             ))
+def get_products_batch(body: ProductIds, db: Session = Depends(get_db)):
+    return resolve_ids(db, Product, Product.product_id, body.ids)
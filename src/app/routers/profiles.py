@@ -0,0 +1,25 @@
+import os
+import re
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse
+
+from src.app.profiling import profile_path
+from src.config.env_vars import ENV_VARS
+
+router = APIRouter(prefix="/profiles", tags=["profiling"])
+
+
+@router.get("/{profile_id}",
+            summary="Download a request profile",
+            description=(
+                    "Folded stacks of a request profiled with the `X-Profile` header or `profile` query flag, "
+                    "as named by its `X-Profile-Id` response header. Open it with flamegraph.pl or speedscope."
+            ))
+def get_profile(profile_id: str, request: Request):
+    if ENV_VARS.PROFILE_DIR is None or request.client is None or request.client.host not in ENV_VARS.PROFILE_CLIENTS:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    path = profile_path(ENV_VARS.PROFILE_DIR, profile_id)
+    if not re.fullmatch(r"[0-9a-f]{32}", profile_id) or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.folded")
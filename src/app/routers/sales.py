@@ -1,18 +1,24 @@
 from datetime import date
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
+from src.app.profiling import profile_thread
+from src.app.serialization import rows_response, schema_columns
+from src.app.utils import resolve_ids
 from src.database import get_db
 from src.models import Transaction
-from src.schemas.crud import SaleRead
+from src.schemas.crud import SaleBatch, SaleIds, SaleRead, SalesBatchResult
 
 router = APIRouter(prefix="/sales", tags=["sales"])
 
 
 @router.get("/", response_model=List[SaleRead])
 def query_sales(
+        request: Request,
         customer_id: Optional[str] = None,
         start_date: Optional[date] = Query(None, description="YYYY-MM-DD"),
         end_date: Optional[date] = Query(None, description="YYYY-MM-DD"),
@@ -20,14 +26,14 @@ def query_sales(
         limit: int = 100,
         db: Session = Depends(get_db),
 ):
-    q = db.query(Transaction)
+    q = select(*schema_columns(Transaction, SaleRead))
     if customer_id:
-        q = q.filter(Transaction.customer_id == customer_id)
+        q = q.where(Transaction.customer_id == customer_id)
     if start_date:
-        q = q.filter(Transaction.date >= start_date)
+        q = q.where(Transaction.date >= start_date)
     if end_date:
-        q = q.filter(Transaction.date <= end_date)
-    return q.offset(skip).limit(limit).all()
+        q = q.where(Transaction.date <= end_date)
+    return rows_response(request, db.execute(q.offset(skip).limit(limit)))
 
 
 @router.get("/{sale_id}", response_model=SaleRead)
@@ -36,3 +42,42 @@ def get_sale(sale_id: int, db: Session = Depends(get_db)):
     if not prod:
         raise HTTPException(status_code=404, detail="Product not found")
     return prod
+
+
+@profile_thread
+def _ingest(db: Session, body: bytes, content_type: str):
+    # pandas and pyarrow are imported by the first batch instead of at startup
+    from src.app.ingest import SalesBatchError, insert_sales, parse_sales_payload, validate_sales
+
+    try:
+        df = parse_sales_payload(body, content_type)
+        return insert_sales(db, validate_sales(db, df))
+    except SalesBatchError as e:
+        raise HTTPException(e.status_code, detail={"message": str(e), "error_count": e.error_count, "errors": e.errors})
+
+
+@router.post("/batch",
+             response_model=SalesBatchResult,
+             summary="Bulk insert sales",
+             description=(
+                     "Insert a batch of sales sent as NDJSON (`application/x-ndjson`, one sale per line), "
+                     "columnar JSON (`application/json`, column name → array) or an Arrow IPC stream "
+                     "(`application/vnd.apache.arrow.stream`). Columns are named like the `/sales` fields; "
+                     "`date`, `customer_id`, `product_id` and `qty` are required. The whole batch is validated "
+                     "before anything is written and rows are committed in chunks. Derived state such as the "
+                     "transaction snapshot is updated from the new rows only, without refitting the models."
+             ))
+async def ingest_sales(request: Request, db: Session = Depends(get_db)):
+    body = await request.body()
+    return await run_in_threadpool(_ingest, db, body, request.headers.get("content-type", "application/json"))
+
+
+@router.post("/batch_get",
+             response_model=SaleBatch,
+             summary="Look up sales by id list",
+             description=(
+                     "Resolve up to 5000 ids in one request with chunked `IN (...)` queries. "
+                     "`items` follow the request order; ids that do not exist are listed in `missing`."
+             ))
+def get_sales_batch(body: SaleIds, db: Session = Depends(get_db)):
+    return resolve_ids(db, Transaction, Transaction.id, body.ids)
@@ -0,0 +1,31 @@
+from fastapi import APIRouter
+
+from src.app.data_version import data_version_watcher
+from src.app.rfm_sketches import rfm_sketch_store
+from src.app.rollups import rollup_store
+from src.app.routers.pareto import model_executor
+from src.app.scheduler import RefitScheduler
+from src.config.env_vars import ENV_VARS
+from src.schemas.pareto import SchedulerStatus
+
+router = APIRouter(prefix="/scheduler", tags=["pareto-nbd"])
+refit_scheduler = RefitScheduler(
+    model_executor, data_version_watcher, rollup_store, rfm_sketch_store,
+    poll_interval=ENV_VARS.REFIT_POLL_SECONDS,
+    debounce=ENV_VARS.REFIT_DEBOUNCE_SECONDS,
+    max_delay=ENV_VARS.REFIT_MAX_DELAY_SECONDS,
+    refit_interval=ENV_VARS.REFIT_INTERVAL_SECONDS,
+    min_change=ENV_VARS.REFIT_MIN_CHANGE,
+)
+
+
+@router.get("/status",
+            response_model=SchedulerStatus,
+            summary="State of the refit scheduler",
+            description=(
+                    "What the scheduler is doing, the row counts now and at the last fit, when the data last "
+                    "changed, when summaries were last refreshed and the models last refit, why the last refit "
+                    "was skipped, and when it will next run. Times are UTC."
+            ))
+async def scheduler_status():
+    return refit_scheduler.status()
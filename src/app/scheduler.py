@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from src.app.data_version import DataFingerprint, DataVersionWatcher
+from src.app.model_pool import ModelExecutor
+from src.app.rfm_sketches import RFMSketchStore
+from src.app.rollups import RollupStore
+from src.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+def _as_datetime(timestamp: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(timestamp, timezone.utc) if timestamp is not None else None
+
+
+class RefitScheduler:
+    """
+    Refresh summaries and refit the models when the ``Sales`` table changes.
+
+    An asyncio task polls the data fingerprint (``PRAGMA data_version``, then
+    max SaleId, row count and edits of sales and products when it moved).
+    Bursts of changes are debounced:
+    summaries are refreshed once the table was quiet for ``debounce`` seconds,
+    or ``max_delay`` seconds after the first change at the latest. The models
+    are refit after that when at least ``min_change`` of the rows were added,
+    removed or edited since the last fit and the last fit is ``refit_interval`` seconds old, or
+    right away if they were never fitted. Fits requested through the API count
+    as fits and join a scheduled fit that is running. A failed fit is retried
+    ``debounce`` seconds later at the earliest.
+
+    Parameters
+    ----------
+    executor : ModelExecutor
+        runs the fits
+    watcher : DataVersionWatcher
+        data fingerprint
+    rollups : RollupStore
+        summaries refreshed after changes
+    sketches : RFMSketchStore
+        RFM quantile sketches refreshed with the rollups
+    poll_interval : float
+        seconds between two fingerprint checks
+    debounce : float
+        quiet seconds after a change before acting on it
+    max_delay : float
+        seconds after the first change of a burst before acting on it regardless
+    refit_interval : float
+        minimum seconds between two refits
+    min_change : float
+        share of rows that must have been added, removed or edited since the last fit to refit
+    """
+
+    def __init__(self, executor: ModelExecutor, watcher: DataVersionWatcher, rollups: RollupStore,
+                 sketches: RFMSketchStore, poll_interval: float, debounce: float, max_delay: float, refit_interval: float,
+                 min_change: float):
+        self.executor = executor
+        self.watcher = watcher
+        self.rollups = rollups
+        self.sketches = sketches
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.refit_interval = refit_interval
+        self.min_change = min_change
+
+        self.state = "stopped"
+        self.rows: Optional[int] = None
+        self.first_change_at: Optional[float] = None
+        self.last_change_at: Optional[float] = None
+        self.last_refresh_at: Optional[float] = None
+        self.last_refit_at: Optional[float] = None
+        self.last_skip_reason: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self._retry_at = 0.0
+        self._seen: Optional[Tuple[int, int, Optional[int]]] = None
+        self._fingerprint: Optional[DataFingerprint] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self.state = "idle"
+            self._task = asyncio.create_task(self._run(), name="refit-scheduler")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.state = "stopped"
+
+    async def _run(self):
+        while True:
+            try:
+                await self.tick()
+            except Exception as e:
+                self.state = "idle"
+                self.last_error = f"{e.__class__.__name__}: {e}"
+                logger.exception("Refit scheduler tick failed: %s", e)
+            await asyncio.sleep(self.poll_interval)
+
+    async def tick(self):
+        """
+        Check the data once, refreshing summaries and refitting if due
+        """
+        fingerprint = await run_in_threadpool(self.watcher.fingerprint)
+        now = time.time()
+        seen = (fingerprint.max_sale_id, fingerprint.row_count, fingerprint.sales_edits)
+        self.rows = fingerprint.row_count
+        self._fingerprint = fingerprint
+        # summaries are brought up to date at startup, only later changes need a refresh
+        if self._seen is not None and seen != self._seen:
+            self.first_change_at = self.first_change_at or now
+            self.last_change_at = now
+        self._seen = seen
+
+        if self.first_change_at is not None:
+            if now < self._settled_at():
+                return
+            self.state = "refreshing"
+            await run_in_threadpool(self._refresh_summaries)
+            self.first_change_at = self.last_change_at = None
+            self.last_refresh_at = time.time()
+            self.state = "idle"
+
+        reason = self._skip_refit(fingerprint, now)
+        if reason is not None:
+            self.last_skip_reason = reason
+            return
+        self.state = "fitting"
+        try:
+            await self.executor.fit()
+        except Exception:
+            self._retry_at = time.time() + self.debounce
+            raise
+        finally:
+            self.state = "idle"
+        self.last_refit_at = time.time()
+        self.last_skip_reason = self.last_error = None
+        logger.info("Models refit on %d sales", fingerprint.row_count)
+
+    def _settled_at(self) -> float:
+        return min(self.last_change_at + self.debounce, self.first_change_at + self.max_delay)
+
+    def _refresh_summaries(self):
+        if not self.rollups.enabled and not self.sketches.enabled:
+            return
+        db = SessionLocal()
+        try:
+            if self.rollups.enabled:
+                self.rollups.refresh(db)
+            if self.sketches.enabled:
+                self.sketches.refresh(db)
+        finally:
+            db.close()
+
+    def _changed_share(self, fingerprint: DataFingerprint) -> float:
+        fitted = self.executor.fitted_fingerprint
+        changed = abs(fingerprint.row_count - fitted.row_count)
+        if fingerprint.sales_edits is not None and fitted.sales_edits is not None:
+            # edits are counted per row
+            changed += abs(fingerprint.sales_edits - fitted.sales_edits)
+        return changed / max(fitted.row_count, 1)
+
+    def _skip_refit(self, fingerprint: DataFingerprint, now: float) -> Optional[str]:
+        if fingerprint.row_count == 0:
+            return "no sales"
+        if now < self._retry_at:
+            return "retrying after a failed fit"
+        if self.executor.fitted_fingerprint is None:
+            return None
+        if self._changed_share(fingerprint) < self.min_change:
+            return "change below threshold"
+        if now < self.executor.fitted_at + self.refit_interval:
+            return "refit interval not elapsed"
+        return None
+
+    def next_run_at(self) -> Optional[float]:
+        """
+        When the scheduler will next refresh or refit, as a timestamp, None if nothing is due
+        """
+        if self.state == "stopped":
+            return None
+        if self.first_change_at is not None:
+            return self._settled_at()
+        fitted = self.executor.fitted_fingerprint
+        if fitted is None:
+            return max(time.time(), self._retry_at) if self.rows else None
+        if self._fingerprint is not None and self._changed_share(self._fingerprint) >= self.min_change:
+            return max(time.time(), self._retry_at, self.executor.fitted_at + self.refit_interval)
+        return None
+
+    def status(self) -> Dict:
+        """
+        Scheduler state, configuration and timestamps of the last and next runs
+        """
+        fitted = self.executor.fitted_fingerprint
+        return {
+            "state": self.state,
+            "rows": self.rows,
+            "rows_at_last_fit": fitted.row_count if fitted is not None else None,
+            "model_version": self.executor.model_version,
+            "first_change_at": _as_datetime(self.first_change_at),
+            "last_change_at": _as_datetime(self.last_change_at),
+            "last_refresh_at": _as_datetime(self.last_refresh_at),
+            "last_refit_at": _as_datetime(self.last_refit_at),
+            "last_fit_at": _as_datetime(self.executor.fitted_at),
+            "last_skip_reason": self.last_skip_reason,
+            "last_error": self.last_error,
+            "next_run_at": _as_datetime(self.next_run_at()),
+            "poll_interval": self.poll_interval,
+            "debounce": self.debounce,
+            "max_delay": self.max_delay,
+            "refit_interval": self.refit_interval,
+            "min_change": self.min_change,
+        }
@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from src.app.data_version import DataVersionWatcher, data_version_watcher
+from src.database import SessionLocal
+from src.models import Customer
+
+logger = logging.getLogger(__name__)
+
+# match kinds, in ranking order
+MATCH_KINDS = ("id", "name", "word")
+
+
+class PrefixIndex:
+    """
+    Sorted keys with bisect lookup of every key starting with a prefix
+    """
+
+    def __init__(self, entries: List[Tuple[str, int]]):
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.values = [value for _, value in entries]
+
+    def scan(self, prefix: str):
+        """
+        Yield the values of keys starting with ``prefix``, in key order
+        """
+        i = bisect_left(self.keys, prefix)
+        while i < len(self.keys) and self.keys[i].startswith(prefix):
+            yield self.values[i]
+            i += 1
+
+
+class _Snapshot(NamedTuple):
+    """
+    One build of the index, published with a single assignment so readers never mix two builds
+    """
+
+    data_version: int
+    customers: Tuple[Tuple[str, str], ...]
+    indexes: Dict[str, PrefixIndex]
+
+
+class CustomerSearchIndex:
+    """
+    In-memory prefix index over CustomerId, CompanyName and the words of CompanyName.
+
+    Matches are ranked by kind (id, then full name, then any later word of the
+    name) and alphabetically within a kind, so exact and shorter matches come
+    first. The index is rebuilt in the background when the database changes,
+    at most once per ``min_refresh_interval`` seconds, and keeps serving the
+    previous version meanwhile.
+    """
+
+    def __init__(self, watcher: DataVersionWatcher = data_version_watcher, min_refresh_interval: float = 30.0):
+        self.watcher = watcher
+        self.min_refresh_interval = min_refresh_interval
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._built_at = 0.0
+        self._snapshot: Optional[_Snapshot] = None
+
+    def build(self, db: Session):
+        """
+        Load every customer and rebuild the index
+
+        Parameters
+        ----------
+        db : Session
+            database session
+        """
+        data_version = self.watcher.fingerprint().data_version
+        customers = db.query(Customer.id, Customer.company_name).order_by(Customer.id).all()
+        ids, names, words = [], [], []
+        for position, (customer_id, company_name) in enumerate(customers):
+            ids.append((customer_id.lower(), position))
+            name = (company_name or "").lower()
+            names.append((name, position))
+            words.extend((word, position) for word in name.split()[1:])
+        indexes = {"id": PrefixIndex(ids), "name": PrefixIndex(names), "word": PrefixIndex(words)}
+        snapshot = _Snapshot(data_version, tuple(tuple(customer) for customer in customers), indexes)
+        with self._lock:
+            self._snapshot = snapshot
+            self._built_at = time.monotonic()
+        logger.info("Customer search index built with %d customers", len(customers))
+
+    def build_in_background(self):
+        """
+        Rebuild the index in a daemon thread with its own session, unless a rebuild is running
+        """
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            db = SessionLocal()
+            try:
+                self.build(db)
+            except Exception as e:
+                logger.exception("Customer search index build failed: %s", e)
+            finally:
+                db.close()
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name="customer-search-index", daemon=True).start()
+
+    def search(self, db: Session, query: str, limit: int = 10) -> List[Dict]:
+        """
+        Return customers whose id, name or a word of the name starts with ``query``
+
+        Parameters
+        ----------
+        db : Session
+            database session, used to build the index on first use
+        query : str
+            case-insensitive prefix
+        limit : int
+            maximum number of matches
+
+        Returns
+        -------
+        matches : list of dict
+            ``id``, ``company_name`` and the ``match`` kind, best first
+        """
+        if self._snapshot is None:
+            self.build(db)
+        elif (self.watcher.fingerprint().data_version != self._snapshot.data_version
+              and time.monotonic() - self._built_at >= self.min_refresh_interval):
+            self.build_in_background()
+
+        prefix = query.strip().lower()
+        # read once, a concurrent build replaces the whole snapshot
+        snapshot = self._snapshot
+        customers, indexes = snapshot.customers, snapshot.indexes
+        seen, matches = set(), []
+        for kind in MATCH_KINDS:
+            for position in indexes[kind].scan(prefix):
+                if len(matches) == limit:
+                    return matches
+                if position in seen:
+                    continue
+                seen.add(position)
+                customer_id, company_name = customers[position]
+                matches.append({"id": customer_id, "company_name": company_name, "match": kind})
+        return matches
+
+
+customer_search_index = CustomerSearchIndex()
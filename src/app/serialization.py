@@ -0,0 +1,124 @@
+import gzip
+from typing import Any, Dict, List, Optional, Type
+
+import orjson
+from pydantic import BaseModel
+from sqlalchemy.engine import Result
+from starlette.requests import Request
+from starlette.responses import Response
+
+from src.config.env_vars import ENV_VARS
+
+try:
+    import brotli
+except ImportError:  # optional, responses are gzipped when it is missing
+    brotli = None
+
+# bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+# favour speed, level 1 takes ~40% less time than 5 on JSON rows for a ~20% larger body
+GZIP_LEVEL = 1
+BROTLI_QUALITY = 4
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def schema_columns(model, schema: Type[BaseModel]) -> List:
+    """
+    ORM attributes of ``model`` named like the fields of ``schema``, to select rows shaped like it
+    """
+    return [getattr(model, field) for field in schema.model_fields]
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick ``br`` or ``gzip`` from an Accept-Encoding header, honouring q-values
+
+    Parameters
+    ----------
+    accept_encoding : str
+        header value, e.g. ``"gzip, deflate, br;q=0.9"``
+
+    Returns
+    -------
+    encoding : str or None
+        ``br``, ``gzip`` or ``None`` for identity
+    """
+    weights = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip()] = q
+    supported = ["br", "gzip"] if brotli is not None else ["gzip"]
+    candidates = [(weights.get(c, weights.get("*", 0.0)), -i, c) for i, c in enumerate(supported)]
+    q, _, coding = max(candidates)
+    return coding if q > 0 else None
+
+
+def fast_json_response(request: Request, content: Any, status_code: int = 200,
+                       headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Serialize ``content`` with orjson and compress it as the client accepts, bypassing response_model.
+
+    numpy arrays and scalars are serialized natively, without ``tolist``.
+
+    Parameters
+    ----------
+    request : Request
+        request, for its Accept-Encoding header
+    content : Any
+        JSON-serializable content
+    status_code : int
+        response status
+    headers : dict, optional
+        extra response headers
+
+    Returns
+    -------
+    response : Response
+        ``application/json`` response, possibly gzip or brotli encoded
+    """
+    body = orjson.dumps(content, option=ORJSON_OPTIONS)
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+    if len(body) >= MIN_COMPRESS_SIZE:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+        if encoding == "br":
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+        elif encoding == "gzip":
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+def rows_response(request: Request, result: Result):
+    """
+    Return result rows as a list of JSON objects keyed by column name.
+
+    With ``FAST_JSON`` enabled the rows are serialized directly from the
+    result tuples, otherwise the records go through the route's
+    ``response_model`` as before.
+
+    Parameters
+    ----------
+    request : Request
+        request, for content negotiation
+    result : Result
+        executed select, columns named like the response schema fields
+
+    Returns
+    -------
+    response : Response or list of dict
+        serialized response, or records for FastAPI to validate
+    """
+    keys = list(result.keys())
+    records = [dict(zip(keys, row)) for row in result]
+    if not ENV_VARS.FAST_JSON:
+        return records
+    return fast_json_response(request, records)
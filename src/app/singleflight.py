@@ -0,0 +1,56 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Tuple
+
+from src.app.metrics import COALESCED_CALLS
+
+
+class SingleFlight:
+    """
+    Share one in-flight computation between concurrent identical calls.
+
+    The first call for a key starts the computation, calls with the same key
+    made before it finishes await the same result, or exception, instead of
+    running it again. Nothing is cached: a call made after the computation
+    finished starts a new one. Callers being cancelled, e.g. a client
+    disconnecting, does not cancel the computation for the others.
+
+    Calls must all be made from the same event loop.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Tuple, asyncio.Future] = {}
+
+    async def do(self, operation: str, args: Tuple[Hashable, ...], func: Callable[[], Awaitable]):
+        """
+        Return the result of ``func()``, shared with concurrent calls for the same operation and arguments
+
+        Parameters
+        ----------
+        operation : str
+            name of the computation, also its label in the metrics
+        args : tuple
+            hashable arguments identifying the computation
+        func : callable
+            starts the computation, only called when none is in flight
+
+        Returns
+        -------
+        result
+            result of the computation
+        """
+        key = (operation, *args)
+        future = self._calls.get(key)
+        if future is None:
+            COALESCED_CALLS.inc(operation, "executed")
+            future = self._calls[key] = asyncio.ensure_future(func())
+            future.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            COALESCED_CALLS.inc(operation, "coalesced")
+        return await asyncio.shield(future)
+
+    def _finish(self, key: Tuple, future: asyncio.Future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        # retrieved here in case every caller was cancelled, so asyncio does not log it as lost
+        if not future.cancelled():
+            future.exception()
@@ -0,0 +1,226 @@
+import struct
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+# header of the serialized sketch: k, number of levels, items seen, min, max, seed
+_HEADER = struct.Struct("<IIQddQ")
+
+
+def kll_rank_error(k: int) -> float:
+    """
+    Normalized rank error of a KLL sketch of size ``k`` for a single quantile, at 99% confidence
+
+    Empirical fit published with the Apache DataSketches KLL sketch: about 1.65% for ``k=200``.
+    """
+    return 2.446 / k ** 0.9433
+
+
+class KLLSketch:
+    """
+    Mergeable quantile sketch of Karnin, Lang and Liberty (KLL).
+
+    Items are kept in levels, an item of level ``h`` standing for ``2**h``
+    inserted values. When a level exceeds its capacity it is sorted and every
+    other item, starting at a random offset, moves up a level. Capacities
+    shrink geometrically (factor 2/3) from ``k`` at the top level, so the
+    sketch keeps ``O(k)`` items whatever the number of values. Sketches of
+    disjoint sets merge level by level into a sketch of their union with the
+    same error guarantee. The rank of any value, and so any quantile, is
+    estimated within ``kll_rank_error(k)`` of the number of values.
+
+    Parameters
+    ----------
+    k : int
+        capacity of the top level, accuracy grows and size grows with it
+    seed : int
+        seed of the compaction offsets, the same inputs give the same sketch
+    """
+
+    def __init__(self, k: int = 200, seed: int = 0):
+        self.k = k
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.seed = seed
+        self._rng = np.random.default_rng(seed)
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._sorted: Optional[tuple] = None
+
+    @property
+    def rank_error(self) -> float:
+        return kll_rank_error(self.k)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - 1 - level
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values: Sequence[float]):
+        """
+        Add values to the sketch
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not len(values):
+            return
+        self.n += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other: "KLLSketch"):
+        """
+        Fold another sketch in, the result summarizes the values of both
+        """
+        if not other.n:
+            return
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+    def _compress(self):
+        self._sorted = None
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                items = np.sort(items)
+                # an odd item out stays, the total weight is preserved exactly
+                keep = items[:len(items) % 2]
+                promoted = items[len(keep) + self._rng.integers(2)::2]
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                # a new top level lowers every capacity, so start over
+                level = 0
+                continue
+            level += 1
+
+    def weighted_items(self):
+        """
+        Retained items in increasing order with the number of values each stands for
+        """
+        if self._sorted is None:
+            items = np.concatenate(self.levels)
+            weights = np.concatenate([np.full(len(items), 2 ** level, dtype=np.int64)
+                                      for level, items in enumerate(self.levels)])
+            order = np.argsort(items, kind="stable")
+            self._sorted = items[order], weights[order]
+        return self._sorted
+
+    def quantiles(self, qs: Sequence[float]) -> np.ndarray:
+        """
+        Estimated quantiles, the smallest retained items whose estimated rank reaches each fraction
+
+        Parameters
+        ----------
+        qs : sequence of float
+            fractions between 0 and 1
+
+        Returns
+        -------
+        values : np.ndarray
+            one estimate per fraction, NaN when the sketch is empty
+        """
+        if not self.n:
+            return np.full(len(qs), np.nan)
+        items, weights = self.weighted_items()
+        ranks = np.cumsum(weights)
+        positions = np.searchsorted(ranks, np.asarray(qs) * self.n, side="left")
+        return items[np.minimum(positions, len(items) - 1)]
+
+    def to_bytes(self) -> bytes:
+        sizes = np.array([len(items) for items in self.levels], dtype=np.uint32)
+        return (_HEADER.pack(self.k, len(self.levels), self.n, self.min, self.max, self.seed)
+                + sizes.tobytes() + np.concatenate(self.levels).astype("<f8").tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "KLLSketch":
+        k, n_levels, n, minimum, maximum, seed = _HEADER.unpack_from(data)
+        sketch = cls(k, seed)
+        sketch.n, sketch.min, sketch.max = n, minimum, maximum
+        offset = _HEADER.size
+        sizes = np.frombuffer(data, dtype=np.uint32, count=n_levels, offset=offset)
+        items = np.frombuffer(data, dtype="<f8", offset=offset + sizes.nbytes).copy()
+        sketch.levels = np.split(items, np.cumsum(sizes)[:-1])
+        # compaction offsets continue from a fresh stream, the state of the generator is not kept
+        sketch._rng = np.random.default_rng((seed, n))
+        return sketch
+
+
+class TurnstileQuantiles:
+    """
+    Quantiles of a multiset that values are added to and removed from.
+
+    KLL sketches only take insertions, so removals go to a second sketch and
+    the rank of a value is its rank among added values minus its rank among
+    removed values. Replacing a value is removing the old one and adding the
+    new one. Each estimate is off by at most ``kll_rank_error(k)`` of the
+    values each sketch saw, so the rank error relative to the live values is
+    ``rank_error * (added + removed) / live``; ``needs_rebuild`` tells when
+    removals exceed half the live values, after which the error would exceed
+    twice the error of a single sketch (about 3.3% for ``k=200``).
+
+    Parameters
+    ----------
+    k : int
+        size of both sketches
+    """
+
+    def __init__(self, k: int = 200):
+        self.added = KLLSketch(k, seed=1)
+        self.removed = KLLSketch(k, seed=2)
+
+    @property
+    def n(self) -> int:
+        return self.added.n - self.removed.n
+
+    @property
+    def rank_error(self) -> float:
+        if not self.n:
+            return 0.0
+        return self.added.rank_error * (self.added.n + self.removed.n) / self.n
+
+    @property
+    def needs_rebuild(self) -> bool:
+        return self.removed.n > self.n / 2
+
+    def add(self, values: Sequence[float]):
+        self.added.update(values)
+
+    def remove(self, values: Sequence[float]):
+        self.removed.update(values)
+
+    def quantiles(self, qs: Sequence[float]) -> np.ndarray:
+        """
+        Estimated quantiles of the live values, NaN when there are none
+        """
+        if self.n <= 0:
+            return np.full(len(qs), np.nan)
+        added, added_weights = self.added.weighted_items()
+        removed, removed_weights = self.removed.weighted_items()
+        items = np.concatenate([added, removed])
+        weights = np.concatenate([added_weights, -removed_weights])
+        order = np.argsort(items, kind="stable")
+        # approximation can make the running difference dip, ranks never decrease
+        ranks = np.maximum.accumulate(np.cumsum(weights[order]))
+        positions = np.searchsorted(ranks, np.asarray(qs) * self.n, side="left")
+        return items[order][np.minimum(positions, len(items) - 1)]
+
+    def to_bytes(self) -> bytes:
+        added = self.added.to_bytes()
+        return struct.pack("<Q", len(added)) + added + self.removed.to_bytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TurnstileQuantiles":
+        (size,) = struct.unpack_from("<Q", data)
+        quantiles = cls.__new__(cls)
+        quantiles.added = KLLSketch.from_bytes(data[8:8 + size])
+        quantiles.removed = KLLSketch.from_bytes(data[8 + size:])
+        return quantiles
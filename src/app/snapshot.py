@@ -0,0 +1,156 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from pandas.api.types import union_categoricals
+from sqlalchemy.orm import Session
+
+from src.app.data_version import DataFingerprint, DataVersionWatcher, data_version_watcher, on_sales_ingested
+from src.app.loaders import load_transactions
+from src.app.metrics import CACHE_REQUESTS
+from src.config.env_vars import ENV_VARS
+
+logger = logging.getLogger(__name__)
+
+# bump when the columns or dtypes of the snapshot, or the fields of the fingerprint, change
+SNAPSHOT_FORMAT = 3
+
+
+class TransactionSnapshot:
+    """
+    Columnar on-disk copy of the transaction frame.
+
+    The frame is written once as an uncompressed Arrow IPC (Feather v2) file
+    tagged with the data fingerprint it was built from, and memory-mapped on
+    load. It is reused, from memory or from disk, until sales are added or
+    removed or ``Sales`` or ``Products`` are edited, which other processes see
+    through the persisted edit counts.
+    """
+
+    def __init__(self, path: Path, watcher: DataVersionWatcher):
+        self.path = Path(path)
+        self.watcher = watcher
+        self._lock = threading.Lock()
+        self._frame: Optional[pd.DataFrame] = None
+        self._fingerprint: Optional[DataFingerprint] = None
+
+    def load(self, db: Session) -> pd.DataFrame:
+        """
+        Return the transaction frame, rebuilding the snapshot if the data changed
+
+        Parameters
+        ----------
+        db : Session
+            database session, only used when the snapshot has to be rebuilt
+
+        Returns
+        -------
+        df : pd.DataFrame
+            transaction frame
+        """
+        fingerprint = self.watcher.fingerprint()
+        with self._lock:
+            if self._fingerprint is not None and self._fingerprint.matches(fingerprint):
+                CACHE_REQUESTS.inc("transaction_snapshot", "hit")
+                return self._frame
+
+            on_disk = self._read_fingerprint()
+            if on_disk is not None and on_disk.matches(fingerprint):
+                CACHE_REQUESTS.inc("transaction_snapshot", "disk")
+                frame = self._read()
+            else:
+                CACHE_REQUESTS.inc("transaction_snapshot", "miss")
+                frame = load_transactions(db)
+                self._write(frame, fingerprint)
+
+            self._frame, self._fingerprint = frame, fingerprint
+            return frame
+
+    def append(self, db: Session, previous: DataFingerprint, first_sale_id: int):
+        """
+        Extend the snapshot with sales inserted after ``previous`` was taken.
+
+        Only the new rows are loaded. If the snapshot was not current before the
+        insert, or other changes happened meanwhile, it is left for the next
+        ``load`` to rebuild.
+
+        Parameters
+        ----------
+        db : Session
+            database session
+        previous : DataFingerprint
+            fingerprint of the ``Sales`` table before the insert
+        first_sale_id : int
+            smallest inserted SaleId
+        """
+        with self._lock:
+            if (self._fingerprint is None or not self._fingerprint.matches(previous)
+                    or first_sale_id <= previous.max_sale_id):
+                return
+            new_rows = load_transactions(db, min_sale_id=previous.max_sale_id)
+            fingerprint = self.watcher.fingerprint()
+            if fingerprint.row_count != previous.row_count + len(new_rows):
+                return
+
+            customer_ids = union_categoricals([self._frame["customer_id"], new_rows["customer_id"]])
+            frame = pd.concat([self._frame, new_rows], ignore_index=True)
+            frame["customer_id"] = customer_ids
+            self._write(frame, fingerprint)
+            self._frame, self._fingerprint = frame, fingerprint
+
+    def invalidate(self):
+        """
+        Drop the in-memory frame and the file so the next load rebuilds them
+        """
+        with self._lock:
+            self._frame = self._fingerprint = None
+            self.path.unlink(missing_ok=True)
+
+    def _read_fingerprint(self) -> Optional[DataFingerprint]:
+        if not self.path.exists():
+            return None
+        try:
+            with pa.memory_map(str(self.path)) as source:
+                metadata = pa.ipc.open_file(source).schema.metadata or {}
+        except (OSError, pa.ArrowInvalid):
+            logger.warning("Unreadable transaction snapshot at %s", self.path)
+            return None
+        if int(metadata.get(b"format", 0)) != SNAPSHOT_FORMAT:
+            return None
+        return DataFingerprint(**json.loads(metadata[b"fingerprint"]))
+
+    def _read(self) -> pd.DataFrame:
+        return feather.read_table(str(self.path), memory_map=True).to_pandas()
+
+    def _write(self, frame: pd.DataFrame, fingerprint: DataFingerprint):
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        metadata = {
+            **(table.schema.metadata or {}),
+            b"format": str(SNAPSHOT_FORMAT).encode(),
+            b"fingerprint": json.dumps(fingerprint._asdict()).encode(),
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        # uncompressed so that the file can be memory-mapped without decoding
+        feather.write_feather(table.replace_schema_metadata(metadata), str(tmp_path), compression="uncompressed")
+        os.replace(tmp_path, self.path)
+
+
+def _snapshot_path() -> Path:
+    db_path = Path(ENV_VARS.DB_URL)
+    directory = Path(ENV_VARS.SNAPSHOT_DIR) if ENV_VARS.SNAPSHOT_DIR else db_path.parent
+    return directory / f"{db_path.stem}.transactions.arrow"
+
+
+transaction_snapshot = TransactionSnapshot(_snapshot_path(), data_version_watcher)
+
+
+@on_sales_ingested
+def _append_ingested_sales(db: Session, previous: DataFingerprint, first_sale_id: int):
+    transaction_snapshot.append(db, previous, first_sale_id)
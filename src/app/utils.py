@@ -1,16 +1,70 @@
-import pandas as pd
+from typing import TYPE_CHECKING, Dict, List
+
 from sqlalchemy.orm import Session
 
-from src.models import Customer, Transaction
+from src.models import Customer
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# ids per IN (...) query, below SQLite's default bound parameter limit
+LOOKUP_CHUNK_SIZE = 900
 
 
 def get_customer(db: Session, customer_id: int):
     return db.query(Customer).filter(Customer.id == customer_id).first()
 
 
-def get_transactions_df(db: Session) -> pd.DataFrame:
-    txs = db.query(Transaction).all()
-    return pd.DataFrame([
-        {"customer_id": t.customer_id, "date": pd.to_datetime(t.date).date(), "amount": t.qty * t.product.price}
-        for t in txs
-    ])
+def get_transactions_df(db: Session) -> "pd.DataFrame":
+    # imports pandas, which the lookups below do not need
+    from src.app.snapshot import transaction_snapshot
+
+    df = transaction_snapshot.load(db)
+    return df.assign(date=df["date"].dt.normalize())
+
+
+def get_by_ids(db: Session, model, column, ids: List, chunk_size: int = LOOKUP_CHUNK_SIZE) -> Dict:
+    """
+    Load the rows of ``model`` whose ``column`` is in ``ids`` with chunked IN queries
+
+    Parameters
+    ----------
+    db : Session
+        database session
+    model : Base
+        ORM model to load
+    column : InstrumentedAttribute
+        id column of the model
+    ids : list
+        ids to resolve, duplicates are queried once
+    chunk_size : int
+        ids per query
+
+    Returns
+    -------
+    rows : dict
+        found rows by id
+    """
+    unique_ids = list(dict.fromkeys(ids))
+    found = {}
+    for i in range(0, len(unique_ids), chunk_size):
+        chunk = unique_ids[i:i + chunk_size]
+        for row in db.query(model).filter(column.in_(chunk)):
+            found[getattr(row, column.key)] = row
+    return found
+
+
+def resolve_ids(db: Session, model, column, ids: List) -> Dict:
+    """
+    Resolve ids to rows in request order and report the ids that do not exist
+
+    Returns
+    -------
+    result : dict
+        ``items`` found, in request order, and ``missing`` ids
+    """
+    found = get_by_ids(db, model, column, ids)
+    return {
+        "items": [found[i] for i in ids if i in found],
+        "missing": [i for i in ids if i not in found],
+    }
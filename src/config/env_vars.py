@@ -1,3 +1,6 @@
+from pathlib import Path
+from typing import List, Literal, Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 from src.globals import PACKAGE_ROOT
@@ -10,7 +13,40 @@ class EnvironmentVariables(BaseSettings):
     """
     model_config = SettingsConfigDict(env_file=PACKAGE_ROOT / ".env", env_file_encoding='utf-8')
     DB_URL: str
+    SNAPSHOT_DIR: Optional[str] = None
+    # rollups and sketches derived from the data, "<DB_URL without suffix>.derived.db" by default
+    DERIVED_DB_URL: Optional[str] = None
+    ROLLUPS_ENABLED: bool = True
+    # orjson list responses without per-row response_model validation, opt-in
+    FAST_JSON: bool = False
+    # RFM quintile edges from KLL sketches kept up to date with new sales, exact quantiles otherwise
+    RFM_SKETCHES: bool = True
+    RFM_SKETCH_K: int = 200
+    # import the modeling stack in the background at startup instead of on the first model request
+    PNBD_PREWARM: bool = False
+    # worker processes for model fits and predictions, 0 runs them in the app's threadpool
+    MODEL_WORKERS: int = 2
+    # model calls queued or running before requests are turned away with 503
+    MODEL_MAX_PENDING: int = 16
+    # refresh summaries and refit the models after data changes, see src/app/scheduler.py;
+    # opt-in, it fits the models at startup if they were never fitted
+    REFIT_SCHEDULER: bool = False
+    REFIT_POLL_SECONDS: float = 5.0
+    REFIT_DEBOUNCE_SECONDS: float = 30.0
+    REFIT_MAX_DELAY_SECONDS: float = 300.0
+    REFIT_INTERVAL_SECONDS: float = 3600.0
+    # share of rows added, removed or edited since the last fit below which refits are skipped
+    REFIT_MIN_CHANGE: float = 0.01
+    # per-request profiling, disabled unless a directory is set
+    PROFILE_DIR: Optional[str] = None
+    PROFILE_PATHS: List[str] = ["/models/pnbd", "/sales"]
+    PROFILE_CLIENTS: List[str] = ["127.0.0.1", "::1"]
+    # query auditing per request: "log" or "raise" when a statement repeats or is slow
+    QUERY_AUDIT: Literal["off", "log", "raise"] = "off"
+    QUERY_AUDIT_MAX_REPEATS: int = 20
+    QUERY_AUDIT_SLOW_MS: float = 500.0
 
 
 ENV_VARS = EnvironmentVariables()
 DATABASE_URL = "sqlite:///" + ENV_VARS.DB_URL
+DERIVED_DATABASE_PATH = ENV_VARS.DERIVED_DB_URL or str(Path(ENV_VARS.DB_URL).with_suffix(".derived.db"))
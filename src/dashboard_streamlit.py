@@ -1,3 +1,7 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import streamlit as st
 import pandas as pd
@@ -5,9 +9,14 @@ import requests
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # ========== CONFIG ==========
 BACKEND = "http://localhost:8000"
+# concurrent requests of one page, also the size of the connection pool
+FETCH_WORKERS = 8
+# seconds a rerun trusts the last data version before asking the server again
+VERSION_TTL = 5
 
 # ========== THEME & STYLING ==========
 st.set_page_config(
@@ -42,26 +51,106 @@ st.markdown("""
 
 
 # ========== UTILITY FUNCTIONS ==========
-def fetch_json(endpoint, params=None):
-    if not endpoint.endswith('/') and not endpoint.endswith('fit'):
-        endpoint += '/'
+class FetchError(Exception):
+    pass
+
+
+@st.cache_resource
+def http_session():
+    # one keep-alive pool shared by every rerun, session and fetch thread
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=FETCH_WORKERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
+
+@st.cache_data(ttl=VERSION_TTL, show_spinner=False)
+def data_version():
+    """Data fingerprint, model version and date of the server, rechecked every few seconds."""
     try:
-        resp = requests.get(f"{BACKEND}{endpoint}", params=params)
-        if resp.status_code == 200:
-            return resp.json()
-        else:
-            st.error(f"Error fetching data from {endpoint}: Status {resp.status_code}")
-            return None
-    except Exception as e:
-        st.error(f"Error: {str(e)}")
+        resp = http_session().get(f"{BACKEND}/health/version", timeout=10)
+        resp.raise_for_status()
+    except requests.RequestException:
         return None
+    version = resp.json()
+    return version["data_version"], version["model_version"], version["date"]
+
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def cached_get(endpoint, params, version):
+    """
+    GET a JSON response, cached per endpoint, parameters and server version.
+
+    Failures raise, so they are not cached and the next rerun retries.
+    """
+    try:
+        resp = http_session().get(f"{BACKEND}{endpoint}", params=dict(params), timeout=60)
+    except requests.RequestException as e:
+        raise FetchError(f"Error: {str(e)}") from e
+    if resp.status_code != 200:
+        raise FetchError(f"Error fetching data from {endpoint}: Status {resp.status_code}")
+    return resp.json()
+
+
+def _request_key(endpoint, params):
+    if not endpoint.endswith('/') and not endpoint.endswith('fit'):
+        endpoint += '/'
+    return endpoint, tuple(sorted((params or {}).items()))
+
+
+def fetch_json(endpoint, params=None):
+    return fetch_many({endpoint: (endpoint, params)})[endpoint]
+
+
+def fetch_many(calls):
+    """
+    Fetch independent endpoints concurrently.
+
+    Parameters
+    ----------
+    calls : dict
+        name -> (endpoint, params)
+
+    Returns
+    -------
+    results : dict
+        name -> decoded JSON, None for failed calls, whose errors are shown
+    """
+    # without a server version, responses are reused for VERSION_TTL seconds only
+    version = data_version() or int(time.time() // VERSION_TTL)
+    keys = {name: _request_key(endpoint, params) for name, (endpoint, params) in calls.items()}
+    ctx = get_script_run_ctx()
+
+    def fetch(key):
+        # lets the cache run in the pool threads like in the script thread
+        add_script_run_ctx(threading.current_thread(), ctx)
+        try:
+            return cached_get(*key, version), None
+        except FetchError as e:
+            return None, str(e)
+
+    if len(keys) == 1:
+        outcomes = {name: fetch(key) for name, key in keys.items()}
+    else:
+        with ThreadPoolExecutor(min(len(keys), FETCH_WORKERS)) as pool:
+            futures = {name: pool.submit(fetch, key) for name, key in keys.items()}
+            outcomes = {name: future.result() for name, future in futures.items()}
+
+    results = {}
+    for name, (data, error) in outcomes.items():
+        if error:
+            st.error(error)
+        results[name] = data
+    return results
 
 
 def train_model():
     try:
-        resp = requests.post(f"{BACKEND}/models/pnbd/fit")
+        resp = http_session().post(f"{BACKEND}/models/pnbd/fit", timeout=600)
         if resp.status_code == 200:
+            # the model version changed, predictions are refetched
+            data_version.clear()
             return resp.json()
         else:
             st.error(f"Error training model: {resp.status_code}")
@@ -105,72 +194,76 @@ if "📊 Data Overview" in page:
     st.header("📊 Database Overview")
 
 
-    tables = ["customers", "products", "sales"]
+    # schema, estimated counts and sampled statistics come from the cached catalog, nothing is scanned in full
+    catalog = fetch_json("/preview/tables") or []
+    tables = [t["name"] for t in catalog]
     selected_table = st.selectbox("Select table to preview", tables)
 
-    data = fetch_json(f"/{selected_table}")
-    if data:
-        df = pd.DataFrame(data)
+    if selected_table:
+        schema = next(t for t in catalog if t["name"] == selected_table)
+        calls = {
+            "stats": (f"/preview/tables/{selected_table}/stats", None),
+            "page": (f"/preview/tables/{selected_table}", {"limit": 100}),
+        }
+        # aggregated server-side over the full table
+        if selected_table == "Sales":
+            # downsampled server-side, a few hundred points at any date range
+            calls["sales_series"] = ("/analytics/sales/series", {"max_points": 500, "value": "transactions"})
+            calls["product_revenue"] = ("/analytics/revenue/by_product", {"limit": 20})
+        results = fetch_many(calls)
+        stats, table_page = results["stats"], results["page"]
 
-        # Corrected metrics calculations
-        # Add an expander to show table information
         with st.expander("📋 Table Structure"):
             st.write("Columns in the table:")
-            for col in df.columns:
-                st.write(f"- {col} (type: {df[col].dtype})")
-
-            st.write("\nSample data:")
-            st.dataframe(df.head(2))
+            for col in schema["columns"]:
+                st.write(f"- {col['name']} (type: {col['type']})")
+            if schema["indexes"]:
+                st.write("\nIndexes:")
+                for index in schema["indexes"]:
+                    st.write(f"- {index['name']} ({', '.join(map(str, index['columns']))})")
 
         col1, col2, col3 = st.columns(3)
+        if stats:
+            # Column 1: Total Records
+            with col1:
+                st.metric("Total Records", f"{stats['row_count']:,}" if stats["row_count"] is not None else "n/a")
 
-        # Column 1: Total Records
-        with col1:
-            st.metric("Total Records", len(df))
+            # Column 2: Column count
+            with col2:
+                st.metric("Column Count", len(schema["columns"]))
 
-        # Column 2: Unique Values based on table type
-        with col2:
-            if selected_table == "customers":
-                id_col = next((col for col in df.columns if col.lower() in ['id', 'customer_id']), None)
-                if id_col:
-                    st.metric("Unique Customers", df[id_col].nunique())
-            elif selected_table == "products":
-                id_col = next((col for col in df.columns if col.lower() in ['id', 'product_id']), None)
-                if id_col:
-                    st.metric("Unique Products", df[id_col].nunique())
-            elif selected_table == "sales":
-                id_col = next((col for col in df.columns if col.lower() in ['id', 'sale_id', 'sales_id']), None)
-                if id_col:
-                    st.metric("Unique Sales", df[id_col].nunique())
-
-        # Column 3: Date Range or other metrics
-        with col3:
-            date_col = next((col for col in df.columns if col.lower() in ['date', 'created_at', 'timestamp']), None)
-            if date_col:
-                st.metric("Date Range", f"{df[date_col].min()} to {df[date_col].max()}")
-            elif selected_table == "products" and 'price' in df.columns:
-                st.metric("Average Price", f"${df['price'].mean():.2f}")
-            else:
-                st.metric("Column Count", len(df.columns))
+            # Column 3: Date Range or other metrics
+            with col3:
+                date_col = next((c for c in stats["columns"] if c["name"].lower() in ['date', 'created_at', 'timestamp']), None)
+                if date_col:
+                    st.metric("Date Range (sampled)", f"{str(date_col['min'])[:10]} to {str(date_col['max'])[:10]}")
+                else:
+                    st.metric("Sampled Rows", stats["sample_size"])
+
+            with st.expander("📈 Column Statistics (sampled)"):
+                st.dataframe(pd.DataFrame(stats["columns"]))
 
         # Display the data
-        st.dataframe(df)
+        if table_page:
+            st.dataframe(pd.DataFrame(table_page["rows"], columns=table_page["columns"]))
 
         # Additional visualizations based on table type
-        if selected_table == "sales":
+        if selected_table == "Sales":
+            sales_series, product_revenue = results["sales_series"], results["product_revenue"]
             col1, col2 = st.columns(2)
             with col1:
-                daily_sales = df.groupby('date').size().reset_index(name='count')
-                fig = px.line(daily_sales, x='date', y='count',
-                              title="Daily Sales Volume",
-                              template="plotly_white")
-                st.plotly_chart(fig, use_container_width=True)
+                if sales_series and sales_series["bucket"]:
+                    series_df = pd.DataFrame({k: sales_series[k] for k in ["bucket", "transactions", "revenue"]})
+                    fig = px.line(series_df, x='bucket', y='transactions',
+                                  title=f"Sales Volume per {sales_series['granularity'].capitalize()}",
+                                  labels={'bucket': 'date'},
+                                  template="plotly_white")
+                    st.plotly_chart(fig, use_container_width=True)
 
             with col2:
-                if 'qty' in df.columns and 'price' in df.columns:
-                    df['revenue'] = df['qty'] * df['price']
-                    fig = px.box(df, y='revenue',
-                                 title="Revenue Distribution",
+                if product_revenue:
+                    fig = px.bar(pd.DataFrame(product_revenue), x='name', y='revenue',
+                                 title="Revenue by Product (Top 20)",
                                  template="plotly_white")
                     st.plotly_chart(fig, use_container_width=True)
 elif "💰 Customer Lifetime Value" in page:
@@ -190,57 +283,68 @@ elif "💰 Customer Lifetime Value" in page:
     # Customer Analysis Section
     st.subheader("📈 Customer Analysis")
 
-    customers_data = fetch_json("/customers")
+    query = st.text_input("Search customers by ID or company name")
+    if query:
+        customers_data = fetch_json("/customers/search", params={"q": query, "limit": 50})
+    else:
+        customers_data = fetch_json("/customers")
     if customers_data:
-        customer_ids = [c["id"] for c in customers_data]
-        customer_id = st.selectbox("Select Customer ID", customer_ids)
+        labels = {c["id"]: f'{c["id"]} - {c["company_name"]}' for c in customers_data}
+        customer_id = st.selectbox("Select Customer ID", list(labels), format_func=labels.get)
 
         if customer_id:
             # Create tabs for different analyses
             tab1, tab2, tab3 = st.tabs(["📊 Summary", "💵 CLV Analysis", "🔮 Predictions"])
 
-            with tab1:
-                col1, col2 = st.columns(2)
-                with col1:
-                    summary = fetch_json(f"/models/pnbd/summary/{customer_id}")
-                    if summary:
-                        st.write("### Customer Metrics")
-                        metrics_df = pd.DataFrame([summary])
-                        fig = px.bar(metrics_df.melt(),
-                                     x='variable', y='value',
-                                     title="Customer RFM Metrics",
-                                     template="plotly_white")
-                        st.plotly_chart(fig, use_container_width=True)
-
-                with col2:
-                    prob = fetch_json(f"/models/pnbd/prob_alive/{customer_id}")
-                    if prob:
-                        fig = create_gauge_chart(
-                            prob['prob_alive'],
-                            "Probability Customer is Active"
-                        )
-                        st.plotly_chart(fig, use_container_width=True)
-
-            with tab2:
-                col1, col2 = st.columns(2)
-                with col1:
-                    time_horizon = st.slider("Time Horizon (days)", 30, 365, 90)
-                    clv_data = fetch_json(f"/models/pnbd/clv/{customer_id}",
-                                          params={"time": time_horizon})
-                    if clv_data:
-                        st.metric("Predicted CLV",
-                                  f"${clv_data['clv']:,.2f}",
-                                  delta=f"{time_horizon} days")
-
-                with col2:
-                    avg_value = fetch_json(f"/models/pnbd/avg_value/{customer_id}")
-                    if avg_value:
-                        st.metric("Expected Transaction Value",
-                                  f"${avg_value['expected_avg_value']:,.2f}")
+            summary_col, prob_col = tab1.columns(2)
+            clv_col, avg_col = tab2.columns(2)
+            with clv_col:
+                time_horizon = st.slider("Time Horizon (days)", 30, 365, 90)
+
+            # the predictions of one customer are independent, fetched at once
+            results = fetch_many({
+                "summary": (f"/models/pnbd/summary/{customer_id}", None),
+                "prob": (f"/models/pnbd/prob_alive/{customer_id}", None),
+                "clv": (f"/models/pnbd/clv/{customer_id}", {"time": time_horizon}),
+                "avg_value": (f"/models/pnbd/avg_value/{customer_id}", None),
+                "cumulative": (f"/models/pnbd/cumulative/{customer_id}", {"periods": time_horizon}),
+            })
+
+            with summary_col:
+                summary = results["summary"]
+                if summary:
+                    st.write("### Customer Metrics")
+                    metrics_df = pd.DataFrame([summary])
+                    fig = px.bar(metrics_df.melt(),
+                                 x='variable', y='value',
+                                 title="Customer RFM Metrics",
+                                 template="plotly_white")
+                    st.plotly_chart(fig, use_container_width=True)
+
+            with prob_col:
+                prob = results["prob"]
+                if prob:
+                    fig = create_gauge_chart(
+                        prob['prob_alive'],
+                        "Probability Customer is Active"
+                    )
+                    st.plotly_chart(fig, use_container_width=True)
+
+            with clv_col:
+                clv_data = results["clv"]
+                if clv_data:
+                    st.metric("Predicted CLV",
+                              f"${clv_data['clv']:,.2f}",
+                              delta=f"{time_horizon} days")
+
+            with avg_col:
+                avg_value = results["avg_value"]
+                if avg_value:
+                    st.metric("Expected Transaction Value",
+                              f"${avg_value['expected_avg_value']:,.2f}")
 
             with tab3:
-                cumulative = fetch_json(f"/models/pnbd/cumulative/{customer_id}",
-                                        params={"periods": time_horizon})
+                cumulative = results["cumulative"]
                 if cumulative:
                     fig = go.Figure()
                     fig.add_trace(go.Scatter(
@@ -267,67 +371,13 @@ elif page == "👥 Customer Analysis":
     # Create tabs for different types of analysis
     tab1, tab2, tab3 = st.tabs(["📈 Segment Analysis", "🎯 RFM Details", "🔮 Predictive Insights"])
 
-    customers_data = fetch_json("/customers")
-    sales_data = fetch_json("/sales")
-    products_data = fetch_json("/products")
-
-    if customers_data and sales_data and products_data:
-        df_customers = pd.DataFrame(customers_data)
-        df_sales = pd.DataFrame(sales_data)
-        df_products = pd.DataFrame(products_data)
-
-        # Prepare data
-        df_sales['date'] = pd.to_datetime(df_sales['date'])
-        today = df_sales['date'].max()
-
-        # Calculate RFM metrics
-        customer_metrics = df_sales.groupby('customer_id').agg({
-            'date': lambda x: (today - x.max()).days,  # Recency
-            'id': 'count',  # Frequency
-            'qty': 'sum'  # Quantity
-        }).reset_index()
-
-        # Calculate monetary value
-        sales_value = df_sales.merge(df_products[['product_id', 'price']],
-                                     left_on='product_id',
-                                     right_on='product_id')
-        sales_value['Value'] = sales_value['qty'] * sales_value['price']
-        monetary = sales_value.groupby('customer_id')['Value'].sum().reset_index()
-
-        # Combine metrics
-        rfm_df = customer_metrics.merge(monetary, on='customer_id')
-        rfm_df.columns = ['customer_id', 'recency', 'frequency', 'quantity', 'monetary']
-
-        # Calculate RFM scores
-        rfm = pd.DataFrame()
-        rfm['customer_id'] = rfm_df['customer_id']
-        rfm["recency_score"] = pd.qcut(rfm_df['recency'], 5, labels=[5, 4, 3, 2, 1])
-        rfm["frequency_score"] = pd.qcut(rfm_df["frequency"].rank(method="first"), 5, labels=[1, 2, 3, 4, 5])
-        rfm["monetary_score"] = pd.qcut(rfm_df["monetary"], 5, labels=[1, 2, 3, 4, 5])
-
-        # Calculate RFM_SCORE
-        rfm["RFM_SCORE"] = (rfm["recency_score"].astype(str) +
-                            rfm["frequency_score"].astype(str))
-
-        # Segment mapping
-        seg_map = {
-            r'[1-2][1-2]': 'HIBERNATING',
-            r'[1-2][3-4]': 'AT RISK',
-            r'[1-2]5': 'CANT LOSE',
-            r'3[1-2]': 'ABOUT TO SLEEP',
-            r'33': 'NEED ATTENTION',
-            r'[3-4][4-5]': 'LOYAL CUSTOMER',
-            r'41': 'PROMISING',
-            r'51': 'NEW CUSTOMERS',
-            r'[4-5][2-3]': 'POTENTIAL LOYALIST',
-            r'5[4-5]': 'CHAMPIONS'
-        }
-
-        # Create segments
-        rfm['Customer_Segment'] = rfm['RFM_SCORE'].replace(seg_map, regex=True)
+    # RFM scores and segments of all customers, computed and cached server-side
+    rfm_data = fetch_json("/analytics/rfm/segments")
 
-        # Merge with original metrics for analysis
-        analysis_df = rfm.merge(rfm_df, on='customer_id')
+    if rfm_data and rfm_data["total_customers"]:
+        analysis_df = pd.DataFrame(rfm_data["customers"]).rename(columns={"segment": "Customer_Segment"})
+        segment_metrics = pd.DataFrame(rfm_data["segments"]).round(2)
+        segment_metrics.columns = ['Segment', 'Count', 'Avg Recency', 'Avg Frequency', 'Avg Value']
 
         # Display KPI metrics at the top
         st.subheader("📊 Customer Segments Overview")
@@ -346,9 +396,8 @@ elif page == "👥 Customer Analysis":
 
             with col1:
                 # Customer Segments Distribution
-                segment_dist = rfm['Customer_Segment'].value_counts()
-                fig = px.pie(values=segment_dist.values,
-                             names=segment_dist.index,
+                fig = px.pie(values=segment_metrics['Count'],
+                             names=segment_metrics['Segment'],
                              title="Customer Segments Distribution",
                              template="plotly_white",
                              color_discrete_sequence=px.colors.qualitative.Set3)
@@ -356,13 +405,11 @@ elif page == "👥 Customer Analysis":
 
             with col2:
                 # Average Monetary Value by Segment
-                avg_monetary = analysis_df.groupby('Customer_Segment')['monetary'].mean().reset_index()
-                fig = px.bar(avg_monetary,
-                             x='Customer_Segment',
-                             y='monetary',
+                fig = px.bar(segment_metrics,
+                             x='Segment',
+                             y='Avg Value',
                              title="Average Customer Value by Segment",
-                             labels={'monetary': 'Average Value ($)',
-                                     'Customer_Segment': 'Segment'},
+                             labels={'Avg Value': 'Average Value ($)'},
                              template="plotly_white")
                 st.plotly_chart(fig, use_container_width=True)
 
@@ -386,16 +433,6 @@ elif page == "👥 Customer Analysis":
 
             with col2:
                 # Segment Metrics Table
-                segment_metrics = analysis_df.groupby('Customer_Segment').agg({
-                    'customer_id': 'count',
-                    'recency': 'mean',
-                    'frequency': 'mean',
-                    'monetary': 'mean'
-                }).round(2).reset_index()
-
-                segment_metrics.columns = ['Segment', 'Count', 'Avg Recency', 'Avg Frequency', 'Avg Value']
-                segment_metrics = segment_metrics.sort_values('Count', ascending=False)
-
                 fig = go.Figure(data=[go.Table(
                     header=dict(values=list(segment_metrics.columns),
                                 fill_color='paleturquoise',
@@ -567,8 +604,8 @@ def check_model_status():
 
     try:
         # Check if data is available
-        customers = fetch_json("/customers")
-        sales = fetch_json("/sales")
+        data = fetch_many({"customers": ("/customers", None), "sales": ("/sales", None)})
+        customers, sales = data["customers"], data["sales"]
 
         if customers:
             status["data_available"] = True
@@ -1,10 +1,25 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-from src.config.env_vars import DATABASE_URL
+from src.query_audit import install_query_audit
+from src.config.env_vars import DATABASE_URL, DERIVED_DATABASE_PATH
+
+# schema of the tables derived from the data (rollups, sketches)
+DERIVED_SCHEMA = "derived"
 
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# statement counts, N+1 fingerprints and slow queries for whoever opens an audit
+install_query_audit(engine)
+
+
+@event.listens_for(engine, "connect")
+def _attach_derived(dbapi_connection, connection_record):
+    # derived tables live in their own file: refreshing them leaves PRAGMA data_version of the
+    # data file, and with it every cache keyed on the data fingerprint, untouched
+    dbapi_connection.execute(f"ATTACH DATABASE ? AS {DERIVED_SCHEMA}", (DERIVED_DATABASE_PATH,))
+
+
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 Base = declarative_base()
 
@@ -0,0 +1,178 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*\?\s*,)*\s*\?\s*\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """
+    Raised in ``raise`` mode when a request repeats a statement too often or runs a slow one
+    """
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(statement: str) -> str:
+    """
+    Normalize a statement so that queries differing only in literals or IN list lengths match
+
+    Parameters
+    ----------
+    statement : str
+        SQL as sent to the driver
+
+    Returns
+    -------
+    fingerprint : str
+        statement with literals replaced by ``?`` and IN lists collapsed
+    """
+    normalized = _NUMBER.sub("?", _STRING.sub("?", statement))
+    normalized = _IN_LIST.sub("IN (...)", normalized)
+    return _SPACE.sub(" ", normalized).strip()
+
+
+@dataclass
+class QueryAudit:
+    """
+    Statements seen while an audit is active
+    """
+
+    max_repeats: Optional[int] = None
+    slow_seconds: Optional[float] = None
+    raise_on_violation: bool = False
+    statements: int = 0
+    total_seconds: float = 0.0
+    repeats: Counter = field(default_factory=Counter)
+    slow: List[Tuple[str, float]] = field(default_factory=list)
+    violations: List[str] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, statement: str, seconds: float):
+        key = fingerprint(statement)
+        with self._lock:
+            self.statements += 1
+            self.total_seconds += seconds
+            self.repeats[key] += 1
+            count = self.repeats[key]
+            violation = None
+            if self.max_repeats is not None and count == self.max_repeats + 1:
+                violation = f"statement repeated more than {self.max_repeats} times, likely N+1: {key[:200]}"
+            if self.slow_seconds is not None and seconds > self.slow_seconds:
+                self.slow.append((key, seconds))
+                violation = f"statement took {seconds * 1000:.0f} ms: {key[:200]}"
+            if violation:
+                self.violations.append(violation)
+        if violation and self.raise_on_violation:
+            raise QueryBudgetExceeded(violation)
+
+    def most_repeated(self, n: int = 5) -> List[Tuple[str, int]]:
+        return self.repeats.most_common(n)
+
+
+# audit of the request being served, copied into the threads running its endpoint
+_current_audit: ContextVar[Optional[QueryAudit]] = ContextVar("current_audit", default=None)
+# audits that see every statement whatever thread runs it, for tests driving the app through a client
+_global_audits: List[QueryAudit] = []
+
+
+@contextmanager
+def audit_queries(max_repeats: Optional[int] = None, slow_seconds: Optional[float] = None,
+                  raise_on_violation: bool = False, everywhere: bool = False):
+    """
+    Record the statements executed inside the ``with`` block
+
+    Parameters
+    ----------
+    max_repeats : int, optional
+        flag a fingerprint executed more than this many times
+    slow_seconds : float, optional
+        flag statements slower than this
+    raise_on_violation : bool
+        raise QueryBudgetExceeded from the offending statement instead of only recording it
+    everywhere : bool
+        record statements from every thread, not only from this context, e.g. for an app
+        served by a test client on another thread
+
+    Yields
+    ------
+    audit : QueryAudit
+        statement counts, repeated fingerprints and slow statements
+    """
+    audit = QueryAudit(max_repeats, slow_seconds, raise_on_violation)
+    if everywhere:
+        _global_audits.append(audit)
+        try:
+            yield audit
+        finally:
+            _global_audits.remove(audit)
+    else:
+        token = _current_audit.set(audit)
+        try:
+            yield audit
+        finally:
+            _current_audit.reset(token)
+
+
+def install_query_audit(engine):
+    """
+    Feed every statement executed through ``engine`` to the active audits, if any
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and (_global_audits or _current_audit.get() is not None):
+            context._audit_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_audit_start", None)
+        if start is None:
+            return
+        seconds = time.perf_counter() - start
+        audit = _current_audit.get()
+        for target in ([audit] if audit is not None else []) + list(_global_audits):
+            target.record(statement, seconds)
+
+
+class QueryAuditMiddleware:
+    """
+    Audit the statements of every request, logging or raising on likely N+1 patterns and slow queries
+
+    Parameters
+    ----------
+    max_repeats : int
+        near-identical statements allowed per request
+    slow_ms : float
+        latency above which a statement is reported
+    raise_on_violation : bool
+        fail the request with QueryBudgetExceeded instead of logging, for tests and staging
+    """
+
+    def __init__(self, app, max_repeats: int, slow_ms: float, raise_on_violation: bool = False):
+        self.app = app
+        self.max_repeats = max_repeats
+        self.slow_seconds = slow_ms / 1000
+        self.raise_on_violation = raise_on_violation
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with audit_queries(self.max_repeats, self.slow_seconds, self.raise_on_violation) as audit:
+            await self.app(scope, receive, send)
+        for violation in audit.violations:
+            logger.warning("%s %s: %s", scope["method"], scope["path"], violation)
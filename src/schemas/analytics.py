@@ -0,0 +1,87 @@
+from datetime import date
+from typing import List, Optional, Union
+
+from pydantic import BaseModel
+
+
+class DailySales(BaseModel):
+    date: List[date]
+    transactions: List[int]
+    qty: List[int]
+    revenue: List[float]
+
+
+class SalesTimeseries(BaseModel):
+    granularity: str
+    group_by: Optional[str]
+    bucket: List[date]
+    group: Optional[List[Union[int, str, None]]] = None
+    transactions: List[int]
+    qty: List[int]
+    revenue: List[float]
+
+
+class SalesSeries(BaseModel):
+    granularity: str
+    total_buckets: int
+    bucket: List[date]
+    transactions: List[int]
+    qty: List[int]
+    revenue: List[float]
+
+
+class ProductRevenue(BaseModel):
+    product_id: List[int]
+    name: List[str]
+    transactions: List[int]
+    qty: List[int]
+    revenue: List[float]
+
+
+class CustomerRevenue(BaseModel):
+    customer_id: List[str]
+    transactions: List[int]
+    qty: List[int]
+    revenue: List[float]
+    first_date: List[date]
+    last_date: List[date]
+
+
+class SegmentMetrics(BaseModel):
+    segment: str
+    count: int
+    avg_recency: float
+    avg_frequency: float
+    avg_monetary: float
+
+
+class CustomerSegments(BaseModel):
+    customer_id: List[str]
+    recency: List[int]
+    frequency: List[int]
+    monetary: List[float]
+    recency_score: List[int]
+    frequency_score: List[int]
+    monetary_score: List[int]
+    segment: List[str]
+
+
+class QuintileEdges(BaseModel):
+    recency: List[float]
+    monetary: List[float]
+    approximate: bool
+    rank_error: float
+
+
+class RFMThresholds(QuintileEdges):
+    as_of: Optional[date]
+    customers: int
+
+
+class RFMSegments(BaseModel):
+    data_version: str
+    as_of: Optional[date]
+    total_customers: int
+    thresholds: QuintileEdges
+    segments: List[SegmentMetrics]
+    customers: Optional[CustomerSegments] = None
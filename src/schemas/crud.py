@@ -1,7 +1,10 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+# ids accepted by one batch lookup
+MAX_BATCH_IDS = 5000
 
 
 class CustomerRead(BaseModel):
@@ -37,3 +40,43 @@ class SaleRead(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class SalesBatchResult(BaseModel):
+    inserted: int
+    first_sale_id: int
+    last_sale_id: int
+    data_version: str
+
+
+class CustomerIds(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_IDS)
+
+
+class ProductIds(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_IDS)
+
+
+class SaleIds(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_IDS)
+
+
+class CustomerMatch(BaseModel):
+    id: str
+    company_name: str
+    match: Literal["id", "name", "word"]
+
+
+class CustomerBatch(BaseModel):
+    items: List[CustomerRead]
+    missing: List[str]
+
+
+class ProductBatch(BaseModel):
+    items: List[ProductRead]
+    missing: List[int]
+
+
+class SaleBatch(BaseModel):
+    items: List[SaleRead]
+    missing: List[int]
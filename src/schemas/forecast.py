@@ -0,0 +1,19 @@
+from datetime import date
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class SalesForecast(BaseModel):
+    data_version: str
+    group_by: str
+    metric: str
+    method: str
+    history_start: date
+    as_of: date
+    total_series: int
+    dates: List[date]
+    series_id: List[int]
+    history_total: List[float]
+    rmse: List[Optional[float]]
+    forecast: List[List[float]]
@@ -0,0 +1,12 @@
+from datetime import date
+
+from pydantic import BaseModel, ConfigDict
+
+
+class DataVersion(BaseModel):
+    # model_version is a field, not pydantic API
+    model_config = ConfigDict(protected_namespaces=())
+
+    data_version: str
+    model_version: int
+    date: date
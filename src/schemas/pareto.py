@@ -1,6 +1,7 @@
-from typing import Dict, List
+from datetime import datetime
+from typing import Dict, List, Literal, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 
 class ModelParams(BaseModel):
@@ -41,3 +42,26 @@ class CustomerLifetimeValue(BaseModel):
     customer_id: str
     time: int
     clv: float
+
+
+class SchedulerStatus(BaseModel):
+    # model_version is a field, not pydantic API
+    model_config = ConfigDict(protected_namespaces=())
+
+    state: Literal["stopped", "idle", "refreshing", "fitting"]
+    rows: Optional[int]
+    rows_at_last_fit: Optional[int]
+    model_version: int
+    first_change_at: Optional[datetime]
+    last_change_at: Optional[datetime]
+    last_refresh_at: Optional[datetime]
+    last_refit_at: Optional[datetime]
+    last_fit_at: Optional[datetime]
+    last_skip_reason: Optional[str]
+    last_error: Optional[str]
+    next_run_at: Optional[datetime]
+    poll_interval: float
+    debounce: float
+    max_delay: float
+    refit_interval: float
+    min_change: float
@@ -0,0 +1,47 @@
+from typing import Any, List, Optional
+
+from pydantic import BaseModel
+
+
+class ColumnSchema(BaseModel):
+    name: str
+    type: str
+    not_null: bool
+    default: Optional[str]
+    primary_key: int
+
+
+class IndexSchema(BaseModel):
+    name: str
+    unique: bool
+    origin: str
+    columns: List[Optional[str]]
+
+
+class TableSchema(BaseModel):
+    name: str
+    columns: List[ColumnSchema]
+    indexes: List[IndexSchema]
+    has_rowid: bool
+
+
+class TablePreview(BaseModel):
+    table: str
+    columns: List[str]
+    rows: List[List[Any]]
+
+
+class ColumnStats(BaseModel):
+    name: str
+    null_fraction: Optional[float]
+    distinct_in_sample: int
+    min: Any
+    max: Any
+
+
+class TableStats(BaseModel):
+    table: str
+    row_count: Optional[int]
+    row_count_source: str
+    sample_size: int
+    columns: List[ColumnStats]
@@ -0,0 +1,55 @@
+"""
+Fixtures of the test suite.
+
+The app reads ``DB_URL`` when ``src`` is first imported, so a fresh
+synthetic database is written here, before any test module is collected.
+Tests may change its data; they run against a copy nobody else uses.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+from sqlalchemy import text
+
+from benchmarks.synthetic import generate
+
+TEST_SALES = 3_000
+
+if "src.config.env_vars" in sys.modules:
+    raise pytest.UsageError("the app was imported with another database, run tests and benchmarks separately")
+
+_directory = tempfile.mkdtemp(prefix="davit-capstone-tests-")
+os.environ["DB_URL"] = os.path.join(_directory, "test.db")
+generate(os.environ["DB_URL"], TEST_SALES, n_products=50, days=120)
+# model calls run in the app's threadpool, so their statements count towards query budgets
+os.environ["MODEL_WORKERS"] = "0"
+
+
+@pytest.fixture(scope="session")
+def db():
+    from src.database import SessionLocal
+
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    from src.app.main import app
+
+    # without the lifespan, so nothing is refreshed in the background
+    return TestClient(app)
+
+
+@pytest.fixture(scope="session")
+def fitted_models(client):
+    client.post("/models/pnbd/fit").raise_for_status()
+
+
+@pytest.fixture(scope="session")
+def customer_id(db):
+    return db.execute(text("SELECT CustomerId FROM Sales GROUP BY 1 ORDER BY count(*) DESC, 1 LIMIT 1")).scalar()
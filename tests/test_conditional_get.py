@@ -0,0 +1,39 @@
+from sqlalchemy import text
+
+from src.app import middlewares
+from src.app.data_version import DataVersionWatcher
+from src.config.env_vars import ENV_VARS
+
+
+def test_matching_etag_is_answered_with_304(client):
+    response = client.get("/products", params={"limit": 5})
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = client.get("/products", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+
+def test_etag_changes_with_the_data(client, db):
+    etag = client.get("/products", params={"limit": 5}).headers["ETag"]
+    db.execute(text(
+        "INSERT INTO Sales (SaleId, Date, CustomerId, ProductId, Qty) "
+        "SELECT max(SaleId) + 1, '2025-06-30 15:00:00.000000', 'C0000001', 1, 1 FROM Sales"
+    ))
+    db.commit()
+    response = client.get("/products", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_etag_is_the_same_in_another_worker(client, monkeypatch):
+    etag = client.get("/products", params={"limit": 5}).headers["ETag"]
+    # another worker process has its own watcher, with another epoch and data_version
+    watcher = DataVersionWatcher(ENV_VARS.DB_URL)
+    monkeypatch.setattr(middlewares, "data_version_watcher", watcher)
+    try:
+        response = client.get("/products", params={"limit": 5}, headers={"If-None-Match": etag})
+    finally:
+        watcher.close()
+    assert response.status_code == 304
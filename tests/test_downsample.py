@@ -0,0 +1,46 @@
+import re
+
+import numpy as np
+import pytest
+
+from src.app.downsample import lttb
+
+# a statement reading the Sales table, as SQLAlchemy or by hand
+SALES = re.compile(r'\bFROM "?Sales"?(?![\w.])')
+
+
+@pytest.mark.parametrize("n, n_out", [(1000, 3), (1000, 50), (1001, 999), (10, 5)])
+def test_lttb_keeps_endpoints_and_size(n, n_out):
+    rng = np.random.default_rng(0)
+    x = np.arange(n)
+    kept = lttb(x, rng.normal(size=n), n_out)
+    assert len(kept) == n_out
+    assert kept[0] == 0 and kept[-1] == n - 1
+    assert (np.diff(kept) > 0).all()
+
+
+def test_lttb_keeps_everything_when_short():
+    np.testing.assert_array_equal(lttb(np.arange(20), np.ones(20), 20), np.arange(20))
+
+
+def test_lttb_keeps_peaks():
+    y = np.zeros(1000)
+    y[[137, 512, 901]] = [50, -40, 30]
+    kept = lttb(np.arange(1000), y, 20)
+    assert {137, 512, 901} <= set(kept.tolist())
+
+
+@pytest.mark.parametrize("max_points", [3, 10, 40])
+def test_sales_series_respects_max_points(client, max_points):
+    series = client.get("/analytics/sales/series", params={"max_points": max_points}).json()
+    assert 0 < len(series["bucket"]) <= max_points
+    assert series["total_buckets"] >= len(series["bucket"])
+    assert series["bucket"] == sorted(series["bucket"])
+
+
+def test_series_range_is_read_from_the_rollups(client, query_budget):
+    client.get("/analytics/sales/series", params={"max_points": 10}).raise_for_status()
+    with query_budget() as audit:
+        client.get("/analytics/sales/series", params={"max_points": 10}).raise_for_status()
+    assert not [statement for statement in audit.repeats if SALES.search(statement)]
+
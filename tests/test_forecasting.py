@@ -0,0 +1,74 @@
+import re
+
+import numpy as np
+import pytest
+
+from src.app.forecasting import SEASON, fit_ets, sales_matrix, seasonal_mean
+from src.app.rollups import rollup_store
+
+# a statement reading the Sales table, as SQLAlchemy or by hand
+SALES = re.compile(r'\bFROM "?Sales"?(?![\w.])')
+
+WEEK = np.array([5.0, 8, 8, 9, 12, 20, 3])
+
+
+def weekly(days, level=10.0, noise=0.0, seed=0):
+    rng = np.random.default_rng(seed)
+    return level + np.tile(WEEK - WEEK.mean(), days // SEASON + 1)[:days] + rng.normal(0, noise, days)
+
+
+def test_ets_recovers_a_seasonal_pattern():
+    values = weekly(140)[None, :]
+    forecast, rmse = fit_ets(values, 14)
+    assert forecast.shape == (1, 14)
+    # the forecast continues the weekdays after the last day
+    np.testing.assert_allclose(forecast[0], weekly(154)[140:], atol=1e-6)
+    assert rmse[0] == pytest.approx(0, abs=1e-6)
+
+
+def test_ets_follows_a_level_shift():
+    values = weekly(140)
+    values[100:] += 30
+    forecast, _ = fit_ets(values[None, :], 7)
+    assert forecast.mean() == pytest.approx(values[-7:].mean(), rel=0.05)
+
+
+def test_ets_fits_series_independently():
+    values = np.stack([weekly(90, level, noise=2, seed=seed) for seed, level in enumerate((5, 20, 50))])
+    together, rmse = fit_ets(values, 10)
+    for i in range(len(values)):
+        alone, alone_rmse = fit_ets(values[i:i + 1], 10)
+        np.testing.assert_allclose(together[i], alone[0])
+        assert rmse[i] == pytest.approx(alone_rmse[0])
+
+
+def test_ets_forecasts_are_not_negative():
+    values = np.maximum(weekly(60, level=1, noise=3), 0)[None, :]
+    values[0, -14:] = 0
+    forecast, _ = fit_ets(values, 28)
+    assert (forecast >= 0).all()
+
+
+def test_seasonal_mean_repeats_the_weekday_profile():
+    values = np.stack([weekly(56), weekly(56, level=30)])
+    forecast, rmse = seasonal_mean(values, 10)
+    np.testing.assert_allclose(forecast, np.stack([weekly(66)[56:], weekly(66, level=30)[56:]]))
+    np.testing.assert_allclose(rmse, 0, atol=1e-9)
+
+
+@pytest.mark.parametrize("method", ["ets", "seasonal_mean"])
+def test_forecast_route(client, method):
+    response = client.get("/forecast/sales", params={"method": method, "horizon": 7, "history_days": 60, "limit": 5})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert len(body["dates"]) == 7
+    assert len(body["series_id"]) == len(body["forecast"]) == 5
+    assert all(len(row) == 7 and min(row) >= 0 for row in body["forecast"])
+
+
+def test_forecast_window_is_read_from_the_rollups(db, query_budget):
+    rollup_store.refresh(db)
+    with query_budget() as audit:
+        matrix = sales_matrix(db, "product_id", "qty", 30)
+    assert matrix.values.shape[1] == 30
+    assert not [statement for statement in audit.repeats if SALES.search(statement)]
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+from sqlalchemy import text
+
+NDJSON = {"content-type": "application/x-ndjson"}
+
+
+def sales_count(db):
+    return db.execute(text("SELECT count(*) FROM Sales")).scalar()
+
+
+def post_rows(client, rows):
+    return client.post("/sales/batch", content="\n".join(json.dumps(row) for row in rows), headers=NDJSON)
+
+
+@pytest.fixture
+def valid_row(customer_id):
+    return {"date": "2025-06-30T10:00:00", "customer_id": customer_id, "product_id": 1, "qty": 2}
+
+
+@pytest.mark.parametrize("change, error", [
+    ({"qty": 0}, "qty must be positive"),
+    ({"qty": 1.5}, "qty is not an integer"),
+    ({"date": "yesterday"}, "date is not an ISO 8601 datetime"),
+    ({"customer_id": "C-missing"}, "unknown customer_id"),
+    ({"product_id": 10_000}, "unknown product_id"),
+    ({"product_id": None}, "product_id is required"),
+])
+def test_invalid_rows_reject_the_whole_batch(client, db, valid_row, change, error):
+    before = sales_count(db)
+    response = post_rows(client, [valid_row, {**valid_row, **change}])
+    assert response.status_code == 422
+    detail = response.json()["detail"]
+    assert detail["error_count"] == 1
+    assert detail["errors"] == [{"row": 1, "error": error}]
+    assert sales_count(db) == before
+
+
+@pytest.mark.parametrize("body, content_type", [
+    ("{not json", "application/json"),
+    (json.dumps({"date": ["2025-06-30"], "qty": [1, 2]}), "application/json"),
+    (json.dumps({"date": "2025-06-30", "customer_id": "C0000001", "product_id": 1}), "application/x-ndjson"),
+    (json.dumps({"date": "2025-06-30", "customer_id": "C0000001", "product_id": 1, "qty": 1, "price": 2}),
+     "application/x-ndjson"),
+])
+def test_malformed_batches_are_rejected(client, db, body, content_type):
+    before = sales_count(db)
+    response = client.post("/sales/batch", content=body, headers={"content-type": content_type})
+    assert response.status_code == 422
+    assert sales_count(db) == before
+
+
+def test_valid_batch_is_inserted(client, db, valid_row):
+    before = sales_count(db)
+    response = post_rows(client, [valid_row, {**valid_row, "qty": 5}])
+    assert response.status_code == 200, response.text
+    assert response.json()["inserted"] == 2
+    assert sales_count(db) == before + 2
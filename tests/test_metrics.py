@@ -0,0 +1,28 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.app.metrics import Counter, Histogram
+
+
+def test_shards_of_exited_threads_are_folded_into_the_totals():
+    counter = Counter("test_total", "test", ["route"])
+    histogram = Histogram("test_seconds", "test", ["route"], buckets=(0.1, 1.0))
+
+    def work():
+        counter.inc("/a")
+        histogram.observe(0.5, "/a")
+
+    for _ in range(50):
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+    with ThreadPoolExecutor(4) as executor:
+        for _ in range(50):
+            executor.submit(work)
+    work()
+
+    # only the shard of this thread is left
+    assert len(counter._shards) == len(histogram._shards) == 1
+    assert counter.values() == {("/a",): 101}
+    assert 'test_seconds_bucket{route="/a",le="1.0"} 101' in list(histogram.samples())
+    assert 'test_seconds_sum{route="/a"} 50.5' in list(histogram.samples())
@@ -0,0 +1,50 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from src.app.model_pool import ModelExecutor, ModelExecutorBusy
+from src.app.routers import pareto
+
+
+def test_calls_beyond_max_pending_are_turned_away():
+    executor = ModelExecutor(workers=0, max_pending=2)
+
+    async def run():
+        await executor.run("slow", time.sleep, 0.05)
+        slow = [asyncio.create_task(executor.run("slow", time.sleep, 0.3)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert executor.pending == 2
+        with pytest.raises(ModelExecutorBusy) as busy:
+            await executor.run("slow", time.sleep, 0)
+        await asyncio.gather(*slow)
+        return busy.value
+
+    busy = asyncio.run(run())
+    assert busy.status_code == 503
+    assert busy.retry_after >= 1
+    assert executor.pending == 0
+
+
+def test_saturated_model_routes_answer_503_with_retry_after(client, customer_id, monkeypatch):
+    monkeypatch.setattr(pareto.model_executor, "pending", pareto.model_executor.max_pending)
+    response = client.get(f"/models/pnbd/prob_alive/{customer_id}")
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_pool_is_restarted_after_a_worker_dies():
+    executor = ModelExecutor(workers=1, max_pending=4)
+
+    async def run():
+        with pytest.raises(ModelExecutorBusy) as died:
+            await executor.run("crash", os._exit, 1)
+        assert (died.value.status_code, died.value.retry_after) == (503, 1)
+        # the next call gets a new pool
+        return await executor.run("ok", abs, -3)
+
+    try:
+        assert asyncio.run(run()) == 3
+    finally:
+        executor.shutdown()
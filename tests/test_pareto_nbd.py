@@ -0,0 +1,32 @@
+from datetime import datetime
+
+import pytest
+from lifetimes import GammaGammaFitter
+from lifetimes.utils import summary_data_from_transaction_data
+
+from src.app.pareto_nbd import PNBDEngine
+from src.app.snapshot import transaction_snapshot
+
+
+@pytest.fixture(scope="module")
+def summary(db):
+    return summary_data_from_transaction_data(transaction_snapshot.load(db), customer_id_col="customer_id",
+                                              datetime_col="date", monetary_value_col="amount",
+                                              observation_period_end=datetime.now())
+
+
+def test_gamma_gamma_is_fitted_on_returning_customers(db, summary):
+    engine = PNBDEngine()
+    engine.fit(db)
+
+    one_time = summary[summary["frequency"] == 0]
+    returning = summary[summary["frequency"] > 0]
+    # one-time buyers have a zero monetary value, which the Gamma-Gamma model rejects
+    assert len(one_time) and len(returning)
+    expected = GammaGammaFitter(penalizer_coef=0.5).fit(returning["frequency"], returning["monetary_value"])
+    assert engine.gg.params_.to_dict() == pytest.approx(expected.params_.to_dict(), rel=1e-4)
+
+    # one-time buyers are valued at the mean spend of the fitted population
+    p, q, v = engine.gg.params_[["p", "q", "v"]]
+    average = engine.expected_average_value(db, str(one_time.index[0]))
+    assert average == pytest.approx(p * v / (q - 1))
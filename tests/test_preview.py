@@ -0,0 +1,42 @@
+from sqlalchemy import text
+
+
+def test_preview_defaults_to_the_first_table_created(client, db):
+    first = db.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY rowid LIMIT 1"
+    )).scalar()
+    response = client.get("/preview")
+    assert response.status_code == 200
+    assert response.json()["table"] == first
+
+
+def test_catalog_leaves_out_derived_tables(client, db):
+    # derived tables written to the main database before they moved to their own file
+    db.execute(text("CREATE TABLE main.RFMSketches (Metric TEXT PRIMARY KEY, Sketch BLOB)"))
+    db.execute(text("CREATE TABLE main.SalesRollupDay (Day TEXT)"))
+    db.commit()
+    try:
+        names = {table["name"] for table in client.get("/preview/tables").json()}
+        assert {"Sales", "Products", "Customers"} <= names
+        assert not names & {"RFMSketches", "RFMCustomerSummary", "SalesRollupDay", "SalesRollupState"}
+        assert client.get("/preview/tables/RFMSketches").status_code == 404
+    finally:
+        db.execute(text("DROP TABLE main.RFMSketches"))
+        db.execute(text("DROP TABLE main.SalesRollupDay"))
+        db.commit()
+
+
+def test_binary_columns_are_returned_as_hex(client, db):
+    db.execute(text("CREATE TABLE PreviewBlobs (Id INTEGER PRIMARY KEY, Data BLOB)"))
+    db.execute(text("INSERT INTO PreviewBlobs (Data) VALUES (:data)"), {"data": b"\x00\xffsketch"})
+    db.commit()
+    try:
+        page = client.get("/preview/tables/PreviewBlobs")
+        assert page.status_code == 200
+        assert page.json()["rows"] == [[1, "00ff736b65746368"]]
+        stats = client.get("/preview/tables/PreviewBlobs/stats")
+        assert stats.status_code == 200
+        assert stats.json()["columns"][1]["min"] == "00ff736b65746368"
+    finally:
+        db.execute(text("DROP TABLE PreviewBlobs"))
+        db.commit()
@@ -0,0 +1,38 @@
+"""
+Statements per request, checked after a first request has built any derived state the route uses.
+"""
+import pytest
+
+ROUTES = [
+    ("/customers/", {"limit": 100}, 1),
+    ("/customers/search", {"q": "a"}, 1),
+    ("/sales/", {"limit": 100}, 1),
+    ("/sales/1", {}, 1),
+    ("/analytics/sales/daily", {}, 2),
+    ("/analytics/sales/timeseries", {"granularity": "week", "group_by": "business_unit"}, 2),
+    ("/analytics/sales/series", {"max_points": 20}, 3),
+    ("/analytics/revenue/by_product", {}, 3),
+    ("/analytics/revenue/by_customer", {}, 2),
+    ("/analytics/rfm/segments", {}, 3),
+    ("/analytics/rfm/thresholds", {}, 2),
+]
+MODEL_ROUTES = ["summary", "prob_alive", "conditional", "cumulative", "avg_value", "clv"]
+
+
+@pytest.mark.parametrize("path, params, max_statements", ROUTES)
+def test_route_budget(client, query_budget, path, params, max_statements):
+    client.get(path, params=params).raise_for_status()
+    with query_budget(max_statements=max_statements, max_repeats=1):
+        client.get(path, params=params).raise_for_status()
+
+
+def test_customer_budget(client, query_budget, customer_id):
+    with query_budget(max_statements=1):
+        client.get(f"/customers/{customer_id}").raise_for_status()
+
+
+@pytest.mark.parametrize("route", MODEL_ROUTES)
+def test_model_budget(client, query_budget, fitted_models, customer_id, route):
+    # predictions come from the fitted summaries, at most the customer's row is read
+    with query_budget(max_statements=1):
+        client.get(f"/models/pnbd/{route}/{customer_id}").raise_for_status()
@@ -0,0 +1,83 @@
+import json
+
+import numpy as np
+import pytest
+from sqlalchemy import text
+
+from src.app.rfm_sketches import QUINTILES, rfm_sketch_store
+
+
+def exact_summary(db):
+    rows = db.execute(text(
+        "SELECT s.CustomerId, max(date(s.Date)), count(*), coalesce(sum(s.Qty * p.Price), 0) "
+        "FROM Sales s JOIN Products p ON s.ProductId = p.ProductId "
+        "WHERE s.CustomerId IS NOT NULL GROUP BY 1 ORDER BY 1"
+    )).all()
+    return [(customer, day, count, pytest.approx(revenue)) for customer, day, count, revenue in rows]
+
+
+def summary(db):
+    return [tuple(row) for row in db.execute(text("SELECT * FROM derived.RFMCustomerSummary ORDER BY CustomerId"))]
+
+
+def test_sketches_include_rows_inserted_below_the_watermark(db, client):
+    sale = db.execute(text(
+        "SELECT SaleId, Date, CustomerId, ProductId, Qty FROM Sales ORDER BY SaleId LIMIT 1 OFFSET 20"
+    )).one()
+    db.execute(text("DELETE FROM Sales WHERE SaleId = :id"), {"id": sale.SaleId})
+    db.commit()
+    rfm_sketch_store.refresh(db)
+    assert summary(db) == exact_summary(db)
+
+    row = {"id": sale.SaleId, "date": str(sale.Date), "customer_id": sale.CustomerId,
+           "product_id": sale.ProductId, "qty": sale.Qty}
+    response = client.post("/sales/batch", content=json.dumps(row), headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 200, response.text
+    assert summary(db) == exact_summary(db)
+    assert rfm_sketch_store.thresholds(db).customers == len(exact_summary(db))
+
+
+def test_thresholds_do_not_write_when_sales_are_unchanged(db, query_budget):
+    rfm_sketch_store.thresholds(db)
+    with query_budget() as audit:
+        rfm_sketch_store.thresholds(db)
+    assert not [statement for statement in audit.repeats if not statement.startswith(("SELECT", "PRAGMA"))]
+
+
+def test_summary_counts_sales_without_qty(db):
+    rfm_sketch_store.refresh(db)
+    db.execute(text(
+        "INSERT INTO Sales (SaleId, Date, CustomerId, ProductId, Qty) "
+        "SELECT max(SaleId) + 1, '2025-06-30 13:00:00.000000', 'C9999999', 1, NULL FROM Sales"
+    ))
+    db.commit()
+    rfm_sketch_store.refresh(db)
+    assert summary(db) == exact_summary(db)
+    db.execute(text("DELETE FROM Sales WHERE CustomerId = 'C9999999'"))
+    db.commit()
+
+
+@pytest.mark.parametrize("edit, undo", [
+    ("UPDATE Sales SET Qty = Qty * 3 WHERE SaleId % 4 = 0", "UPDATE Sales SET Qty = Qty / 3 WHERE SaleId % 4 = 0"),
+    ("UPDATE Products SET Price = Price * 10", "UPDATE Products SET Price = Price / 10"),
+])
+def test_sketches_are_rebuilt_after_edits(db, edit, undo):
+    before = rfm_sketch_store.thresholds(db).monetary
+    db.execute(text(edit))
+    db.commit()
+    try:
+        after = rfm_sketch_store.thresholds(db).monetary
+        assert summary(db) == exact_summary(db)
+        assert after != before
+    finally:
+        db.execute(text(undo))
+        db.commit()
+    assert rfm_sketch_store.thresholds(db).monetary == pytest.approx(before)
+
+
+def test_threshold_edges_within_rank_error(db):
+    thresholds = rfm_sketch_store.thresholds(db)
+    revenue = np.sort([row[3] for row in summary(db)])
+    for q, edge in zip(QUINTILES, thresholds.monetary):
+        below, at_most = np.searchsorted(revenue, edge, "left"), np.searchsorted(revenue, edge, "right")
+        assert below / len(revenue) - thresholds.rank_error <= q <= at_most / len(revenue) + thresholds.rank_error
@@ -0,0 +1,108 @@
+import json
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+from src.app.analytics import _aggregate
+from src.app.data_version import data_version_watcher
+from src.app.filters import SalesFilter
+from src.app.rfm_sketches import rfm_sketch_store
+from src.app.rollups import plan, rollup_store
+
+
+def exact_totals(db, granularity="day"):
+    bucket = {"day": "date(s.Date)", "month": "date(s.Date, 'start of month')"}[granularity]
+    rows = db.execute(text(
+        f"SELECT {bucket}, count(*), coalesce(sum(s.Qty), 0), coalesce(sum(s.Qty * p.Price), 0) "
+        f"FROM Sales s JOIN Products p ON s.ProductId = p.ProductId GROUP BY 1 ORDER BY 1"
+    )).all()
+    return [(bucket, count, qty, pytest.approx(revenue)) for bucket, count, qty, revenue in rows]
+
+
+def rollup_totals(db, granularity="day"):
+    return [tuple(row) for row in rollup_store.query(db, SalesFilter(), granularity=granularity)]
+
+
+@pytest.mark.parametrize("granularity", ["day", "month"])
+def test_rollups_match_sales(db, granularity):
+    rollup_store.refresh(db)
+    assert rollup_totals(db, granularity) == exact_totals(db, granularity)
+
+
+def test_aggregate_matches_with_and_without_rollups(db, monkeypatch):
+    filters = SalesFilter(start_date=date(2025, 4, 1), end_date=date(2025, 4, 30), business_unit=2)
+    from_rollups = _aggregate(db, filters, ["product_id"], "week")
+    monkeypatch.setattr(rollup_store, "enabled", False)
+    from_sales = _aggregate(db, filters, ["product_id"], "week")
+    assert [tuple(row[:4]) for row in from_rollups] == [tuple(row[:4]) for row in from_sales]
+    assert [row[4] for row in from_rollups] == pytest.approx([row[4] for row in from_sales])
+
+
+def test_plan_prefers_coarse_aligned_rollups():
+    assert plan(SalesFilter(start_date=date(2025, 1, 1), end_date=date(2025, 3, 31)), (), "month").name \
+        == "SalesRollupMonth"
+    # a range that does not start on a month boundary needs days
+    assert plan(SalesFilter(start_date=date(2025, 1, 2)), ["product_id"], "month").name == "SalesRollupDayProduct"
+
+
+def test_rollups_include_rows_inserted_below_the_watermark(db, client):
+    sale = db.execute(text(
+        "SELECT SaleId, Date, CustomerId, ProductId, Qty FROM Sales ORDER BY SaleId LIMIT 1 OFFSET 10"
+    )).one()
+    db.execute(text("DELETE FROM Sales WHERE SaleId = :id"), {"id": sale.SaleId})
+    db.commit()
+    rollup_store.refresh(db)
+    assert rollup_totals(db) == exact_totals(db)
+
+    # the max SaleId does not move, only the row count does
+    row = {"id": sale.SaleId, "date": str(sale.Date), "customer_id": sale.CustomerId,
+           "product_id": sale.ProductId, "qty": sale.Qty}
+    response = client.post("/sales/batch", content=json.dumps(row), headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 200, response.text
+    assert rollup_store.watermark(db)[:2] == tuple(db.execute(text("SELECT max(SaleId), count(*) FROM Sales")).one())
+    assert rollup_totals(db) == exact_totals(db)
+
+
+@pytest.mark.parametrize("edit, undo", [
+    ("UPDATE Sales SET Qty = Qty + 1 WHERE SaleId % 7 = 0", "UPDATE Sales SET Qty = Qty - 1 WHERE SaleId % 7 = 0"),
+    ("UPDATE Sales SET Date = datetime(Date, '+1 day') WHERE SaleId % 5 = 0",
+     "UPDATE Sales SET Date = datetime(Date, '-1 day') WHERE SaleId % 5 = 0"),
+    ("UPDATE Products SET Price = Price * 2 WHERE ProductId % 3 = 0",
+     "UPDATE Products SET Price = Price / 2 WHERE ProductId % 3 = 0"),
+])
+def test_rollups_are_rebuilt_after_edits(db, edit, undo):
+    rollup_store.refresh(db)
+    db.execute(text(edit))
+    db.commit()
+    try:
+        assert rollup_store.ensure_fresh(db)
+        assert rollup_totals(db) == exact_totals(db)
+    finally:
+        db.execute(text(undo))
+        db.commit()
+    rollup_store.refresh(db)
+    assert rollup_totals(db) == exact_totals(db)
+
+
+def test_rollups_count_sales_without_qty(db):
+    rollup_store.refresh(db)
+    db.execute(text(
+        "INSERT INTO Sales (SaleId, Date, CustomerId, ProductId, Qty) "
+        "SELECT max(SaleId) + 1, '2025-06-30 12:00:00.000000', NULL, 1, NULL FROM Sales"
+    ))
+    db.commit()
+    rollup_store.refresh(db)
+    assert rollup_totals(db) == exact_totals(db)
+
+
+def test_refreshes_do_not_change_the_data_fingerprint(db):
+    db.execute(text(
+        "INSERT INTO Sales (SaleId, Date, CustomerId, ProductId, Qty) "
+        "SELECT max(SaleId) + 1, '2025-06-30 14:00:00.000000', 'C0000001', 1, 2 FROM Sales"
+    ))
+    db.commit()
+    before = data_version_watcher.fingerprint()
+    rollup_store.refresh(db)
+    rfm_sketch_store.refresh(db)
+    assert data_version_watcher.fingerprint() == before
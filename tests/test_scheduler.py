@@ -0,0 +1,44 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from sqlalchemy import text
+
+from src.app.data_version import data_version_watcher
+from src.app.scheduler import RefitScheduler
+
+
+class StubExecutor:
+    def __init__(self):
+        self.fits = 0
+        self.fitted_at = None
+        self.fitted_fingerprint = None
+
+    async def fit(self):
+        self.fits += 1
+        self.fitted_at, self.fitted_fingerprint = time.time(), data_version_watcher.fingerprint()
+
+
+def test_scheduler_refits_after_edits(db):
+    executor = StubExecutor()
+    disabled = SimpleNamespace(enabled=False)
+    scheduler = RefitScheduler(executor, data_version_watcher, disabled, disabled, poll_interval=1, debounce=0,
+                               max_delay=0, refit_interval=0, min_change=0.01)
+
+    async def run():
+        await scheduler.tick()
+        await scheduler.tick()
+        assert (executor.fits, scheduler.last_skip_reason) == (1, "change below threshold")
+
+        # a tenth of the sales change in place, their count does not
+        db.execute(text("UPDATE Sales SET Qty = Qty + 1 WHERE SaleId % 10 = 0"))
+        db.commit()
+        try:
+            await scheduler.tick()
+        finally:
+            db.execute(text("UPDATE Sales SET Qty = Qty - 1 WHERE SaleId % 10 = 0"))
+            db.commit()
+        assert executor.fits == 2
+        assert scheduler.last_refresh_at is not None
+
+    asyncio.run(run())
@@ -0,0 +1,44 @@
+import threading
+
+from sqlalchemy import text
+
+from src.app.search import CustomerSearchIndex
+from src.database import SessionLocal
+
+
+def test_search_matches_ids_names_and_words(db):
+    index = CustomerSearchIndex()
+    customer_id, company_name = db.execute(
+        text("SELECT CustomerId, CompanyName FROM Customers ORDER BY CustomerId LIMIT 1")
+    ).one()
+    assert index.search(db, customer_id.lower())[0] == {"id": customer_id, "company_name": company_name, "match": "id"}
+    prefix = company_name.split()[1][:3].lower()
+    matches = index.search(db, prefix, limit=100)
+    assert matches
+    assert all(any(word.startswith(prefix) for word in match["company_name"].lower().split()) for match in matches)
+
+
+def test_search_during_rebuilds_reads_one_build(db):
+    index = CustomerSearchIndex()
+    index.build(db)
+    stop, errors = threading.Event(), []
+
+    def rebuild():
+        session = SessionLocal()
+        try:
+            while not stop.is_set():
+                index.build(session)
+        finally:
+            session.close()
+
+    thread = threading.Thread(target=rebuild)
+    thread.start()
+    try:
+        for _ in range(300):
+            for match in index.search(db, "c0", limit=20):
+                if not match["id"].lower().startswith("c0"):
+                    errors.append(match)
+    finally:
+        stop.set()
+        thread.join()
+    assert not errors
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from src.app.singleflight import SingleFlight
+
+
+def run_concurrently(single_flight, calls, func):
+    async def main():
+        return await asyncio.gather(*(single_flight.do("op", args, func) for args in calls),
+                                    return_exceptions=True)
+
+    return asyncio.run(main())
+
+
+def test_identical_concurrent_calls_share_one_computation():
+    single_flight, started = SingleFlight(), []
+
+    async def compute():
+        started.append(1)
+        await asyncio.sleep(0.01)
+        return object()
+
+    results = run_concurrently(single_flight, [(1, "a")] * 10, compute)
+    assert len(started) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_different_arguments_compute_separately():
+    single_flight, started = SingleFlight(), []
+
+    async def compute():
+        started.append(1)
+        await asyncio.sleep(0.01)
+        return len(started)
+
+    run_concurrently(single_flight, [(1,), (2,), (1,), (2,)], compute)
+    assert len(started) == 2
+
+
+def test_exception_reaches_every_caller_and_is_not_kept():
+    single_flight, started = SingleFlight(), []
+
+    async def fail():
+        started.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = run_concurrently(single_flight, [(1,)] * 3, fail)
+    assert len(started) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+    # nothing is cached, a later call runs again
+    with pytest.raises(ValueError):
+        asyncio.run(single_flight.do("op", (1,), fail))
+    assert len(started) == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    single_flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return 42
+
+    async def main():
+        first = asyncio.ensure_future(single_flight.do("op", (), compute))
+        second = asyncio.ensure_future(single_flight.do("op", (), compute))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == 42
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from src.app.sketches import KLLSketch, TurnstileQuantiles
+
+QS = np.linspace(0.05, 0.95, 19)
+
+
+def rank_errors(values, estimates, qs):
+    """
+    Distance between the fraction of values below each estimate and the requested fraction
+    """
+    values = np.sort(values)
+    low = np.searchsorted(values, estimates, side="left") / len(values)
+    high = np.searchsorted(values, estimates, side="right") / len(values)
+    # an estimate repeated in the data covers a range of ranks
+    return np.maximum(np.maximum(low - qs, qs - high), 0)
+
+
+@pytest.mark.parametrize("distribution", ["uniform", "lognormal", "integers"])
+def test_kll_quantiles_within_rank_error(distribution):
+    rng = np.random.default_rng(1)
+    values = {
+        "uniform": lambda: rng.uniform(0, 1, 200_000),
+        "lognormal": lambda: rng.lognormal(3, 1, 200_000),
+        "integers": lambda: rng.integers(0, 50, 200_000).astype(float),
+    }[distribution]()
+    sketch = KLLSketch(k=200)
+    for chunk in np.array_split(values, 37):
+        sketch.update(chunk)
+
+    assert sketch.n == len(values)
+    assert sum(len(level) for level in sketch.levels) < 3 * 200
+    assert rank_errors(values, sketch.quantiles(QS), QS).max() <= sketch.rank_error
+
+
+def test_merged_sketch_summarizes_both_inputs():
+    rng = np.random.default_rng(2)
+    a, b = rng.normal(0, 1, 50_000), rng.normal(3, 1, 80_000)
+    sketch, other = KLLSketch(k=200, seed=1), KLLSketch(k=200, seed=2)
+    sketch.update(a)
+    other.update(b)
+    sketch.merge(other)
+    values = np.concatenate([a, b])
+    assert sketch.n == len(values)
+    assert (sketch.min, sketch.max) == (values.min(), values.max())
+    assert rank_errors(values, sketch.quantiles(QS), QS).max() <= sketch.rank_error
+
+
+def test_turnstile_quantiles_within_rank_error_after_removals():
+    rng = np.random.default_rng(3)
+    values = rng.exponential(100, 100_000)
+    quantiles = TurnstileQuantiles(k=200)
+    quantiles.add(values)
+    # a third of the values is replaced by larger ones, as revenue grows
+    replaced = rng.choice(len(values), len(values) // 3, replace=False)
+    quantiles.remove(values[replaced])
+    values[replaced] += rng.exponential(50, len(replaced))
+    quantiles.add(values[replaced])
+
+    assert quantiles.n == len(values)
+    assert not quantiles.needs_rebuild
+    assert rank_errors(values, quantiles.quantiles(QS), QS).max() <= quantiles.rank_error
+
+
+def test_serialized_sketch_answers_the_same():
+    rng = np.random.default_rng(4)
+    quantiles = TurnstileQuantiles(k=64)
+    quantiles.add(rng.uniform(0, 1, 10_000))
+    quantiles.remove(rng.uniform(0, 0.5, 1_000))
+    restored = TurnstileQuantiles.from_bytes(quantiles.to_bytes())
+    assert restored.n == quantiles.n
+    np.testing.assert_array_equal(restored.quantiles(QS), quantiles.quantiles(QS))
+
+
+def test_empty_sketch_has_no_quantiles():
+    assert np.isnan(KLLSketch().quantiles([0.5])).all()
+    assert np.isnan(TurnstileQuantiles().quantiles([0.5])).all()
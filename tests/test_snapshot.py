@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy import text
+
+from src.app.data_version import DataVersionWatcher
+from src.app.snapshot import TransactionSnapshot, transaction_snapshot
+from src.config.env_vars import ENV_VARS
+
+
+def _fresh_process_frame(db):
+    # another process: its own watcher, hence epoch, and the snapshot file on disk
+    watcher = DataVersionWatcher(ENV_VARS.DB_URL)
+    try:
+        return TransactionSnapshot(transaction_snapshot.path, watcher).load(db)
+    finally:
+        watcher.close()
+
+
+@pytest.mark.parametrize("edit, undo", [
+    ("UPDATE Sales SET Qty = Qty + 10", "UPDATE Sales SET Qty = Qty - 10"),
+    ("UPDATE Products SET Price = Price * 2", "UPDATE Products SET Price = Price / 2"),
+])
+def test_snapshot_on_disk_is_rebuilt_after_edits(db, edit, undo):
+    before = transaction_snapshot.load(db)
+    assert _fresh_process_frame(db)["amount"].sum() == pytest.approx(before["amount"].sum())
+
+    db.execute(text(edit))
+    db.commit()
+    try:
+        expected = db.execute(text(
+            "SELECT sum(s.Qty), sum(s.Qty * p.Price) FROM Sales s JOIN Products p ON s.ProductId = p.ProductId"
+        )).one()
+        frame = _fresh_process_frame(db)
+        assert frame["qty"].sum() == expected[0]
+        assert frame["amount"].sum() == pytest.approx(expected[1], rel=1e-5)
+        assert transaction_snapshot.load(db)["qty"].sum() == expected[0]
+    finally:
+        db.execute(text(undo))
+        db.commit()
+